@@ -0,0 +1,394 @@
+"""
+Soru bankası değişince (dengeleyici, yeni etki) kayıtlı results satırlarını
+güncel bankaya göre yeniden skorlar.
+
+Kullanım:
+    python -m app.backfill --dry-run
+    python -m app.backfill --workers 4 --batch-size 500 --writes-per-minute 40
+
+- results tabı (tüm aylık bölümleriyle, eskiden yeniye) sayfa sayfa okunur, skorlama process pool'da yapılır.
+- Her sayfa yazıldıktan sonra checkpoint kaydedilir; tekrar çalıştırınca kaldığı yerden devam eder.
+  Checkpoint global satırdır (app.partitions.global_row); eski tab için Sheets satırıyla aynı.
+- Sheets'ten silinip arşivlenmiş bölümler (app.compaction) yeniden skorlanmaz.
+- Değişen satırlar runtime/backfill_report.csv içine, arketip geçişleri özet JSON'a yazılır.
+- Satır güncellendiyse türetilmiş yerel veriler yeniden kurulur (refresh_derived): snapshot baştan
+  senkronlanır (rollup'lar + yüzdelikler), eşleşme heap'leri ve kabileler yeniden hesaplanır.
+  Snapshot sadece eklenen satırları okuduğundan yerinde güncellemeleri kendisi görmez.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import partitions
+from app.codec import ALL_FIELDS, decode_result, encode_result, totals_vector
+from app.dengeleyici import ARSHETIP_KEYS
+from app.questions import answers_from_legacy, load_bank_for_lang
+from app.scoring import dominant_batch, effect_matrix, presence_batch, score_batch
+from app.utils import RateLimiter, runtime_path
+
+LANGS = ("TR", "EN")
+TAB = "results"
+FOLLOW_UP = (
+    "python -m app.snapshot reset --tabs results",
+    "python -m app.snapshot sync --max-pages 1000000",
+    "python -m app.match_heaps backfill",
+    "python -m app.tribes refit --from-snapshot",
+)
+
+
+@dataclass
+class _Row:
+    row_number: int
+    profile_id: str
+    lang: str
+    answers: List[int]
+    payload: Dict[str, Any]
+    old_totals: Dict[str, int]
+    old_dominant: str
+    columns_filled: bool = True
+
+
+@dataclass
+class _Page:
+    tab: str
+    header: List[str]
+    start_row: int  # tab içi satır
+    n_rows: int
+    rows: List[_Row] = field(default_factory=list)
+
+    @property
+    def global_start(self) -> int:
+        return partitions.global_row(TAB, self.tab, self.start_row)
+
+    def jobs(self) -> Dict[str, List[List[int]]]:
+        out: Dict[str, List[List[int]]] = {}
+        for r in self.rows:
+            out.setdefault(r.lang, []).append(r.answers)
+        return out
+
+
+def _rescore_page(jobs: Dict[str, List[List[int]]]) -> Dict[str, Tuple[str, List[Dict[str, int]], List[str]]]:
+    """
+    Worker: dil başına cevap dizilerini güncel bankayla skorlar.
+    Dönen: {lang: (bank_hash, [totals], [dominant])}
+    """
+    out: Dict[str, Tuple[str, List[Dict[str, int]], List[str]]] = {}
+    for lang, answers in jobs.items():
+        questions, bank = load_bank_for_lang(lang)
+        m = effect_matrix(questions, bank)
+        a = np.full((len(answers), m.n_questions), -1, dtype=np.int64)
+        for i, row in enumerate(answers):
+            n = min(len(row), m.n_questions)
+            a[i, :n] = row[:n]
+        totals = score_batch(m, a)
+        present = presence_batch(m, a)
+        dom = dominant_batch(totals, present)
+        out[lang] = (
+            bank,
+            [{k: int(totals[i, j]) for j, k in enumerate(m.keys) if present[i, j]} for i in range(len(answers))],
+            [m.keys[d] if d >= 0 else "" for d in dom],
+        )
+    return out
+
+
+def _guess_lang(legacy_answers: Any) -> str:
+    # Eski satırlarda lang yok: yazıların hangi bankayla eşleştiğine bak.
+    best, best_hits = "TR", -1
+    for lang in LANGS:
+        questions, _ = load_bank_for_lang(lang)
+        hits = sum(1 for a in answers_from_legacy(questions, legacy_answers) if a >= 0)
+        if hits > best_hits:
+            best, best_hits = lang, hits
+    return best
+
+
+def _prepare_page(tab: str, header: List[str], start_row: int, values: List[List[str]]) -> _Page:
+    page = _Page(tab=tab, header=header, start_row=start_row, n_rows=len(values))
+    for offset, r in enumerate(values):
+        d = {col: (r[i] if i < len(r) else "") for i, col in enumerate(header)}
+        payload = decode_result(d.get("result_json", ""), ALL_FIELDS)
+        raw_answers = payload.get("answers")
+        if not raw_answers:
+            continue
+        for k in ("name", "zodiac"):
+            if not payload.get(k):
+                payload[k] = d.get(k, "")
+        lang = str(payload.get("lang") or "").upper()
+        if lang not in LANGS:
+            lang = _guess_lang(raw_answers)
+        questions, _ = load_bank_for_lang(lang)
+        page.rows.append(
+            _Row(
+                row_number=start_row + offset,
+                profile_id=d.get("profile_id", ""),
+                lang=lang,
+                answers=answers_from_legacy(questions, raw_answers),
+                payload=payload,
+                old_totals=payload.get("totals") if isinstance(payload.get("totals"), dict) else {},
+                old_dominant=str(payload.get("dominant") or d.get("dominant") or ""),
+                columns_filled=all(str(d.get(k, "")).strip() for k in ARSHETIP_KEYS if k in header),
+            )
+        )
+    return page
+
+
+def _diff_page(
+    page: _Page, scored: Dict[str, Tuple[str, List[Dict[str, int]], List[str]]]
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    cursor = {lang: 0 for lang in scored}
+    updates: List[Tuple[int, Dict[str, Any]]] = []
+    diffs: List[Dict[str, Any]] = []
+    for r in page.rows:
+        bank, totals_list, dom_list = scored[r.lang]
+        i = cursor[r.lang]
+        cursor[r.lang] += 1
+        new_totals, new_dom = totals_list[i], dom_list[i]
+        if totals_vector(new_totals) == totals_vector(r.old_totals) and new_dom == r.old_dominant:
+            if not r.columns_filled:
+                # Skor aynı, sadece trait kolonları boş (kolonlar sonradan eklendi): diff sayılmaz.
+                updates.append((r.row_number, {k: int(new_totals.get(k, 0)) for k in ARSHETIP_KEYS}))
+            continue
+
+        new_score = int(new_totals.get(new_dom, 0)) if new_dom else 0
+        payload = {
+            **r.payload,
+            "totals": new_totals,
+            "dominant": new_dom,
+            "score": new_score,
+            "lang": r.lang,
+            "bank": bank,
+            "answers": r.answers,
+        }
+        cols: Dict[str, Any] = {
+            "dominant": new_dom,
+            "score": new_score,
+            "result_json": encode_result(payload),
+        }
+        for k in ARSHETIP_KEYS:
+            cols[k] = int(new_totals.get(k, 0))
+        updates.append((r.row_number, cols))
+        diffs.append(
+            {
+                "tab": page.tab,
+                "row": r.row_number,
+                "profile_id": r.profile_id,
+                "lang": r.lang,
+                "old_dominant": r.old_dominant,
+                "new_dominant": new_dom,
+                "old_totals": json.dumps(r.old_totals, ensure_ascii=False),
+                "new_totals": json.dumps(new_totals, ensure_ascii=False),
+            }
+        )
+    return updates, diffs
+
+
+def _current_banks() -> Dict[str, str]:
+    return {lang: load_bank_for_lang(lang)[1] for lang in LANGS}
+
+
+def _load_checkpoint(path: Path, banks: Dict[str, str]) -> Dict[str, Any]:
+    fresh = {"next_row": 2, "banks": banks, "scanned": 0, "changed": 0, "transitions": {}}
+    if not path.exists():
+        return fresh
+    try:
+        ckpt = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return fresh
+    if ckpt.get("banks") != banks:
+        # Checkpoint başka bir banka versiyonuna ait: baştan başla.
+        print("Checkpoint farklı bir soru bankasına ait, baştan başlanıyor.")
+        return fresh
+    return ckpt
+
+
+def _save_checkpoint(path: Path, ckpt: Dict[str, Any]) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(ckpt, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _append_report(path: Path, diffs: List[Dict[str, Any]]) -> None:
+    if not diffs:
+        return
+    new_file = not path.exists()
+    with path.open("a", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(diffs[0].keys()))
+        if new_file:
+            w.writeheader()
+        w.writerows(diffs)
+
+
+def _pages(tabs: Sequence[str], start_row: int, batch_size: int, limiter: RateLimiter) -> Iterator[_Page]:
+    """
+    start_row (global) sonrasındaki satırlar, bölüm bölüm ve sayfa sayfa; skorlama için hazırlanmış.
+    """
+    from app.storage import gsheets_read_header, gsheets_read_rows
+
+    start_ord, start_in = partitions.split_row(start_row)
+    for tab in tabs:
+        o = int(partitions.ordinal(TAB, tab) or 0)
+        if o < start_ord:
+            continue
+        ok, header, msg = gsheets_read_header(tab)
+        if not ok:
+            raise RuntimeError(msg)
+        row = start_in if o == start_ord else 2
+        while True:
+            limiter.acquire()
+            ok, values, msg = gsheets_read_rows(tab, row, batch_size, len(header))
+            if not ok:
+                raise RuntimeError(msg)
+            if not values:
+                break
+            yield _prepare_page(tab, header, row, values)
+            if len(values) < batch_size:
+                break
+            row += len(values)
+
+
+def refresh_derived(reads_per_minute: Optional[float] = 50) -> Dict[str, Any]:
+    """
+    Yeniden skorlanan satırlardan türetilen yerel verileri baştan kurar:
+    snapshot (sıfırla + tam senkron; reset sonrası rollup'lar ve yüzdelik histogramları reconcile
+    edilir), eşleşme heap'leri ve kabileler (vektörler güncellenip refit).
+    """
+    from app import match_heaps, snapshot, tribes
+
+    snapshot.reset(TAB)
+    synced = snapshot.sync(TAB, max_pages=1_000_000, reads_per_minute=reads_per_minute)
+    if synced.get("skipped"):
+        raise RuntimeError(f"snapshot: {synced['skipped']}")
+    return {
+        "snapshot": synced,
+        "match_heaps": match_heaps.rebuild(snapshot.iter_results()),
+        "tribes": tribes.refit(snapshot.iter_results()),
+    }
+
+
+def run_backfill(
+    batch_size: int = 500,
+    workers: int = 2,
+    reads_per_minute: float = 50,
+    writes_per_minute: float = 50,
+    dry_run: bool = False,
+    checkpoint: Optional[Path] = None,
+    report: Optional[Path] = None,
+    refresh: bool = True,
+) -> Dict[str, Any]:
+    # Storage streamlit secrets'a bağlı; sadece gerçekten çalışınca import et.
+    from app.storage import gsheets_tab_partitions, gsheets_update_rows
+
+    checkpoint = checkpoint or runtime_path("backfill_checkpoint.json")
+    report = report or runtime_path("backfill_report.csv")
+
+    ok, tabs, msg = gsheets_tab_partitions(TAB)
+    if not ok:
+        raise RuntimeError(msg)
+
+    banks = _current_banks()
+    ckpt = _load_checkpoint(checkpoint, banks)
+    if ckpt["next_row"] == 2 and report.exists():
+        report.unlink()
+    transitions = Counter(ckpt.get("transitions", {}))
+
+    write_limiter = RateLimiter(writes_per_minute)
+    pages = _pages(tabs, int(ckpt["next_row"]), batch_size, RateLimiter(reads_per_minute))
+    exhausted = False
+    written = 0
+    pending: Deque[Tuple[_Page, Future]] = deque()
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or not exhausted:
+            # Okuma ileride gitsin, skorlama arkadan gelsin (en fazla 2 sayfa/worker).
+            while not exhausted and len(pending) < max(1, workers) * 2:
+                page = next(pages, None)
+                if page is None:
+                    exhausted = True
+                    break
+                pending.append((page, pool.submit(_rescore_page, page.jobs())))
+
+            if not pending:
+                break
+
+            # Checkpoint tutarlılığı için sayfalar sırayla tamamlanır.
+            page, fut = pending.popleft()
+            updates, diffs = _diff_page(page, fut.result())
+            if updates and not dry_run:
+                write_limiter.acquire()
+                ok, msg = gsheets_update_rows(page.tab, page.header, updates)
+                if not ok:
+                    raise RuntimeError(msg)
+                written += len(updates)
+
+            _append_report(report, diffs)
+            for d in diffs:
+                transitions[f"{d['old_dominant'] or '-'}->{d['new_dominant'] or '-'}"] += 1
+            ckpt["next_row"] = page.global_start + page.n_rows
+            ckpt["scanned"] = int(ckpt.get("scanned", 0)) + page.n_rows
+            ckpt["changed"] = int(ckpt.get("changed", 0)) + len(diffs)
+            ckpt["transitions"] = dict(transitions)
+            if not dry_run:
+                _save_checkpoint(checkpoint, ckpt)
+            print(f"{page.tab} satır {page.start_row}-{page.start_row + page.n_rows - 1}: {len(diffs)} değişiklik")
+
+    summary = {
+        "dry_run": dry_run,
+        "banks": banks,
+        "scanned": ckpt["scanned"],
+        "changed": ckpt["changed"],
+        "transitions": dict(transitions.most_common()),
+        "report": str(report),
+        "rows_written": written,
+    }
+    if written and refresh:
+        try:
+            summary["derived"] = refresh_derived(reads_per_minute)
+        except Exception as e:
+            summary["derived"] = {"error": f"{type(e).__name__}: {e}", "follow_up": list(FOLLOW_UP)}
+    elif written:
+        summary["derived"] = {"skipped": "--no-refresh", "follow_up": list(FOLLOW_UP)}
+    runtime_path("backfill_summary.json").write_text(
+        json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return summary
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="results tabını (tüm aylık bölümleri) güncel soru bankasıyla yeniden skorlar.")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--reads-per-minute", type=float, default=50)
+    ap.add_argument("--writes-per-minute", type=float, default=50)
+    ap.add_argument("--dry-run", action="store_true", help="Sheets'e yazma, sadece rapor üret.")
+    ap.add_argument("--restart", action="store_true", help="Checkpoint'i yok say, baştan başla.")
+    ap.add_argument("--no-refresh", action="store_true", help="Snapshot / rollup / heap / kabileleri yeniden kurma.")
+    args = ap.parse_args()
+
+    checkpoint = runtime_path("backfill_checkpoint.json")
+    if args.restart and checkpoint.exists():
+        checkpoint.unlink()
+
+    summary = run_backfill(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        reads_per_minute=args.reads_per_minute,
+        writes_per_minute=args.writes_per_minute,
+        dry_run=args.dry_run,
+        checkpoint=checkpoint,
+        refresh=not args.no_refresh,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
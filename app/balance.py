@@ -0,0 +1,265 @@
+"""
+Soru bankası denge analizi: tüm cevap yolları üzerinden kesin dağılımlar.
+
+Her soru, trait toplamlarının 4 boyutlu dağılımı (numpy dizisi) ile
+konvolüsyon olarak işlenir; yollar tek tek gezilmez. Sonuç:
+  - baskın arketip payları (dominant_trait kuralıyla),
+  - eşitlik (tie) oranı,
+  - her option'ın baskın arketip dağılımına etkisi.
+
+Kullanım:
+    python -m app.balance --lang TR
+    python -m app.balance --lang TR --compare data/questions_tr_yeni.json
+    python -m app.balance --lang EN --check   # DP sonucunu düz enumerasyonla doğrula
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.questions import Question, bank_hash, load_bank_for_lang, load_questions_file
+from app.scoring import EffectMatrix, compile_effect_matrix, dominant_batch, score_batch
+
+# Yoğun dağılım dizisi için hücre sınırı (~ 400 MB int64)
+MAX_CELLS = 50_000_000
+# --check ile düz enumerasyon için yol sınırı
+MAX_ENUM_PATHS = 20_000_000
+
+
+@dataclass
+class BalanceReport:
+    bank: str
+    keys: Tuple[str, ...]
+    n_paths: int
+    dominant_share: Dict[str, float]  # "" = hiç etki yok
+    tie_rate: float
+    tie_share_by_winner: Dict[str, float]
+    # (qi, oi) -> option seçildiğinde baskın arketip payları
+    option_share: Dict[Tuple[int, int], Dict[str, float]]
+    # (qi, oi) -> genel dağılıma göre toplam varyasyon mesafesi (0..1)
+    option_influence: Dict[Tuple[int, int], float]
+    seconds: float
+
+
+class _Grid:
+    """
+    Trait toplamlarının alabileceği aralık: her eksen [lo_k, hi_k].
+    """
+
+    def __init__(self, m: EffectMatrix) -> None:
+        eff = m.effects[:-1]
+        lo = np.zeros(len(m.keys), dtype=np.int64)
+        hi = np.zeros(len(m.keys), dtype=np.int64)
+        for qi in range(m.n_questions):
+            rows = eff[m.offsets[qi] : m.offsets[qi] + m.n_options[qi]]
+            lo += np.minimum(rows.min(axis=0), 0)
+            hi += np.maximum(rows.max(axis=0), 0)
+        self.lo = lo
+        self.shape = tuple(int(x) for x in (hi - lo + 1))
+        cells = int(np.prod(self.shape))
+        if cells > MAX_CELLS:
+            raise ValueError(f"Dağılım ızgarası çok büyük ({cells} hücre).")
+
+    def origin(self) -> np.ndarray:
+        d = np.zeros(self.shape, dtype=np.int64)
+        d[tuple(int(-x) for x in self.lo)] = 1
+        return d
+
+    def totals_grid(self) -> np.ndarray:
+        # (cells, K): her hücrenin trait toplamları
+        idx = np.indices(self.shape).reshape(len(self.shape), -1).T
+        return idx + self.lo
+
+
+def _shift_add(out: np.ndarray, dist: np.ndarray, shift: np.ndarray) -> None:
+    # out[x + shift] += dist[x]  (ızgara dışına taşan kısım olamaz: sınırlar hesaplandı)
+    dst: List[slice] = []
+    src: List[slice] = []
+    for s, n in zip(shift, dist.shape):
+        s = int(s)
+        if s >= 0:
+            dst.append(slice(s, n))
+            src.append(slice(0, n - s))
+        else:
+            dst.append(slice(0, n + s))
+            src.append(slice(-s, n))
+    out[tuple(dst)] += dist[tuple(src)]
+
+
+def _convolve(dist: np.ndarray, m: EffectMatrix, qi: int) -> np.ndarray:
+    out = np.zeros_like(dist)
+    start = int(m.offsets[qi])
+    for oi in range(int(m.n_options[qi])):
+        _shift_add(out, dist, m.effects[start + oi])
+    return out
+
+
+def _dominant_masks(grid: _Grid, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hücre başına baskın trait index'i (-1: etki yok) ve eşitlik maskesi.
+    Sıfır toplamlı trait'ler yok sayılır (bankada 0 değerli etki olmadığı varsayımı).
+    """
+    t = grid.totals_grid()
+    dom = dominant_batch(t)
+    present = t != 0
+    best = np.where(present, t, np.iinfo(np.int64).min).max(axis=1)
+    tie = ((t == best[:, None]) & present).sum(axis=1) >= 2
+    return dom.reshape(grid.shape), tie.reshape(grid.shape)
+
+
+def _shares(dist: np.ndarray, dom: np.ndarray, keys: Sequence[str]) -> Dict[str, float]:
+    total = float(dist.sum())
+    if total <= 0:
+        return {}
+    flat_d = dist.ravel()
+    counts = np.bincount(dom.ravel() + 1, weights=flat_d, minlength=len(keys) + 1)
+    out = {k: float(counts[i + 1] / total) for i, k in enumerate(keys)}
+    if counts[0]:
+        out[""] = float(counts[0] / total)
+    return out
+
+
+def analyse_bank(questions: Sequence[Question]) -> BalanceReport:
+    t0 = time.perf_counter()
+    m = compile_effect_matrix(questions)
+    grid = _Grid(m)
+    dom, tie = _dominant_masks(grid, m.keys)
+    q = m.n_questions
+
+    # prefix[i]: ilk i sorunun toplam dağılımı (başlangıç = origin)
+    prefix = [grid.origin()]
+    for qi in range(q):
+        prefix.append(_convolve(prefix[-1], m, qi))
+    full = prefix[-1]
+    n_paths = int(full.sum())
+
+    base = _shares(full, dom, m.keys)
+    tie_counts = full[tie]
+    tie_rate = float(tie_counts.sum() / n_paths) if n_paths else 0.0
+    tie_by_winner: Dict[str, float] = {}
+    for i, k in enumerate(m.keys):
+        c = float(full[tie & (dom == i)].sum())
+        if c:
+            tie_by_winner[k] = c / n_paths
+
+    # Option etkisi: soru qi hariç dağılım (leave-one-out) + option kaydırması.
+    option_share: Dict[Tuple[int, int], Dict[str, float]] = {}
+    option_influence: Dict[Tuple[int, int], float] = {}
+    for qi in range(q):
+        without = prefix[qi]
+        for qj in range(qi + 1, q):
+            without = _convolve(without, m, qj)
+        start = int(m.offsets[qi])
+        for oi in range(int(m.n_options[qi])):
+            d = np.zeros_like(without)
+            _shift_add(d, without, m.effects[start + oi])
+            sh = _shares(d, dom, m.keys)
+            option_share[(qi, oi)] = sh
+            keys_all = set(sh) | set(base)
+            option_influence[(qi, oi)] = 0.5 * sum(abs(sh.get(k, 0.0) - base.get(k, 0.0)) for k in keys_all)
+
+    return BalanceReport(
+        bank=m.bank,
+        keys=m.keys,
+        n_paths=n_paths,
+        dominant_share=base,
+        tie_rate=tie_rate,
+        tie_share_by_winner=tie_by_winner,
+        option_share=option_share,
+        option_influence=option_influence,
+        seconds=time.perf_counter() - t0,
+    )
+
+
+def enumerate_shares(questions: Sequence[Question]) -> Tuple[Dict[str, float], float]:
+    """
+    Doğrulama için: tüm yolları açıkça üretip score_batch ile skorlar.
+    """
+    m = compile_effect_matrix(questions)
+    n_paths = int(np.prod(m.n_options.astype(np.int64)))
+    if n_paths > MAX_ENUM_PATHS:
+        raise ValueError(f"Enumerasyon için çok fazla yol ({n_paths}).")
+    answers = np.indices(tuple(int(n) for n in m.n_options)).reshape(m.n_questions, -1).T
+    totals = score_batch(m, answers)
+    dom = dominant_batch(totals)
+    present = totals != 0
+    best = np.where(present, totals, np.iinfo(np.int32).min).max(axis=1)
+    tie = ((totals == best[:, None]) & present).sum(axis=1) >= 2
+    counts = np.bincount(dom + 1, minlength=len(m.keys) + 1)
+    shares = {k: float(counts[i + 1] / n_paths) for i, k in enumerate(m.keys)}
+    if counts[0]:
+        shares[""] = float(counts[0] / n_paths)
+    return shares, float(tie.mean())
+
+
+def _load(spec: str) -> List[Question]:
+    p = Path(spec)
+    if p.suffix == ".json" and p.exists():
+        return load_questions_file(p)
+    return load_bank_for_lang(spec)[0]
+
+
+def _pct(x: float) -> str:
+    return f"{100 * x:6.2f}%"
+
+
+def format_report(a: BalanceReport, b: BalanceReport | None = None, top: int = 10) -> str:
+    lines: List[str] = []
+    head = f"bank {a.bank}" + (f"  vs  bank {b.bank}" if b else "")
+    lines.append(head)
+    lines.append(f"yol sayısı: {a.n_paths}" + (f"  |  {b.n_paths}" if b else ""))
+    lines.append(f"süre: {a.seconds:.2f}s" + (f"  |  {b.seconds:.2f}s" if b else ""))
+    lines.append("")
+    lines.append("Baskın arketip payı")
+    for k in list(a.keys) + ([""] if "" in a.dominant_share else []):
+        row = f"  {k or '(yok)':<10} {_pct(a.dominant_share.get(k, 0.0))}"
+        if b:
+            diff = b.dominant_share.get(k, 0.0) - a.dominant_share.get(k, 0.0)
+            row += f"  {_pct(b.dominant_share.get(k, 0.0))}  ({100 * diff:+.2f} pp)"
+        lines.append(row)
+    lines.append("")
+    row = f"Eşitlik (tie) oranı: {_pct(a.tie_rate)}"
+    if b:
+        row += f"  |  {_pct(b.tie_rate)}"
+    lines.append(row)
+    for k, v in a.tie_share_by_winner.items():
+        lines.append(f"  eşitlikte kazanan {k:<10} {_pct(v)}")
+    lines.append("")
+    lines.append(f"En etkili {top} option (toplam varyasyon mesafesi)")
+    ranked = sorted(a.option_influence.items(), key=lambda x: x[1], reverse=True)[:top]
+    for (qi, oi), v in ranked:
+        row = f"  soru {qi + 1:>2} / option {oi + 1}: {v:.4f}"
+        if b and (qi, oi) in b.option_influence:
+            row += f"  |  {b.option_influence[(qi, oi)]:.4f}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Soru bankası denge analizi (kesin, tüm yollar).")
+    ap.add_argument("--lang", default="TR", help="TR / EN ya da bir questions*.json yolu")
+    ap.add_argument("--compare", default="", help="Karşılaştırılacak ikinci banka (dil ya da json yolu)")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--check", action="store_true", help="DP sonucunu düz enumerasyonla doğrula")
+    args = ap.parse_args()
+
+    qa = _load(args.lang)
+    a = analyse_bank(qa)
+    b = analyse_bank(_load(args.compare)) if args.compare else None
+    print(format_report(a, b, top=args.top))
+
+    if args.check:
+        shares, tie_rate = enumerate_shares(qa)
+        ok = all(abs(shares.get(k, 0.0) - a.dominant_share.get(k, 0.0)) < 1e-12 for k in set(shares) | set(a.dominant_share))
+        ok = ok and abs(tie_rate - a.tie_rate) < 1e-12
+        print("")
+        print(f"enumerasyon kontrolü ({bank_hash(qa)}): {'OK' if ok else 'UYUŞMAZLIK'}")
+
+
+if __name__ == "__main__":
+    main()
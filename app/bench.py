@@ -0,0 +1,316 @@
+"""
+Uçtan uca rerun gecikme benchmark'ı (sunucu tarafı).
+
+streamlit_app.py'yi Streamlit'in headless AppTest API'si ile sürer:
+giriş -> Başla -> 11 cevap -> sonuç + eşleşmeler. Birden çok oturum paralel koşar
+(AppTest thread-safe olmadığı için her oturum ayrı bir process; yerel SQLite paylaşılır).
+Storage katmanı ayarlanabilir gecikmeli sahte fonksiyonlarla değiştirilir;
+Sheets'e hiç gidilmez, yerel SQLite geçici bir runtime klasörüne yazılır.
+
+    python -m app.bench --sessions 8 --journeys 5 --write-ms 80 --read-ms 300
+
+Rapor: adım başına p50/p95/p99 (ms), yolculuk başına script çalışması (rerun)
+ve yolculuk başına storage çağrısı.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils import project_root
+
+APP_FILE = str(project_root() / "streamlit_app.py")
+STEPS = ("open", "start", "answer", "result")
+ZODIACS = ("Koç", "Boğa", "İkizler", "Yengeç", "Aslan", "Başak", "Terazi", "Akrep", "Yay", "Oğlak", "Kova", "Balık")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    # En yakın sıra yöntemi (nearest-rank).
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, int(round(q / 100.0 * len(s) + 0.5)) - 1))
+    return s[k]
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.step_ms: Dict[str, List[float]] = defaultdict(list)
+        self.calls: Dict[str, Counter] = defaultdict(Counter)
+        self.runs: Counter = Counter()
+        self.errors: List[str] = []
+
+    def add_step(self, step: str, ms: float) -> None:
+        with self.lock:
+            self.step_ms[step].append(ms)
+
+    def add_call(self, sid: str, name: str) -> None:
+        with self.lock:
+            self.calls[sid][name] += 1
+
+    def add_run(self, sid: str) -> None:
+        with self.lock:
+            self.runs[sid] += 1
+
+    def export(self) -> Dict[str, Any]:
+        return {
+            "step_ms": dict(self.step_ms),
+            "calls": {sid: dict(c) for sid, c in self.calls.items()},
+            "runs": dict(self.runs),
+            "errors": list(self.errors),
+        }
+
+    def merge(self, part: Dict[str, Any]) -> None:
+        for step, values in part["step_ms"].items():
+            self.step_ms[step].extend(values)
+        for sid, c in part["calls"].items():
+            self.calls[sid].update(c)
+        self.runs.update(part["runs"])
+        self.errors.extend(part["errors"])
+
+
+def _session_id() -> str:
+    import streamlit as st
+
+    try:
+        return str(st.session_state.get("session_id", ""))
+    except Exception:
+        return ""
+
+
+def _fake_pool(n: int) -> List[Dict[str, Any]]:
+    from app.dengeleyici import ARSHETIP_KEYS
+
+    rng = random.Random(7)
+    out = []
+    for i in range(n):
+        totals = {k: rng.randint(0, 14) for k in ARSHETIP_KEYS}
+        dom = max(totals, key=totals.get)
+        zodiac = rng.choice(ZODIACS)
+        out.append(
+            {
+                "profile_id": f"bench-{i}",
+                "name": f"Kişi {i}",
+                "zodiac": zodiac,
+                "dominant": dom,
+                **{k: str(v) for k, v in totals.items()},
+                "_result": {"name": f"Kişi {i}", "zodiac": zodiac, "dominant": dom, "totals": totals},
+            }
+        )
+    return out
+
+
+def install_stubs(stats: _Stats, write_ms: float, read_ms: float, jitter: float, pool: int) -> None:
+    """
+    app.storage ve app.main içindeki storage fonksiyonlarını gecikmeli sahteleriyle değiştirir.
+    """
+    import app.main as main_mod
+    import app.storage as storage_mod
+
+    rows = _fake_pool(pool)
+
+    def sleep(ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms * random.uniform(1 - jitter, 1 + jitter) / 1000.0)
+
+    def gsheets_append(tab_name: str, row: Dict[str, Any], idempotency_key: str = "") -> Tuple[bool, str]:
+        stats.add_call(_session_id(), f"append:{tab_name}")
+        sleep(write_ms)
+        return True, f"bench append ok: {tab_name}"
+
+    def gsheets_fetch_recent_results(limit: int = 50, max_rows_scan: int = 1500, fields: Any = None):
+        stats.add_call(_session_id(), "fetch_recent_results")
+        sleep(read_ms)
+        return True, rows[-limit:], "bench fetch ok"
+
+    def gsheets_lookup_result(profile_id: str):
+        stats.add_call(_session_id(), "lookup_result")
+        sleep(read_ms)
+        return True, None, "bench lookup: not found"
+
+    def gsheets_store_bank(bank: str, lang: str, payload: Any) -> Tuple[bool, str]:
+        stats.add_call(_session_id(), "store_bank")
+        sleep(write_ms)
+        return True, "bench bank stored"
+
+    for mod in (storage_mod, main_mod):
+        mod.gsheets_append = gsheets_append
+        mod.gsheets_fetch_recent_results = gsheets_fetch_recent_results
+        mod.gsheets_lookup_result = gsheets_lookup_result
+        mod.gsheets_store_bank = gsheets_store_bank
+
+    # streamlit_app.py her çalışmada `from app.main import run_app` yapar: sayacı araya koy.
+    original = getattr(main_mod.run_app, "__wrapped__", main_mod.run_app)
+
+    def run_app() -> None:
+        try:
+            original()
+        finally:
+            stats.add_run(_session_id())
+
+    run_app.__wrapped__ = original  # type: ignore[attr-defined]
+    main_mod.run_app = run_app
+
+
+def _timed(stats: _Stats, step: str, at: Any) -> Any:
+    t0 = time.perf_counter()
+    at.run()
+    stats.add_step(step, (time.perf_counter() - t0) * 1000.0)
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].value}")
+    return at
+
+
+def journey(stats: _Stats, timeout: float) -> Optional[str]:
+    """
+    Tek kullanıcı yolculuğu. Dönen: session_id (hata olursa None).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    try:
+        _timed(stats, "open", at)
+        at.text_input[0].set_value(f"Bench {random.randint(0, 9999)}")
+        at.button[0].click()
+        _timed(stats, "start", at)
+        while at.session_state["step"] == "quiz":
+            radio = at.radio[0]
+            radio.set_value(random.choice(radio.options))
+            step = "answer"
+            if int(at.session_state["q_index"]) == len(at.session_state["answers"]) - 1:
+                step = "result"  # son cevap: sonuç + eşleşmeler aynı çalışmada çizilir
+            _timed(stats, step, at)
+        return str(at.session_state["session_id"])
+    except Exception as e:
+        with stats.lock:
+            stats.errors.append(f"{type(e).__name__}: {e}")
+        return None
+
+
+def _quiet_streamlit() -> None:
+    # Streamlit'in widget uyarıları (boş radio label'ı) raporu boğmasın.
+    # Ayar AppTest'in config yüklemesinde sıfırlandığı için log seviyesini değil, çıktıyı kapatıyoruz.
+    logging.disable(logging.WARNING)
+
+
+def _session_worker(
+    journeys: int, write_ms: float, read_ms: float, jitter: float, pool: int, timeout: float, seed: int
+) -> Tuple[Dict[str, Any], List[str]]:
+    # AppTest thread-safe değil (script çalıştırma bağlamı global); her oturum kendi process'inde.
+    _quiet_streamlit()
+    random.seed(seed)
+    stats = _Stats()
+    install_stubs(stats, write_ms, read_ms, jitter, pool)
+    ids = [sid for sid in (journey(stats, timeout) for _ in range(journeys)) if sid]
+    return stats.export(), ids
+
+
+def run_bench(
+    sessions: int = 4,
+    journeys: int = 3,
+    write_ms: float = 80.0,
+    read_ms: float = 300.0,
+    jitter: float = 0.3,
+    pool: int = 60,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    stats = _Stats()
+    # Yerel rollup/cache dosyaları gerçek runtime/ klasörünü kirletmesin (worker'lar env'i devralır).
+    os.environ.setdefault("IZ_RUNTIME_DIR", tempfile.mkdtemp(prefix="iz-bench-"))
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, sessions)) as ex:
+        futures = [
+            ex.submit(_session_worker, journeys, write_ms, read_ms, jitter, pool, timeout, seed)
+            for seed in range(sessions)
+        ]
+        done: List[str] = []
+        for fut in futures:
+            part, ids = fut.result()
+            stats.merge(part)
+            done.extend(ids)
+    wall = time.perf_counter() - t0
+
+    call_names = sorted({name for c in stats.calls.values() for name in c})
+    n = max(1, len(done))
+    return {
+        "sessions": sessions,
+        "journeys_ok": len(done),
+        "journeys_failed": len(stats.errors),
+        "errors": stats.errors[:5],
+        "wall_s": round(wall, 2),
+        "journeys_per_s": round(len(done) / wall, 3) if wall else 0.0,
+        "storage_latency_ms": {"write": write_ms, "read": read_ms, "jitter": jitter},
+        "steps_ms": {
+            step: {
+                "n": len(stats.step_ms[step]),
+                "p50": round(percentile(stats.step_ms[step], 50), 1),
+                "p95": round(percentile(stats.step_ms[step], 95), 1),
+                "p99": round(percentile(stats.step_ms[step], 99), 1),
+            }
+            for step in STEPS
+            if stats.step_ms.get(step)
+        },
+        "reruns_per_journey": {
+            "mean": round(sum(stats.runs[s] for s in done) / n, 2),
+            "max": max((stats.runs[s] for s in done), default=0),
+        },
+        "storage_calls_per_journey": {
+            name: round(sum(stats.calls[s][name] for s in done) / n, 2) for name in call_names
+        },
+    }
+
+
+def format_report(rep: Dict[str, Any]) -> str:
+    lines = [
+        f"oturum: {rep['sessions']}  yolculuk: {rep['journeys_ok']} ok / {rep['journeys_failed']} hata"
+        f"  süre: {rep['wall_s']} s  ({rep['journeys_per_s']} yolculuk/s)",
+        f"storage gecikmesi: yazma {rep['storage_latency_ms']['write']} ms, okuma {rep['storage_latency_ms']['read']} ms",
+        "",
+        f"{'adım':<8}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}",
+    ]
+    for step, s in rep["steps_ms"].items():
+        lines.append(f"{step:<8}{s['n']:>6}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}")
+    lines.append("")
+    lines.append(f"yolculuk başına script çalışması: ort {rep['reruns_per_journey']['mean']}, max {rep['reruns_per_journey']['max']}")
+    lines.append("yolculuk başına storage çağrısı:")
+    for name, v in rep["storage_calls_per_journey"].items():
+        lines.append(f"  {name:<24}{v:>8}")
+    for e in rep["errors"]:
+        lines.append(f"hata: {e}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Headless uçtan uca rerun benchmark'ı (sahte storage).")
+    ap.add_argument("--sessions", type=int, default=4, help="Paralel oturum sayısı.")
+    ap.add_argument("--journeys", type=int, default=3, help="Oturum başına yolculuk.")
+    ap.add_argument("--write-ms", type=float, default=80.0, help="append gecikmesi.")
+    ap.add_argument("--read-ms", type=float, default=300.0, help="okuma gecikmesi.")
+    ap.add_argument("--jitter", type=float, default=0.3, help="Gecikmeye +/- oran.")
+    ap.add_argument("--pool", type=int, default=60, help="Sahte eşleşme havuzu büyüklüğü.")
+    ap.add_argument("--json", action="store_true", help="Raporu JSON bas.")
+    args = ap.parse_args()
+
+    rep = run_bench(
+        sessions=args.sessions,
+        journeys=args.journeys,
+        write_ms=args.write_ms,
+        read_ms=args.read_ms,
+        jitter=args.jitter,
+        pool=args.pool,
+    )
+    print(json.dumps(rep, ensure_ascii=False, indent=2) if args.json else format_report(rep))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+results satırındaki result_json hücresi için versiyonlu codec.
+
+v2 hücre formatı: "v2:" + base64url(binary)
+  sabit kısım : versiyon, 4 trait toplamı (ARSHETIP_KEYS sırasıyla int16),
+                dominant index, score, burç kodu, bank hash (8 byte), cevap sayısı
+  değişken    : cevap index'leri (1 byte/soru), name, dob, lang (uzunluk önekli utf-8)
+
+Eski satırlar düz JSON ("{...}") olarak kalır ve aynı API ile okunur.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.dengeleyici import ARSHETIP_KEYS
+
+SCHEMA_VERSION = 2
+CELL_PREFIX = f"v{SCHEMA_VERSION}:"
+
+# Sıra kalıcı: kodlar hücrelere yazılıyor, araya ekleme yapma.
+ZODIAC_CODES = (
+    "Koç", "Boğa", "İkizler", "Yengeç", "Aslan", "Başak",
+    "Terazi", "Akrep", "Yay", "Oğlak", "Kova", "Balık",
+)
+
+# Eşleştirme akışının ihtiyaç duyduğu alanlar
+MATCH_FIELDS = ("name", "zodiac", "dominant", "totals")
+ALL_FIELDS = ("name", "dob", "zodiac", "dominant", "score", "totals", "lang", "bank", "answers")
+
+_HEADER = struct.Struct(">B4hbhb8sB")
+_NO_ANSWER = 0xFF
+
+
+def zodiac_code(zodiac: str) -> int:
+    try:
+        return ZODIAC_CODES.index(zodiac)
+    except ValueError:
+        return -1
+
+
+def zodiac_from_code(code: int) -> str:
+    return ZODIAC_CODES[code] if 0 <= code < len(ZODIAC_CODES) else ""
+
+
+def totals_vector(totals: Any) -> List[int]:
+    """
+    totals dict -> ARSHETIP_KEYS sırasında int vektör. Bilinmeyen anahtarlar atlanır.
+    """
+    if not isinstance(totals, dict):
+        return [0] * len(ARSHETIP_KEYS)
+    out: List[int] = []
+    for k in ARSHETIP_KEYS:
+        try:
+            out.append(int(totals.get(k, 0) or 0))
+        except Exception:
+            out.append(0)
+    return out
+
+
+def totals_from_vector(vec: Sequence[int]) -> Dict[str, int]:
+    # Sıfır olanlar yazılmaz: compute_scores da sadece etkilenen anahtarları döndürür.
+    return {k: int(v) for k, v in zip(ARSHETIP_KEYS, vec) if v}
+
+
+def _clamp16(v: int) -> int:
+    return max(-32768, min(32767, int(v)))
+
+
+def _pack_str(s: Any, width: str) -> bytes:
+    b = str(s or "").encode("utf-8")
+    limit = 0xFF if width == ">B" else 0xFFFF
+    b = b[:limit]
+    return struct.pack(width, len(b)) + b
+
+
+def encode_result(result: Dict[str, Any]) -> str:
+    """
+    result payload -> v2 hücre string'i.
+    """
+    dom = result.get("dominant", "") or ""
+    dom_idx = ARSHETIP_KEYS.index(dom) if dom in ARSHETIP_KEYS else -1
+
+    bank = str(result.get("bank", "") or "")
+    try:
+        bank_b = bytes.fromhex(bank[:16]).ljust(8, b"\0")
+    except ValueError:
+        bank_b = b"\0" * 8
+
+    answers = result.get("answers") or []
+    if not isinstance(answers, list):
+        answers = []
+    ans_b = bytes(
+        a if isinstance(a, int) and 0 <= a < _NO_ANSWER else _NO_ANSWER for a in answers[:255]
+    )
+
+    head = _HEADER.pack(
+        SCHEMA_VERSION,
+        *[_clamp16(v) for v in totals_vector(result.get("totals"))],
+        dom_idx,
+        _clamp16(result.get("score", 0) or 0),
+        zodiac_code(result.get("zodiac", "") or ""),
+        bank_b,
+        len(ans_b),
+    )
+    body = (
+        ans_b
+        + _pack_str(result.get("name", ""), ">H")
+        + _pack_str(result.get("dob", ""), ">B")
+        + _pack_str(result.get("lang", ""), ">B")
+    )
+    return CELL_PREFIX + base64.urlsafe_b64encode(head + body).decode("ascii").rstrip("=")
+
+
+def _decode_v2(blob: bytes, fields: Iterable[str]) -> Dict[str, Any]:
+    want = set(fields)
+    ver, t0, t1, t2, t3, dom_idx, score, zcode, bank_b, n_ans = _HEADER.unpack_from(blob, 0)
+    out: Dict[str, Any] = {}
+
+    if "totals" in want:
+        out["totals"] = totals_from_vector((t0, t1, t2, t3))
+    if "dominant" in want:
+        out["dominant"] = ARSHETIP_KEYS[dom_idx] if 0 <= dom_idx < len(ARSHETIP_KEYS) else ""
+    if "score" in want:
+        out["score"] = score
+    if "zodiac" in want:
+        out["zodiac"] = zodiac_from_code(zcode)
+    if "bank" in want:
+        out["bank"] = bank_b.hex() if bank_b.strip(b"\0") else ""
+
+    pos = _HEADER.size
+    if "answers" in want:
+        out["answers"] = [-1 if a == _NO_ANSWER else a for a in blob[pos : pos + n_ans]]
+    pos += n_ans
+
+    # Değişken uzunluklu alanlar sadece istenirse çözülür.
+    if not want & {"name", "dob", "lang"}:
+        return out
+    (n,) = struct.unpack_from(">H", blob, pos)
+    pos += 2
+    if "name" in want:
+        out["name"] = blob[pos : pos + n].decode("utf-8", errors="replace")
+    pos += n
+    for key in ("dob", "lang"):
+        (n,) = struct.unpack_from(">B", blob, pos)
+        pos += 1
+        if key in want:
+            out[key] = blob[pos : pos + n].decode("utf-8", errors="replace")
+        pos += n
+    return out
+
+
+def _decode_legacy(cell: str, fields: Iterable[str]) -> Dict[str, Any]:
+    try:
+        payload = json.loads(cell)
+    except Exception:
+        return {"raw": cell}
+    if not isinstance(payload, dict):
+        return {"raw": cell}
+    out = {k: payload[k] for k in fields if k in payload}
+    if "totals" in out and not isinstance(out["totals"], dict):
+        out["totals"] = {}
+    return out
+
+
+def decode_result(cell: Any, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    result_json hücresini çözer. fields verilirse sadece o alanlar döner.
+    v2 hücreler ve eski JSON satırları desteklenir; çözülemeyen hücre {"raw": ...} olur.
+    """
+    fields = tuple(fields) if fields is not None else ALL_FIELDS
+    if not isinstance(cell, str) or not cell:
+        return {}
+    if cell.startswith(CELL_PREFIX):
+        b64 = cell[len(CELL_PREFIX):]
+        try:
+            blob = base64.urlsafe_b64decode(b64 + "=" * (-len(b64) % 4))
+            return _decode_v2(blob, fields)
+        except (binascii.Error, struct.error, ValueError):
+            return {"raw": cell}
+    return _decode_legacy(cell, fields)
+
+
+def schema_version(cell: Any) -> int:
+    """
+    Hücrenin şema versiyonu (eski JSON: 1, tanınmayan: 0).
+    """
+    if isinstance(cell, str) and cell.startswith("v") and ":" in cell[:4]:
+        try:
+            return int(cell[1 : cell.index(":")])
+        except ValueError:
+            return 0
+    if isinstance(cell, str) and cell.lstrip().startswith("{"):
+        return 1
+    return 0
@@ -0,0 +1,267 @@
+"""
+Kapanmış results / events bölümlerinin (results_2026_09 gibi) yerel Parquet arşivi.
+
+- Kapanmış bölüm: ayı bitmiş ve SETTLE_DAYS geçmiş (saat kaymasıyla geç gelen yazmalar için pay).
+- Her bölüm runtime/archive/<tab>.parquet olarak bir kez yazılır (metin kolonlar + "_row");
+  IZ_ARCHIVE_DIR ile kalıcı bir diske yönlendirilebilir.
+- --drop: arşiv doğrulandıktan sonra bölüm Sheets'ten silinir; böylece canlı okumalar (son
+  sonuçlar, paylaşım linki, Admin senkronu) sadece birkaç aylık tabla sınırlı kalır.
+  Silinen bölümler arşivden okunur (lookup_archived, iter_archived). Arşiv tek kopya olacağı için
+  --drop sadece IZ_ARCHIVE_DIR verilmişse çalışır (runtime/ redeploy'da silinebilir).
+- Eski bölümlenmemiş tab varsayılan olarak arşivlenmez (--include-legacy).
+
+    IZ_ARCHIVE_DIR=/data/archive python -m app.compaction run --drop
+    python -m app.compaction status
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app import partitions, shared_cache
+from app.utils import runtime_path
+
+SETTLE_DAYS = 2.0
+LEASE_TTL = 1800.0
+
+
+class CompactionError(Exception):
+    pass
+
+
+def archive_dir() -> Path:
+    override = os.environ.get("IZ_ARCHIVE_DIR")
+    d = Path(override) if override else runtime_path("archive")
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def archive_path(tab: str) -> Path:
+    return archive_dir() / f"{tab}.parquet"
+
+
+def _manifest_path() -> Path:
+    return archive_dir() / "manifest.json"
+
+
+def load_manifest() -> Dict[str, Dict[str, Any]]:
+    try:
+        return json.loads(_manifest_path().read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, Dict[str, Any]]) -> None:
+    path = _manifest_path()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except Exception as e:  # opsiyonel bağımlılık
+        raise CompactionError("Arşiv için pyarrow gerekli (pip install pyarrow).") from e
+    return pa, pq
+
+
+def closed_partitions(base: str, titles: Iterable[str], now: Optional[float] = None, include_legacy: bool = False) -> List[str]:
+    """
+    Arşivlenebilir bölümler, eskiden yeniye.
+    """
+    now = time.time() if now is None else now
+    titles = list(titles)
+    out: List[str] = []
+    for tab in partitions.ordered(base, titles):
+        if tab == base:
+            closed = partitions.closed_at(base, tab, titles) if include_legacy else None
+        else:
+            year, month = partitions.partition_month(base, tab) or (0, 0)
+            closed = partitions.month_start(year + month // 12, month % 12 + 1)
+        if closed is not None and closed + SETTLE_DAYS * 86400 <= now:
+            out.append(tab)
+    return out
+
+
+def archive_partition(tab: str, reads_per_minute: Optional[float] = 50) -> Dict[str, Any]:
+    """
+    Bölümün tüm satırlarını okuyup Parquet'e yazar (atomik). Dönen: manifest kaydı.
+    """
+    from app.storage import gsheets_iter_rows
+
+    pa, pq = _pyarrow()
+    rows = list(gsheets_iter_rows(tab, reads_per_minute=reads_per_minute, partitioned=False))
+    columns: List[str] = []
+    for r in rows:
+        for c in r:
+            if c != "_row" and c not in columns:
+                columns.append(c)
+    # Sheets değerleri metin; tipler okuma tarafında (pandas/duckdb) belirlenir.
+    arrays = [pa.array([str(r.get(c, "")) for r in rows], pa.string()) for c in columns]
+    arrays.append(pa.array([int(r["_row"]) for r in rows], pa.int64()))
+    table = pa.Table.from_arrays(arrays, names=columns + ["_row"])
+
+    path = archive_path(tab)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    if pq.read_metadata(tmp).num_rows != len(rows):
+        tmp.unlink(missing_ok=True)
+        raise CompactionError(f"{tab}: arşiv doğrulanamadı.")
+    os.replace(tmp, path)
+    return {
+        "rows": len(rows),
+        "last_row": max((int(r["_row"]) for r in rows), default=1),
+        "archived_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dropped": False,
+    }
+
+
+def _safe_to_drop(tab: str, entry: Dict[str, Any]) -> bool:
+    # Arşivden sonra gelen satır var mı? (son arşivlenen satırın bir altı boş olmalı)
+    from app.storage import gsheets_read_rows
+
+    if not archive_path(tab).exists():
+        return False
+    ok, values, _ = gsheets_read_rows(tab, int(entry.get("last_row", 1)) + 1, 1, 1)
+    return ok and not values
+
+
+def run(
+    tabs: Sequence[str] = partitions.PARTITIONED_TABS,
+    drop: bool = False,
+    include_legacy: bool = False,
+    reads_per_minute: Optional[float] = 50,
+) -> Dict[str, Any]:
+    """
+    Kapanmış bölümleri arşivler (zaten arşivliyse tekrar okumaz); drop=True ise Sheets'ten siler.
+    Tek seferde tek process (shared_cache lease).
+    """
+    from app.storage import gsheets_drop_tab, gsheets_tab_partitions
+
+    _pyarrow()  # Sheets'i okumaya başlamadan: pyarrow yoksa hemen hata
+    if drop and not os.environ.get("IZ_ARCHIVE_DIR"):
+        raise CompactionError("--drop için IZ_ARCHIVE_DIR gerekli (arşiv kalıcı bir diskte olmalı).")
+    if not shared_cache.try_lease("compaction", LEASE_TTL):
+        return {"skipped": "another process is compacting"}
+    try:
+        manifest = load_manifest()
+        out: Dict[str, Any] = {"archived": [], "dropped": [], "errors": []}
+        for base in tabs:
+            ok, titles, msg = gsheets_tab_partitions(base)
+            if not ok:
+                out["errors"].append(f"{base}: {msg}")
+                continue
+            for tab in closed_partitions(base, titles, include_legacy=include_legacy):
+                entry = manifest.get(tab)
+                if not entry or not archive_path(tab).exists():
+                    entry = archive_partition(tab, reads_per_minute)
+                    manifest[tab] = entry
+                    _save_manifest(manifest)
+                    out["archived"].append(tab)
+                if drop and tab != base:
+                    if not _safe_to_drop(tab, entry):
+                        out["errors"].append(f"{tab}: arşivden sonra yeni satır var, yeniden arşivlenecek.")
+                        manifest.pop(tab, None)
+                        _save_manifest(manifest)
+                        continue
+                    ok, msg = gsheets_drop_tab(tab)
+                    if not ok:
+                        out["errors"].append(f"{tab}: {msg}")
+                        continue
+                    entry["dropped"] = True
+                    _save_manifest(manifest)
+                    out["dropped"].append(tab)
+        return out
+    finally:
+        shared_cache.release_lease("compaction")
+
+
+def _archived_tabs(base: str, skip: Iterable[str] = ()) -> List[str]:
+    skip = set(skip)
+    return [t for t in partitions.ordered(base, load_manifest()) if t not in skip and archive_path(t).exists()]
+
+
+def iter_archived(
+    base: str,
+    skip: Iterable[str] = (),
+    start_row: int = 2,
+    window: Optional[Tuple[Optional[float], Optional[float]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Arşivdeki satırlar eskiden yeniye, gsheets_iter_rows biçiminde ("_row" global, "_tab").
+    skip: hâlâ Sheets'te olan bölümler (çift okumamak için).
+    window: (start, end) verilirse ayı bu aralığın dışında kalan bölümler hiç açılmaz.
+    """
+    start_ord = partitions.split_row(start_row)[0]
+    tabs = [t for t in _archived_tabs(base, skip) if int(partitions.ordinal(base, t) or 0) >= start_ord]
+    if window is not None:
+        tabs = [t for t in tabs if partitions.in_window(base, t, *window)]
+    if not tabs:
+        return
+    _, pq = _pyarrow()
+    for tab in tabs:
+        for d in pq.read_table(archive_path(tab)).to_pylist():
+            d["_row"] = partitions.global_row(base, tab, int(d["_row"]))
+            d["_tab"] = tab
+            if d["_row"] >= start_row:
+                yield d
+
+
+def iter_all(
+    base: str,
+    start_row: int = 2,
+    window: Optional[Tuple[Optional[float], Optional[float]]] = None,
+    **kwargs: Any,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Sheets'ten silinmiş bölümler (arşivden) + Sheets'teki bölümler, eskiden yeniye.
+    window ve kwargs storage.gsheets_iter_rows'a geçer.
+    """
+    from app.storage import gsheets_iter_rows, gsheets_tab_partitions
+
+    ok, titles, msg = gsheets_tab_partitions(base)
+    if not ok:
+        raise RuntimeError(msg)
+    yield from iter_archived(base, skip=titles, start_row=start_row, window=window)
+    yield from gsheets_iter_rows(base, start_row=start_row, window=window, **kwargs)
+
+
+def lookup_archived(base: str, profile_id: str) -> Optional[Dict[str, Any]]:
+    """
+    profile_id'nin arşivdeki en yeni satırı ya da None.
+    """
+    tabs = _archived_tabs(base)
+    if not tabs:
+        return None
+    _, pq = _pyarrow()
+    for tab in reversed(tabs):
+        rows = pq.read_table(archive_path(tab), filters=[("profile_id", "==", profile_id)]).to_pylist()
+        if rows:
+            return rows[-1]
+    return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Kapanmış results/events bölümlerini Parquet'e arşivler.")
+    ap.add_argument("command", choices=["run", "status"])
+    ap.add_argument("--tabs", nargs="+", default=list(partitions.PARTITIONED_TABS), choices=partitions.PARTITIONED_TABS)
+    ap.add_argument("--drop", action="store_true", help="Arşivlenen bölümü Sheets'ten sil")
+    ap.add_argument("--include-legacy", action="store_true", help="Eski bölümlenmemiş tabı da arşivle (silinmez)")
+    ap.add_argument("--reads-per-minute", type=float, default=50)
+    args = ap.parse_args()
+    if args.command == "run":
+        result = run(args.tabs, drop=args.drop, include_legacy=args.include_legacy, reads_per_minute=args.reads_per_minute)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps(load_manifest(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,37 @@
+"""
+Yerel JSONL event log'u ve sözlük kodlu (bank, qi, oi) event'ler.
+
+question_answered event'leri soru/seçenek metnini taşımaz; sadece
+bank (bank_hash), qi (soru index'i) ve oi (option index'i) yazılır.
+Metinler gerektiğinde bankanın metin tablosundan çözülür (rehydrate_event):
+data/ -> runtime/banks arşivi -> Sheets banks tabı.
+
+Eski, metin taşıyan log'lar için:
+    python -m app.events compact events_log.jsonl --out events_log.compact.jsonl
+"""
+from __future__ import annotations
+
+import argparse
 import json
-from pathlib import Path
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.questions import Question, archive_bank, load_bank_by_hash, load_bank_for_lang, parse_questions
+
+# Eski log'larda metin taşıyan alanlar (compact ile kaldırılır)
+TEXT_FIELDS = ("question", "choice", "effect", "text", "mini_sahne")
+
+BankLoader = Callable[[str], Optional[List[Question]]]
+
 
 def append_event(path: Path, event: dict) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a", encoding="utf-8") as f:
         f.write(json.dumps(event, ensure_ascii=False) + "\n")
 
+
 def log_event(path: Path, name: str, payload: dict) -> None:
     event = {
         "ts": datetime.now().isoformat(timespec="seconds"),
@@ -14,3 +39,156 @@ def log_event(path: Path, name: str, payload: dict) -> None:
         **(payload or {}),
     }
     append_event(path, event)
+
+
+_bank_cache: Dict[str, Optional[List[Question]]] = {}
+
+
+def load_bank(bank: str) -> Optional[List[Question]]:
+    """
+    Hash'ten banka: yerelde yoksa Sheets banks tabına bakılır ve yerel arşive yazılır.
+    Sonuç (None dahil) process içinde cache'lenir.
+    """
+    if bank in _bank_cache:
+        return _bank_cache[bank]
+    questions = load_bank_by_hash(bank)
+    if questions is None and bank:
+        try:
+            from app.storage import gsheets_load_bank
+
+            ok, payload, _ = gsheets_load_bank(bank)
+            if ok and payload:
+                questions = parse_questions(payload)
+                archive_bank(questions, bank)
+        except Exception:
+            questions = None
+    _bank_cache[bank] = questions
+    return questions
+
+
+def event_body(rec: Dict[str, Any]) -> Dict[str, Any]:
+    # Sheets satırında alanlar event_json içinde, yerel log'da kaydın kendisinde.
+    raw = rec.get("event_json")
+    if isinstance(raw, dict):
+        return raw
+    if isinstance(raw, str) and raw.startswith("{"):
+        try:
+            return json.loads(raw)
+        except Exception:
+            return {}
+    return rec
+
+
+def rehydrate_event(rec: Dict[str, Any], loader: BankLoader = load_bank) -> Dict[str, Any]:
+    """
+    (bank, qi, oi) taşıyan event'e question / text / mini_sahne / effect ekler.
+    Çözülemeyen ya da zaten metin taşıyan event olduğu gibi döner.
+    """
+    body = event_body(rec)
+    bank, qi, oi = body.get("bank"), body.get("qi"), body.get("oi")
+    if not bank or qi is None or oi is None or "text" in body:
+        return body
+    questions = loader(str(bank))
+    try:
+        q = questions[int(qi)] if questions else None
+        opt = q.options[int(oi)] if q else None
+    except (IndexError, ValueError, TypeError):
+        q = opt = None
+    if opt is None:
+        return body
+    return {**body, "question": q.soru, "text": opt.yazi, "mini_sahne": opt.mini_sahne, "effect": dict(opt.etki)}
+
+
+def compact_event(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Eski metinli question_answered kaydını (bank, qi, oi) biçimine çevirir.
+    Metin güncel bankada bulunamazsa kayıt değiştirilmez (bilgi kaybı olmasın).
+    """
+    if (rec.get("event") or rec.get("event_name")) != "question_answered" or "oi" in rec:
+        return rec
+    choice = rec.get("choice") or rec.get("text")
+    qi = rec.get("qi", rec.get("step"))
+    if not isinstance(choice, str) or qi is None:
+        return rec
+    questions, bank = load_bank_for_lang(str(rec.get("lang") or "TR"))
+    try:
+        qi = int(qi)
+        labels = [o.yazi for o in questions[qi].options]
+    except (IndexError, ValueError, TypeError):
+        return rec
+    if choice not in labels:
+        return rec
+    archive_bank(questions, bank)
+    out = {k: v for k, v in rec.items() if k not in TEXT_FIELDS and k != "step"}
+    out.update({"bank": bank, "qi": qi, "oi": labels.index(choice)})
+    return out
+
+
+def _iter_lines(path: Path) -> Iterator[str]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def compact_log(src: Path, dst: Path) -> Dict[str, Any]:
+    """
+    Log'u satır satır (sabit bellek) sıkıştırır. Bozuk satırlar aynen korunur.
+    """
+    n = changed = 0
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as out:
+        for line in _iter_lines(src):
+            n += 1
+            try:
+                rec = json.loads(line)
+            except Exception:
+                out.write(line if line.endswith("\n") else line + "\n")
+                continue
+            new = compact_event(rec)
+            changed += new is not rec
+            out.write(json.dumps(new, ensure_ascii=False) + "\n")
+    tmp.replace(dst)
+    return {"lines": n, "compacted": changed, "bytes_before": src.stat().st_size, "bytes_after": dst.stat().st_size}
+
+
+def _parse_seconds(path: Path) -> float:
+    t0 = time.perf_counter()
+    for line in _iter_lines(path):
+        try:
+            json.loads(line)
+        except Exception:
+            pass
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Yerel event log araçları.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    c = sub.add_parser("compact", help="Metinli question_answered kayıtlarını (bank, qi, oi) biçimine çevirir.")
+    c.add_argument("log", type=Path)
+    c.add_argument("--out", type=Path, default=None, help="Varsayılan: <log>.compact.jsonl")
+    r = sub.add_parser("show", help="Kayıtları metinleri çözülmüş olarak basar.")
+    r.add_argument("log", type=Path)
+    r.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.command == "compact":
+        dst = args.out or args.log.with_suffix(".compact.jsonl")
+        stats = compact_log(args.log, dst)
+        stats["parse_s_before"] = round(_parse_seconds(args.log), 4)
+        stats["parse_s_after"] = round(_parse_seconds(dst), 4)
+        stats["out"] = str(dst)
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        for i, line in enumerate(_iter_lines(args.log)):
+            if i >= args.limit:
+                break
+            try:
+                print(json.dumps(rehydrate_event(json.loads(line)), ensure_ascii=False))
+            except Exception:
+                print(line.rstrip("\n"))
+
+
+if __name__ == "__main__":
+    main()
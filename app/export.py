@@ -0,0 +1,312 @@
+"""
+results / events için akışlı toplu export (CSV veya Parquet).
+
+Kayıtlar storage katmanından sayfa sayfa okunur (ya da yerel JSONL log'dan),
+zaman aralığına göre süzülür, seçili kolonlara indirgenir ve dosyaya parça parça yazılır.
+Bellek: bir okuma sayfası + bir yazma parçası; satır sayısından bağımsız.
+
+    python -m app.export results --format parquet --since 2026-01-01 --out runtime/results.parquet
+    python -m app.export events --source log --log events_log.jsonl --columns ts,event,profile_id
+
+Kolon adları: tab kolonları (ts_utc, profile_id, ...) ya da noktalı yol:
+    result.totals.merak, result.lang, event.qi  (result_json / event_json anında çözülür)
+    event.text, event.question                  (bank/qi/oi'den banka metin tablosuyla)
+result.dob (doğum tarihi) kişisel veri olduğu için varsayılan kolonlarda yok; --columns ile istenir.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from app.codec import ALL_FIELDS, decode_result
+from app.dengeleyici import ARSHETIP_KEYS
+from app.events import TEXT_FIELDS, event_body, rehydrate_event
+from app.jsonl_index import JsonlTimeIndex, parse_ts, record_ts
+from app.utils import runtime_path
+
+TABS = ("results", "events")
+FORMATS = ("csv", "parquet")
+CHUNK_ROWS = 5000
+
+DEFAULT_COLUMNS = {
+    "results": ["ts_utc", "session_id", "profile_id", "name", "zodiac", "dominant", "score"]
+    + [f"result.totals.{k}" for k in ARSHETIP_KEYS]
+    + ["result.lang", "result.bank", "app_version"],
+    "events": ["ts_utc", "session_id", "profile_id", "event_name", "event_json", "app_version"],
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def _parse_bound(value: Optional[str]) -> Optional[float]:
+    # "2026-01-01" ya da tam ISO zaman -> epoch (UTC)
+    if not value:
+        return None
+    ts = parse_ts(value if "T" in value else value + "T00:00:00")
+    if ts is None:
+        raise ExportError(f"Zaman okunamadı: {value}")
+    return ts
+
+
+def _lookup(obj: Any, path: Sequence[str]) -> Any:
+    for part in path:
+        if not isinstance(obj, dict):
+            return ""
+        obj = obj.get(part, "")
+    return obj
+
+
+class _Projector:
+    """
+    Kayıt -> seçili kolon değerleri. result_json / event_json sadece gerekiyorsa ve bir kez çözülür.
+    """
+
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.columns = list(columns)
+        self.paths = [c.split(".") for c in self.columns]
+        self.needs_result = any(p[0] == "result" and len(p) > 1 for p in self.paths)
+        self.needs_event = any(p[0] == "event" and len(p) > 1 for p in self.paths)
+        # event.text / event.question ...: (bank, qi, oi) metin tablosundan çözülür
+        self.needs_text = any(p[0] == "event" and len(p) > 1 and p[1] in TEXT_FIELDS for p in self.paths)
+
+    def row(self, rec: Dict[str, Any]) -> List[Any]:
+        result = decode_result(rec.get("result_json", ""), ALL_FIELDS) if self.needs_result else {}
+        event = {}
+        if self.needs_text:
+            event = rehydrate_event(rec)
+        elif self.needs_event:
+            event = event_body(rec)
+        out: List[Any] = []
+        for col, path in zip(self.columns, self.paths):
+            if len(path) > 1 and path[0] == "result":
+                v = _lookup(result, path[1:])
+                if v == "" and path[1] == "totals" and result.get("totals"):
+                    v = 0  # codec sıfır trait'leri yazmaz
+            elif len(path) > 1 and path[0] == "event":
+                v = _lookup(event, path[1:])
+            else:
+                v = rec.get(col, "")
+                if v == "" and col == "ts_utc":
+                    v = rec.get("timestamp") or rec.get("ts") or ""
+                if v == "" and col == "event_name":
+                    v = rec.get("event", "")
+            if isinstance(v, (dict, list)):
+                v = json.dumps(v, ensure_ascii=False)
+            out.append("" if v is None else v)
+        return out
+
+
+def iter_records(
+    tab: str,
+    source: str = "sheets",
+    log_path: Optional[Path] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    page_size: int = 1000,
+    reads_per_minute: Optional[float] = 50,
+) -> Iterator[Dict[str, Any]]:
+    """
+    start <= ts < end kayıtları sırayla verir (None = açık uç).
+    source="sheets": storage üzerinden sayfa sayfa; "log": yerel JSONL (zaman index'i ile).
+    """
+    if source == "log":
+        if log_path is None:
+            raise ExportError("--source log için --log yolu gerekli.")
+        yield from JsonlTimeIndex(log_path).refresh().window(start, end)
+        return
+    if tab not in TABS:
+        raise ExportError(f"Bilinmeyen tab: {tab}")
+
+    # Storage streamlit secrets'a bağlı; sadece gerçekten okunacaksa import et.
+    # iter_all: Sheets'ten silinmiş (arşivlenmiş) aylık bölümler de dahil.
+    # Ayı aralığın dışında kalan bölümler okunmaz; kalanlarda satır satır süzülür.
+    from app.compaction import iter_all
+
+    window = None if start is None and end is None else (start, end)
+    for rec in iter_all(tab, window=window, page_size=page_size, reads_per_minute=reads_per_minute):
+        if start is None and end is None:
+            yield rec
+            continue
+        ts = record_ts(rec, ("ts_utc", "timestamp", "ts"))
+        if ts is not None and (start is None or ts >= start) and (end is None or ts < end):
+            yield rec
+
+
+class _CsvSink:
+    def __init__(self, out: IO[bytes], columns: Sequence[str]) -> None:
+        self.text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(columns)
+
+    def write(self, rows: List[List[Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.text.flush()
+        self.text.detach()
+
+
+class _ParquetSink:
+    def __init__(self, out: IO[bytes], columns: Sequence[str]) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except Exception as e:  # opsiyonel bağımlılık
+            raise ExportError("Parquet için pyarrow gerekli (pip install pyarrow).") from e
+        self.pa = pa
+        self.columns = list(columns)
+        # Sheets değerleri metin; tipler okuma tarafında (pandas/duckdb) belirlenir.
+        self.schema = pa.schema([(c, pa.string()) for c in self.columns])
+        self.writer = pq.ParquetWriter(out, self.schema, compression="zstd")
+
+    def write(self, rows: List[List[Any]]) -> None:
+        cols = [[("" if r[i] is None else str(r[i])) for r in rows] for i in range(len(self.columns))]
+        self.writer.write_table(self.pa.Table.from_arrays(cols, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@dataclass
+class ExportProgress:
+    rows: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    error: str = ""
+    path: Optional[Path] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+
+def write_export(
+    records: Iterable[Dict[str, Any]],
+    out: IO[bytes],
+    columns: Sequence[str],
+    fmt: str = "csv",
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Optional[ExportProgress] = None,
+) -> int:
+    """
+    Kayıtları chunk_rows'luk parçalar halinde out'a yazar. Dönen: satır sayısı.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Bilinmeyen format: {fmt}")
+    projector = _Projector(columns)
+    sink = _ParquetSink(out, columns) if fmt == "parquet" else _CsvSink(out, columns)
+    n = 0
+    buf: List[List[Any]] = []
+    try:
+        for rec in records:
+            buf.append(projector.row(rec))
+            if len(buf) >= chunk_rows:
+                sink.write(buf)
+                n += len(buf)
+                buf = []
+                if progress is not None:
+                    progress.rows = n
+        if buf or (fmt == "parquet" and n == 0):
+            sink.write(buf)
+            n += len(buf)
+    finally:
+        sink.close()
+    if progress is not None:
+        progress.rows = n
+    return n
+
+
+def export_to_file(
+    tab: str,
+    path: Path,
+    fmt: str = "csv",
+    columns: Optional[Sequence[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    source: str = "sheets",
+    log_path: Optional[Path] = None,
+    reads_per_minute: Optional[float] = 50,
+    progress: Optional[ExportProgress] = None,
+) -> int:
+    """
+    Önce .part dosyasına yazar, bitince yeniden adlandırır (yarım dosya indirilmez).
+    until dahil: "2026-01-31" o günün sonuna kadar.
+    """
+    start = _parse_bound(since)
+    end = _parse_bound(until)
+    if end is not None and until and "T" not in until:
+        end += 24 * 3600
+    records = iter_records(tab, source, log_path, start, end, reads_per_minute=reads_per_minute)
+    tmp = path.with_suffix(path.suffix + ".part")
+    with tmp.open("wb") as f:
+        n = write_export(records, f, columns or DEFAULT_COLUMNS.get(tab, []), fmt, progress=progress)
+    tmp.replace(path)
+    return n
+
+
+def default_export_path(tab: str, fmt: str) -> Path:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return runtime_path(f"exports/{tab}_{stamp}.{fmt}")
+
+
+def start_background_export(tab: str, fmt: str = "csv", **kwargs: Any) -> ExportProgress:
+    """
+    Export'u ayrı thread'de başlatır (Admin sayfası rerun'ları beklemez). Durum: dönen progress.
+    """
+    path = default_export_path(tab, fmt)
+    progress = ExportProgress(path=path)
+
+    def run() -> None:
+        try:
+            export_to_file(tab, path, fmt, progress=progress, **kwargs)
+        except Exception as e:
+            progress.error = f"{type(e).__name__}: {e}"
+        finally:
+            progress.finished_at = time.time()
+
+    threading.Thread(target=run, name=f"iz-export-{tab}", daemon=True).start()
+    return progress
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="results / events akışlı export (CSV / Parquet).")
+    ap.add_argument("tab", choices=TABS)
+    ap.add_argument("--format", choices=FORMATS, default="csv")
+    ap.add_argument("--out", type=Path, default=None, help="Varsayılan: runtime/exports/<tab>_<zaman>.<format>")
+    ap.add_argument("--columns", default="", help="Virgülle ayrılmış kolonlar (result.totals.merak gibi yollar olabilir).")
+    ap.add_argument("--since", default=None, help="Başlangıç (dahil), ISO tarih/zaman, UTC.")
+    ap.add_argument("--until", default=None, help="Bitiş (tarih ise o gün dahil), UTC.")
+    ap.add_argument("--source", choices=("sheets", "log"), default="sheets")
+    ap.add_argument("--log", type=Path, default=None, help="--source log için JSONL dosyası.")
+    ap.add_argument("--reads-per-minute", type=float, default=50)
+    args = ap.parse_args()
+
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] or None
+    path = args.out or default_export_path(args.tab, args.format)
+    t0 = time.time()
+    n = export_to_file(
+        args.tab,
+        path,
+        args.format,
+        columns=columns,
+        since=args.since,
+        until=args.until,
+        source=args.source,
+        log_path=args.log,
+        reads_per_minute=args.reads_per_minute,
+    )
+    print(json.dumps({"rows": n, "path": str(path), "seconds": round(time.time() - t0, 1)}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
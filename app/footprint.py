@@ -0,0 +1,201 @@
+"""
+Oturum başına session_state ayak izi ve boşta kalan oturumların temizlenmesi.
+
+- approx_size: objenin yaklaşık bellek boyutu (iç içe dict/list dahil, paylaşılan objeler bir kez).
+- track(): her rerun'da oturumun anahtar başına boyutunu process kayıt defterine yazar.
+- sweep(): IDLE_TIMEOUT'tan uzun süredir rerun görmeyen oturumlarda yeniden üretilebilir
+  verileri (EVICTABLE_*: uyum listesi, bitmiş Admin işleri) siler; kapanmış oturumları defterden düşer.
+
+Kalıcı cache'ler (worksheet, header, sonuç listeleri) session_state'te değil,
+process seviyesinde tutulur (storage / shared_cache); burada sadece oturumun kendi verisi kalır.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Set
+
+IDLE_TIMEOUT = 30 * 60
+FORGET_AFTER = 6 * 3600
+SWEEP_INTERVAL = 60.0
+
+# Oturum boştayken silinebilecek, gerektiğinde yeniden üretilen anahtarlar.
+EVICTABLE_KEYS = {"last_sheets_status"}
+# Admin arka plan işleri: sadece bitmişse (sonuç dosyada / SQLite'ta, iş tekrar başlatılabilir).
+EVICTABLE_JOBS = {"_export_job", "_tribes_job"}
+# dict değerli anahtarlarda None'a çekilen alanlar; main.py None görünce yeniden hesaplar.
+EVICTABLE_FIELDS = {"_result_memo": ("matches",)}
+
+
+def approx_size(obj: Any, _seen: Optional[Set[int]] = None, _depth: int = 0) -> int:
+    """
+    sys.getsizeof'un iç içe hali. Aynı obje iki kez sayılmaz; çok derin yapılarda durur.
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen or _depth > 8:
+        return 0
+    seen.add(id(obj))
+    try:
+        size = sys.getsizeof(obj)
+    except Exception:
+        return 0
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k, seen, _depth + 1) + approx_size(v, seen, _depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for v in obj:
+            size += approx_size(v, seen, _depth + 1)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), seen, _depth + 1)
+    return size
+
+
+def state_footprint(state: Mapping[str, Any]) -> Dict[str, int]:
+    """
+    {anahtar: yaklaşık byte}, büyükten küçüğe.
+    """
+    seen: Set[int] = set()
+    sizes = {str(k): approx_size(v, seen) for k, v in state.items()}
+    return dict(sorted(sizes.items(), key=lambda x: -x[1]))
+
+
+def _evict(state: Any, key: str) -> Optional[int]:
+    """
+    key'in yeniden üretilebilir kısmını siler. Dönen: boşalan yaklaşık byte; silinecek bir şey yoksa None.
+    """
+    value = state[key] if key in state else None  # SafeSessionState'te get() yok
+    if value is None:
+        return None
+    if key in EVICTABLE_KEYS:
+        freed = approx_size(value)
+        del state[key]
+        return freed
+    if key in EVICTABLE_JOBS:
+        if getattr(value, "finished_at", None) is None:
+            return None  # hâlâ çalışıyor
+        freed = approx_size(value)
+        del state[key]
+        return freed
+    if key in EVICTABLE_FIELDS and isinstance(value, dict):
+        freed = 0
+        for f in EVICTABLE_FIELDS[key]:
+            if value.get(f) is not None:
+                freed += approx_size(value[f])
+                value[f] = None
+        return freed or None
+    return None
+
+
+@dataclass
+class SessionInfo:
+    last_seen: float
+    bytes: int
+    keys: Dict[str, int]
+    state_ref: Optional[Any] = None  # weakref: oturum kapanınca kendiliğinden düşer
+    evicted: bool = False
+
+
+@dataclass
+class Registry:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    sessions: Dict[str, SessionInfo] = field(default_factory=dict)
+    last_sweep: float = 0.0
+    evicted_keys: int = 0
+    evicted_bytes: int = 0
+
+    def track(self, session_id: str, state: Mapping[str, Any], raw_state: Any = None) -> SessionInfo:
+        keys = state_footprint(state)
+        ref = None
+        if raw_state is not None:
+            try:
+                ref = weakref.ref(raw_state)
+            except TypeError:
+                ref = None
+        info = SessionInfo(time.time(), sum(keys.values()), keys, ref)
+        with self.lock:
+            self.sessions[session_id] = info
+        return info
+
+    def sweep(self, idle: float = IDLE_TIMEOUT, forget_after: float = FORGET_AFTER, force: bool = False) -> int:
+        """
+        Boştaki oturumlarda silinebilir anahtarları temizler. Dönen: silinen anahtar sayısı.
+        """
+        now = time.time()
+        with self.lock:
+            if not force and now - self.last_sweep < SWEEP_INTERVAL:
+                return 0
+            self.last_sweep = now
+            items = list(self.sessions.items())
+
+        removed = 0
+        for sid, info in items:
+            state = info.state_ref() if info.state_ref is not None else None
+            age = now - info.last_seen
+            if (info.state_ref is not None and state is None) or age > forget_after:
+                with self.lock:
+                    self.sessions.pop(sid, None)
+                continue
+            if age < idle or info.evicted or state is None:
+                continue
+            running = False
+            for key in list(info.keys):
+                try:
+                    freed = _evict(state, key)
+                except Exception:
+                    continue
+                if freed is None:
+                    running = running or (key in EVICTABLE_JOBS and key in state)
+                    continue
+                removed += 1
+                with self.lock:
+                    self.evicted_keys += 1
+                    self.evicted_bytes += freed
+            # Çalışan bir iş varsa sonraki sweep'te tekrar bakılır.
+            info.evicted = not running
+        return removed
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            infos = list(self.sessions.values())
+            evicted_keys, evicted_bytes = self.evicted_keys, self.evicted_bytes
+        now = time.time()
+        per_key: Dict[str, int] = {}
+        for info in infos:
+            for k, v in info.keys.items():
+                # Widget/soru anahtarlarını (pick_3 ...) tek satırda topla.
+                name = k.split("_")[0] + "_*" if k.startswith("pick_") else k
+                per_key[name] = per_key.get(name, 0) + v
+        total = sum(i.bytes for i in infos)
+        return {
+            "sessions": len(infos),
+            "idle": sum(1 for i in infos if now - i.last_seen >= IDLE_TIMEOUT),
+            "total_bytes": total,
+            "avg_bytes": int(total / len(infos)) if infos else 0,
+            "max_bytes": max((i.bytes for i in infos), default=0),
+            "top_keys": sorted(per_key.items(), key=lambda x: -x[1])[:10],
+            "evicted_keys": evicted_keys,
+            "evicted_bytes": evicted_bytes,
+        }
+
+
+_registry = Registry()
+
+
+def registry() -> Registry:
+    # Process başına tek defter (Streamlit rerun'ları modülü yeniden import etmez).
+    return _registry
+
+
+def human_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} GB"
+
+
+def top_keys(keys: Dict[str, int], n: int = 8) -> List[Dict[str, Any]]:
+    return [{"key": k, "bytes": v} for k, v in list(keys.items())[:n]]
@@ -0,0 +1,417 @@
+"""
+Event log'undan tek geçişte huni (funnel) ve soru bazında terk analizi.
+
+app_opened -> intro_completed -> soru 1..N (question_answered) -> result_shown -> compatibility_list_shown
+
+- Event'ler sırayla bir kez okunur; bellekte sadece açık oturumlar durur (session_id -> küçük durum).
+- SESSION_TIMEOUT boyunca event görmeyen oturum kapanır ve ulaştığı en ileri adım sayılır.
+  Açık oturum sayısı MAX_OPEN_SESSIONS'ı aşarsa en eski oturum erken kapatılır (bellek sınırlı).
+- Soru başına bekleme süresi (önceki adımdan bu cevaba) kovalı histogramla tutulur.
+- Durum runtime/funnel_checkpoint.json'a yazılır; sonraki çalıştırma kaldığı satırdan / byte'tan devam eder.
+
+    python -m app.funnel update
+    python -m app.funnel update --source log --log events_log.jsonl
+    python -m app.funnel report --include-open
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.events import event_body
+from app.jsonl_index import record_ts
+from app.utils import runtime_path
+
+SESSION_TIMEOUT = 30 * 60
+MAX_OPEN_SESSIONS = 50_000
+CHECKPOINT_EVERY = 5000  # event
+LEASE_TTL = 15 * 60
+
+# Bekleme süresi kovaları (saniye, üst sınır); son kova "300s+".
+DWELL_BUCKETS = (2, 5, 10, 20, 30, 60, 120, 300)
+
+# Adım sırası: 0, 1, soru n -> 1 + n, sonra sonuç ve uyum listesi.
+RANK_APP_OPENED = 0
+RANK_INTRO = 1
+RANK_RESULT = 10_000
+RANK_COMPAT = 10_001
+
+LANGS = ("TR", "EN")
+UNKNOWN_LANG = "?"
+
+
+def dwell_labels() -> List[str]:
+    return [f"<={b}s" for b in DWELL_BUCKETS] + [f">{DWELL_BUCKETS[-1]}s"]
+
+
+def _bucket(seconds: float) -> int:
+    for i, b in enumerate(DWELL_BUCKETS):
+        if seconds <= b:
+            return i
+    return len(DWELL_BUCKETS)
+
+
+def _bank_langs() -> Dict[str, str]:
+    # question_answered dil taşımaz; bank hash'inden dil çıkarılır (güncel bankalar).
+    from app.questions import load_bank_for_lang
+
+    out: Dict[str, str] = {}
+    for lang in LANGS:
+        try:
+            out.setdefault(load_bank_for_lang(lang)[1], lang)
+        except Exception:
+            continue
+    return out
+
+
+@dataclass
+class FunnelState:
+    source: str = "sheets"
+    log_path: str = ""
+    position: int = 0  # sheets: sıradaki satır no; log: byte offset
+    watermark: float = 0.0  # görülen en büyük event zamanı
+    events: int = 0
+    skipped: int = 0
+    # session_id -> {"lang", "last", "stage", "prev", "q"}; son aktiviteye göre sıralı
+    open: "OrderedDict[str, Dict[str, Any]]" = field(default_factory=OrderedDict)
+    # dil -> {en ileri adım rank'i: kapanan oturum sayısı}
+    finished: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # soru no (1 tabanlı) -> kova sayıları
+    dwell: Dict[str, List[int]] = field(default_factory=dict)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "log_path": self.log_path,
+            "position": self.position,
+            "watermark": self.watermark,
+            "events": self.events,
+            "skipped": self.skipped,
+            "open": list(self.open.items()),
+            "finished": self.finished,
+            "dwell": self.dwell,
+            "dwell_buckets": list(DWELL_BUCKETS),
+        }
+
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "FunnelState":
+        st = cls(
+            source=d.get("source", "sheets"),
+            log_path=d.get("log_path", ""),
+            position=int(d.get("position", 0)),
+            watermark=float(d.get("watermark", 0.0)),
+            events=int(d.get("events", 0)),
+            skipped=int(d.get("skipped", 0)),
+            finished=d.get("finished") or {},
+            dwell=d.get("dwell") or {},
+        )
+        st.open = OrderedDict((sid, s) for sid, s in d.get("open") or [])
+        return st
+
+
+class FunnelEngine:
+    """
+    Event'leri tek tek alır; durum FunnelState'te (checkpoint'e yazılabilir).
+    """
+
+    def __init__(
+        self,
+        state: FunnelState,
+        timeout: float = SESSION_TIMEOUT,
+        max_open: int = MAX_OPEN_SESSIONS,
+        bank_langs: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.state = state
+        self.timeout = timeout
+        self.max_open = max_open
+        self.bank_langs = _bank_langs() if bank_langs is None else bank_langs
+
+    def _finish(self, s: Dict[str, Any]) -> None:
+        if s["stage"] < 0:
+            return
+        by_stage = self.state.finished.setdefault(s["lang"] or UNKNOWN_LANG, {})
+        key = str(s["stage"])
+        by_stage[key] = by_stage.get(key, 0) + 1
+
+    def _dwell(self, q: int, seconds: float) -> None:
+        counts = self.state.dwell.setdefault(str(q), [0] * (len(DWELL_BUCKETS) + 1))
+        counts[_bucket(seconds)] += 1
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        st = self.state
+        sid = str(rec.get("session_id") or "")
+        name = str(rec.get("event_name") or rec.get("event") or "")
+        ts = record_ts(rec, ("ts_utc", "ts", "timestamp"))
+        if not sid or not name or ts is None:
+            st.skipped += 1
+            return
+        st.events += 1
+        st.watermark = max(st.watermark, ts)
+
+        s = st.open.pop(sid, None)
+        if s is not None and ts - s["last"] > self.timeout:
+            # Uzun aradan sonra aynı session_id: önceki ziyaret kapanır.
+            self._finish(s)
+            s = None
+        if s is None:
+            s = {"lang": "", "last": ts, "stage": -1, "prev": None, "q": 0}
+        st.open[sid] = s
+
+        body = event_body(rec)
+        lang = body.get("lang") or self.bank_langs.get(str(body.get("bank") or ""))
+        if lang:
+            s["lang"] = str(lang).upper()  # en son bilinen dil (intro'da değiştirilebilir)
+
+        rank = -1
+        if name == "app_opened":
+            rank = RANK_APP_OPENED
+        elif name == "intro_completed":
+            rank = RANK_INTRO
+            s["prev"] = ts
+        elif name == "question_answered":
+            qi = body.get("qi", body.get("step"))
+            try:
+                n = int(qi) + 1
+            except (TypeError, ValueError):
+                n = 0
+            if n > s["q"]:
+                # Sadece sıradaki sorunun ilk cevabı: "Geri" ile düzeltmeler süreyi bozmasın.
+                if n == s["q"] + 1 and s["prev"] is not None:
+                    self._dwell(n, max(0.0, ts - s["prev"]))
+                s["q"] = n
+                s["prev"] = ts
+                rank = RANK_INTRO + n
+        elif name == "result_shown":
+            rank = RANK_RESULT
+        elif name == "compatibility_list_shown":
+            rank = RANK_COMPAT
+        s["stage"] = max(s["stage"], rank)
+        s["last"] = max(s["last"], ts)
+        self.expire()
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Son aktivitesi now - timeout'tan eski oturumları (ve sınırı aşanları) kapatır.
+        now verilmezse event zamanı (watermark) kullanılır; geçmiş log'u işlerken de doğru çalışır.
+        """
+        st = self.state
+        cutoff = (st.watermark if now is None else now) - self.timeout
+        n = 0
+        while st.open:
+            sid, s = next(iter(st.open.items()))
+            if s["last"] >= cutoff and len(st.open) <= self.max_open:
+                break
+            st.open.popitem(last=False)
+            self._finish(s)
+            n += 1
+        return n
+
+
+def _rank_label(rank: int) -> str:
+    if rank == RANK_APP_OPENED:
+        return "app_opened"
+    if rank == RANK_INTRO:
+        return "intro_completed"
+    if rank == RANK_RESULT:
+        return "result_shown"
+    if rank == RANK_COMPAT:
+        return "compatibility_list_shown"
+    return f"q{rank - RANK_INTRO}"
+
+
+def _steps(by_stage: Dict[int, int], n_questions: int) -> List[Dict[str, Any]]:
+    ranks = [RANK_APP_OPENED, RANK_INTRO] + [RANK_INTRO + i for i in range(1, n_questions + 1)] + [RANK_RESULT, RANK_COMPAT]
+    out: List[Dict[str, Any]] = []
+    first = prev = None
+    for r in ranks:
+        reached = sum(n for stage, n in by_stage.items() if stage >= r)
+        first = reached if first is None else first
+        out.append(
+            {
+                "step": _rank_label(r),
+                "reached": reached,
+                "conversion": round(reached / prev, 4) if prev else None,
+                "overall": round(reached / first, 4) if first else None,
+                "dropped": (prev - reached) if prev is not None else 0,
+            }
+        )
+        prev = reached
+    return out
+
+
+def report(
+    state: FunnelState,
+    include_open: bool = False,
+    timeout: float = SESSION_TIMEOUT,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Adım bazında ulaşan / dönüşüm / terk, dil kırılımı ve soru başına bekleme histogramları.
+    Checkpoint'te açık kalmış ama duvar saatine göre süresi dolmuş oturumlar kapanmış sayılır
+    (durum değişmez; checkpoint'ten devam etmek tek geçişle aynı sonucu verir).
+    include_open: henüz süresi dolmamış oturumları da ulaştıkları adımla say.
+    """
+    by_lang: Dict[str, Dict[int, int]] = {}
+    for lang, stages in state.finished.items():
+        d = by_lang.setdefault(lang, {})
+        for k, n in stages.items():
+            d[int(k)] = d.get(int(k), 0) + int(n)
+    cutoff = (time.time() if now is None else now) - timeout
+    in_progress = 0
+    for s in state.open.values():
+        if s["last"] >= cutoff:
+            in_progress += 1
+            if not include_open:
+                continue
+        if s["stage"] >= 0:
+            d = by_lang.setdefault(s["lang"] or UNKNOWN_LANG, {})
+            d[s["stage"]] = d.get(s["stage"], 0) + 1
+
+    total: Dict[int, int] = {}
+    for d in by_lang.values():
+        for k, n in d.items():
+            total[k] = total.get(k, 0) + n
+    q_ranks = [k for k in total if RANK_INTRO < k < RANK_RESULT]
+    n_questions = max([k - RANK_INTRO for k in q_ranks] + [int(q) for q in state.dwell] + [0])
+
+    return {
+        "sessions": sum(total.values()),
+        "open_sessions": in_progress,
+        "events": state.events,
+        "skipped": state.skipped,
+        "watermark": datetime.fromtimestamp(state.watermark, timezone.utc).isoformat(timespec="seconds")
+        if state.watermark
+        else None,
+        "steps": _steps(total, n_questions),
+        "by_lang": {lang: _steps(d, n_questions) for lang, d in sorted(by_lang.items())},
+        "dwell_buckets": dwell_labels(),
+        "dwell": {f"q{q}": counts for q, counts in sorted(state.dwell.items(), key=lambda x: int(x[0]))},
+    }
+
+
+def default_checkpoint() -> Path:
+    return runtime_path("funnel_checkpoint.json")
+
+
+def load_state(path: Optional[Path] = None, source: str = "sheets", log_path: Optional[Path] = None) -> FunnelState:
+    """
+    Checkpoint'i okur; yoksa, bozuksa ya da başka bir kaynağa aitse boş durum.
+    """
+    path = path or default_checkpoint()
+    fresh = FunnelState(source=source, log_path=str(log_path or ""), position=2 if source == "sheets" else 0)
+    if not path.exists():
+        return fresh
+    try:
+        state = FunnelState.from_json(json.loads(path.read_text(encoding="utf-8")))
+    except Exception:
+        return fresh
+    if state.source != source or state.log_path != str(log_path or ""):
+        return fresh
+    return state
+
+
+def save_state(state: FunnelState, path: Optional[Path] = None) -> None:
+    path = path or default_checkpoint()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state.to_json(), ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _iter_sheets(start_row: int, reads_per_minute: Optional[float]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Konum aylık bölümler arası global satırdır (app.partitions); arşivlenmiş bölümler de okunur.
+    from app.compaction import iter_all
+
+    for rec in iter_all("events", start_row=start_row, reads_per_minute=reads_per_minute):
+        yield int(rec["_row"]) + 1, rec
+
+
+def _iter_log(path: Path, offset: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Sadece tamamlanmış satırlar; yazılmakta olan son satır bir sonraki çalıştırmaya kalır.
+    with path.open("rb") as f:
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return
+            pos = f.tell()
+            try:
+                rec = json.loads(line)
+            except Exception:
+                rec = {}
+            yield pos, rec if isinstance(rec, dict) else {}
+
+
+def update(
+    source: str = "sheets",
+    log_path: Optional[Path] = None,
+    checkpoint: Optional[Path] = None,
+    reads_per_minute: Optional[float] = 50,
+    timeout: float = SESSION_TIMEOUT,
+    max_open: int = MAX_OPEN_SESSIONS,
+) -> FunnelState:
+    """
+    Checkpoint'ten devam ederek yeni event'leri işler; CHECKPOINT_EVERY event'te bir ve sonda kaydeder.
+    Aynı anda tek process çalışır (lease); diğerleri mevcut durumu döndürür.
+    """
+    from app import shared_cache
+
+    if source == "log" and log_path is None:
+        raise ValueError("--source log için --log yolu gerekli.")
+    checkpoint = checkpoint or default_checkpoint()
+    state = load_state(checkpoint, source, log_path)
+    if not shared_cache.try_lease("funnel", LEASE_TTL):
+        return state
+    try:
+        engine = FunnelEngine(state, timeout=timeout, max_open=max_open)
+        rows = _iter_log(Path(log_path), state.position) if source == "log" else _iter_sheets(state.position, reads_per_minute)
+        since_save = 0
+        for pos, rec in rows:
+            engine.add(rec)
+            state.position = pos
+            since_save += 1
+            if since_save >= CHECKPOINT_EVERY:
+                save_state(state, checkpoint)
+                since_save = 0
+        save_state(state, checkpoint)
+        return state
+    finally:
+        shared_cache.release_lease("funnel")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Event log'undan huni ve soru bazında terk analizi.")
+    ap.add_argument("command", choices=["update", "report"])
+    ap.add_argument("--source", choices=("sheets", "log"), default="sheets")
+    ap.add_argument("--log", type=Path, default=None, help="--source log için JSONL dosyası.")
+    ap.add_argument("--checkpoint", type=Path, default=None, help="Varsayılan: runtime/funnel_checkpoint.json")
+    ap.add_argument("--restart", action="store_true", help="Checkpoint'i yok say, baştan işle.")
+    ap.add_argument("--timeout-min", type=float, default=SESSION_TIMEOUT / 60, help="Oturum kapanma süresi (dk).")
+    ap.add_argument("--reads-per-minute", type=float, default=50)
+    ap.add_argument("--include-open", action="store_true", help="Açık oturumları da say.")
+    args = ap.parse_args()
+
+    checkpoint = args.checkpoint or default_checkpoint()
+    if args.command == "update":
+        if args.restart and checkpoint.exists():
+            checkpoint.unlink()
+        state = update(
+            args.source,
+            args.log,
+            checkpoint,
+            reads_per_minute=args.reads_per_minute,
+            timeout=args.timeout_min * 60,
+        )
+    else:
+        state = load_state(checkpoint, args.source, args.log)
+    print(json.dumps(report(state, include_open=args.include_open), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Sheets yazmaları için idempotency anahtarları (runtime/iz.sqlite3).
+
+Aynı anahtarla gelen ikinci yazma no-op olur: çift tıklama, rerun, aynı oturumun iki sekmesi.
+Anahtar yazma başlamadan "pending" olarak alınır; yazma başarılıysa "done", başarısızsa silinir
+(tekrar denenebilsin). Takılı kalan pending kayıt PENDING_TTL sonra devralınır.
+Aynı makinedeki tüm process'ler aynı tabloyu görür.
+"""
+from __future__ import annotations
+
+import time
+
+from app.localdb import connect
+
+PENDING_TTL = 60.0
+KEEP_DAYS = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    tab TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_ready = False
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        # Process başına bir kez eski anahtarları temizle.
+        conn.execute("DELETE FROM idempotency WHERE updated_at < ?", (time.time() - KEEP_DAYS * 86400,))
+        _ready = True
+    return conn
+
+
+def claim(key: str, tab: str, pending_ttl: float = PENDING_TTL) -> str:
+    """
+    Dönen: "new" (yazma bu çağırana ait), "pending" (başkası yazıyor) ya da "done" (zaten yazıldı).
+    """
+    now = time.time()
+    conn = _db()
+    cur = conn.execute(
+        "INSERT INTO idempotency VALUES (?, ?, 'pending', ?) "
+        "ON CONFLICT(key) DO UPDATE SET updated_at = excluded.updated_at "
+        "WHERE idempotency.state = 'pending' AND idempotency.updated_at < ?",
+        (key, tab, now, now - pending_ttl),
+    )
+    if cur.rowcount == 1:
+        return "new"
+    row = conn.execute("SELECT state FROM idempotency WHERE key = ?", (key,)).fetchone()
+    return str(row[0]) if row else "new"
+
+
+def complete(key: str) -> None:
+    _db().execute("UPDATE idempotency SET state = 'done', updated_at = ? WHERE key = ?", (time.time(), key))
+
+
+def release(key: str) -> None:
+    # Yazma başarısız: anahtar serbest, sonraki deneme yazabilir.
+    _db().execute("DELETE FROM idempotency WHERE key = ? AND state = 'pending'", (key,))
@@ -0,0 +1,251 @@
+"""
+JSONL log dosyaları için seyrek zaman index'i.
+
+Index, log'u BLOCK kayıtlık bloklara böler ve her blok için
+(byte offset, kayıt sayısı, min ts, max ts, o bloğa kadarki max ts) tutar.
+Yan dosya runtime/ altında durur ve log büyüdükçe sadece yeni kısım okunur.
+
+- window(start, end): başlangıç bloğu binary search ile bulunur, okuma pencere bitince durur.
+- latest(page, size): sondan sayfalama, sadece ilgili bloklar okunur.
+
+Varsayım: kayıtlar aşağı yukarı zaman sırasında eklenir (append-only log).
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.utils import runtime_path
+
+BLOCK = 256
+TS_KEYS = ("timestamp", "ts_utc", "ts")
+
+_MAGIC = b"IZTX1"
+_HEAD = struct.Struct("<5sIQ")  # magic, block size, indexlenen byte sonu
+_ENTRY = struct.Struct("<QIddd")  # offset, count, min_ts, max_ts, prefix_max
+
+
+def parse_ts(value: Any) -> Optional[float]:
+    """
+    ISO zaman -> epoch saniye. Saat dilimi yoksa UTC kabul edilir.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def record_ts(rec: Dict[str, Any], keys: Sequence[str] = TS_KEYS) -> Optional[float]:
+    for k in keys:
+        if k in rec:
+            ts = parse_ts(rec.get(k))
+            if ts is not None:
+                return ts
+    return None
+
+
+@dataclass
+class _Block:
+    offset: int
+    count: int
+    min_ts: float
+    max_ts: float
+    prefix_max: float
+
+
+class JsonlTimeIndex:
+    def __init__(
+        self,
+        log_path: Path,
+        index_path: Optional[Path] = None,
+        block: int = BLOCK,
+        ts_keys: Sequence[str] = TS_KEYS,
+    ) -> None:
+        self.log_path = Path(log_path)
+        self.index_path = index_path or runtime_path(self.log_path.name + ".tsidx")
+        self.block = block
+        self.ts_keys = tuple(ts_keys)
+        self.blocks: List[_Block] = []
+        self.indexed_end = 0  # tam bloklarla kapsanan byte sonu
+        self.tail_count = 0
+        self.tail_end = 0
+        self._load()
+
+    # -- index dosyası -----------------------------------------------------
+
+    def _load(self) -> None:
+        try:
+            raw = self.index_path.read_bytes()
+            magic, block, end = _HEAD.unpack_from(raw, 0)
+            if magic != _MAGIC or block != self.block:
+                return
+            pos = _HEAD.size
+            blocks: List[_Block] = []
+            while pos + _ENTRY.size <= len(raw):
+                blocks.append(_Block(*_ENTRY.unpack_from(raw, pos)))
+                pos += _ENTRY.size
+            self.blocks = blocks
+            self.indexed_end = end
+        except Exception:
+            self.blocks = []
+            self.indexed_end = 0
+
+    def _save(self) -> None:
+        parts = [_HEAD.pack(_MAGIC, self.block, self.indexed_end)]
+        parts.extend(_ENTRY.pack(b.offset, b.count, b.min_ts, b.max_ts, b.prefix_max) for b in self.blocks)
+        tmp = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+        tmp.write_bytes(b"".join(parts))
+        tmp.replace(self.index_path)
+
+    # -- güncelleme --------------------------------------------------------
+
+    def refresh(self) -> "JsonlTimeIndex":
+        """
+        Log'un index'lenmemiş kısmını okur. Log kısalmışsa (rotate/truncate) baştan kurar.
+        """
+        if not self.log_path.exists():
+            self.blocks, self.indexed_end, self.tail_count, self.tail_end = [], 0, 0, 0
+            return self
+        size = self.log_path.stat().st_size
+        if size < self.indexed_end:
+            self.blocks, self.indexed_end = [], 0
+
+        changed = False
+        prefix = self.blocks[-1].prefix_max if self.blocks else -math.inf
+        cur: List[Tuple[int, Optional[float]]] = []
+        with self.log_path.open("rb") as f:
+            f.seek(self.indexed_end)
+            while True:
+                off = f.tell()
+                line = f.readline()
+                if not line or not line.endswith(b"\n"):
+                    break  # yarım satır: yazan process bitirince okunur
+                if not line.strip():
+                    continue
+                cur.append((off, self._line_ts(line)))
+                if len(cur) == self.block:
+                    prefix = self._close_block(cur, prefix)
+                    self.indexed_end = f.tell()
+                    cur = []
+                    changed = True
+            self.tail_count = len(cur)
+            self.tail_end = f.tell()
+        if changed:
+            self._save()
+        return self
+
+    def _close_block(self, cur: List[Tuple[int, Optional[float]]], prefix: float) -> float:
+        ts = [t for _, t in cur if t is not None]
+        mn = min(ts) if ts else math.inf
+        mx = max(ts) if ts else -math.inf
+        prefix = max(prefix, mx)
+        self.blocks.append(_Block(cur[0][0], len(cur), mn, mx, prefix))
+        return prefix
+
+    def _line_ts(self, line: bytes) -> Optional[float]:
+        try:
+            return record_ts(json.loads(line), self.ts_keys)
+        except Exception:
+            return None
+
+    # -- sorgular ----------------------------------------------------------
+
+    def count(self) -> int:
+        return sum(b.count for b in self.blocks) + self.tail_count
+
+    def _read(
+        self, offset: int, limit_end: Optional[int] = None, keep_bad: bool = False
+    ) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        with self.log_path.open("rb") as f:
+            f.seek(offset)
+            while True:
+                off = f.tell()
+                if limit_end is not None and off >= limit_end:
+                    return
+                line = f.readline()
+                if not line or not line.endswith(b"\n"):
+                    return
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    # bozuk satır varsa geç (sayfalama sayımı için istenirse None döner)
+                    if keep_bad:
+                        yield off, None
+                    continue
+                yield off, rec
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        start <= ts < end aralığındaki kayıtlar (dosya sırasıyla).
+        None sınır = açık uç. Zaman damgası olmayan kayıtlar sadece tam taramada döner.
+        """
+        lo = -math.inf if start is None else start
+        hi = math.inf if end is None else end
+        if start is None and end is None:
+            for _, rec in self._read(0, self.tail_end):
+                yield rec
+            return
+
+        prefix = [b.prefix_max for b in self.blocks]
+        i = bisect.bisect_left(prefix, lo)
+        offset = self.blocks[i].offset if i < len(self.blocks) else self.indexed_end
+
+        # Pencerenin ötesindeki ilk blok başında dur.
+        stop: Optional[int] = None
+        for b in self.blocks[i:]:
+            if b.min_ts >= hi and b.min_ts != math.inf:
+                stop = b.offset
+                break
+
+        for _, rec in self._read(offset, stop if stop is not None else self.tail_end):
+            ts = record_ts(rec, self.ts_keys)
+            if ts is not None and lo <= ts < hi:
+                yield rec
+
+    def latest(self, page: int = 0, page_size: int = 20) -> List[Dict[str, Any]]:
+        """
+        En yeni kayıtlar (yeniden eskiye). page=0 en son sayfa.
+        """
+        total = self.count()
+        hi = total - page * page_size
+        lo = max(0, hi - page_size)
+        if hi <= 0:
+            return []
+
+        # lo'ıncı kaydı içeren bloğu bul
+        seen = 0
+        offset = self.indexed_end
+        skip = lo - sum(b.count for b in self.blocks)
+        for b in self.blocks:
+            if seen + b.count > lo:
+                offset = b.offset
+                skip = lo - seen
+                break
+            seen += b.count
+
+        out: List[Dict[str, Any]] = []
+        taken = 0
+        for _, rec in self._read(offset, self.tail_end, keep_bad=True):
+            if skip > 0:
+                skip -= 1
+                continue
+            if rec is not None:
+                out.append(rec)
+            taken += 1
+            if taken >= hi - lo:
+                break
+        out.reverse()
+        return out
@@ -0,0 +1,36 @@
+"""
+runtime/ altındaki yerel SQLite dosyası.
+
+Aynı makinedeki tüm Streamlit process'leri ve CLI işleri aynı dosyayı paylaşır.
+WAL modu: okuyucular yazanı beklemez.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.utils import runtime_path
+
+DB_NAME = "iz.sqlite3"
+
+_local = threading.local()
+
+
+def connect(name: str = DB_NAME, path: Optional[Path] = None) -> sqlite3.Connection:
+    """
+    Thread başına bir bağlantı döndürür (sqlite3 bağlantıları thread'ler arası paylaşılmaz).
+    """
+    path = path or runtime_path(name)
+    conns: Dict[str, sqlite3.Connection] = getattr(_local, "conns", None) or {}
+    _local.conns = conns
+    key = str(path)
+    conn = conns.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conns[key] = conn
+    return conn
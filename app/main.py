@@ -1,95 +1,41 @@
 from __future__ import annotations
 
 import calendar
+import hashlib
 import json
 import random
 import uuid
-from dataclasses import dataclass
 from datetime import date
-from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import streamlit as st
-
-from app.storage import gsheets_append, gsheets_fetch_recent_results, utc_now_iso
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from app.storage import (
+    APPEND_DUPLICATE,
+    gsheets_append,
+    gsheets_fetch_recent_results,
+    gsheets_lookup_result,
+    gsheets_store_bank,
+    utc_now_iso,
+)
+from app.codec import encode_result
+from app.dengeleyici import ARSHETIP_KEYS
 from app.compatibility import compute_compatibility
+from app import footprint, match_heaps, percentiles, rollups, tribes
+from app.scoring import effect_matrix, score_answers
+from app.questions import (
+    Question,
+    answer_index,
+    archive_bank,
+    bank_payload,
+    empty_answers,
+    load_bank_for_lang,
+    rehydrate_answers,
+    set_answer,
+)
 
 APP_VERSION = "1.1.1"
-DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-
-
-@dataclass
-class Option:
-    yazi: str
-    etki: Dict[str, int]
-    mini_sahne: str
-
-
-@dataclass
-class Question:
-    soru: str
-    options: List[Option]
-
-
-def _read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def load_questions_for_lang(lang: str) -> List[Question]:
-    lang = (lang or "TR").upper()
-    candidates = {
-        "TR": [DATA_DIR / "questions_tr.json", DATA_DIR / "questions.json"],
-        "EN": [DATA_DIR / "questions_en.json"],
-    }.get(lang, [DATA_DIR / "questions_tr.json", DATA_DIR / "questions.json"])
-
-    file_path = None
-    for p in candidates:
-        if p.exists():
-            file_path = p
-            break
-    if not file_path:
-        raise FileNotFoundError("data/ altında questions_tr.json ve/veya questions_en.json olmalı.")
-
-    raw = _read_json(file_path)
-    if not isinstance(raw, list):
-        raise ValueError("Soru JSON formatı list olmalı.")
-
-    out: List[Question] = []
-    for item in raw:
-        if not isinstance(item, dict):
-            continue
-
-        soru = item.get("soru") or item.get("question") or item.get("q")
-        secenekler = item.get("secenekler") or item.get("options") or item.get("a")
-
-        if not isinstance(soru, str) or not isinstance(secenekler, list):
-            continue
-
-        opts: List[Option] = []
-        for opt in secenekler:
-            if not isinstance(opt, dict):
-                continue
-            yazi = opt.get("yazi") or opt.get("text") or opt.get("label")
-            etki = opt.get("etki") or opt.get("impact") or {}
-            mini = opt.get("mini_sahne") or opt.get("mini_scene") or opt.get("scene") or ""
-            if not isinstance(yazi, str):
-                continue
-            if not isinstance(etki, dict):
-                etki = {}
-            safe_etki: Dict[str, int] = {}
-            for k, v in etki.items():
-                try:
-                    safe_etki[str(k)] = int(v)
-                except Exception:
-                    continue
-            opts.append(Option(yazi=yazi, etki=safe_etki, mini_sahne=str(mini)))
-
-        if opts:
-            out.append(Question(soru=soru, options=opts))
-
-    if not out:
-        raise ValueError("Sorular parse edilemedi.")
-    return out
 
 
 def ensure_session() -> None:
@@ -108,7 +54,9 @@ def ensure_session() -> None:
     if "q_index" not in st.session_state:
         st.session_state["q_index"] = 0
     if "answers" not in st.session_state:
-        st.session_state["answers"] = {}
+        # Her soru için seçilen option index'i (-1: cevaplanmadı).
+        # Metinler gerektiğinde bankadan geri yüklenir (rehydrate_answers).
+        st.session_state["answers"] = []
 
     if "name" not in st.session_state:
         st.session_state["name"] = ""
@@ -133,7 +81,16 @@ def show_sheets_status(ok: bool, msg: str) -> None:
         st.error(f"Sheets ERROR: {msg}")
 
 
-def log_event(event_name: str, payload: Optional[Dict[str, Any]] = None) -> None:
+def _update_rollup(fn, row: Dict[str, Any]) -> None:
+    # Rollup yerel bir özet; hata olursa akışı bozma, reconcile düzeltir.
+    try:
+        fn(row)
+    except Exception as e:
+        if st.session_state.get("debug"):
+            st.caption(f"rollup hatası: {type(e).__name__}: {e}")
+
+
+def log_event(event_name: str, payload: Optional[Dict[str, Any]] = None, idempotency_key: str = "") -> None:
     row = {
         "ts_utc": utc_now_iso(),
         "session_id": st.session_state["session_id"],
@@ -143,12 +100,14 @@ def log_event(event_name: str, payload: Optional[Dict[str, Any]] = None) -> None
         "app_version": APP_VERSION,
         "source": "cloud_or_local",
     }
-    ok, msg = gsheets_append("events", row)
+    ok, msg = gsheets_append("events", row, idempotency_key)
+    if ok and not msg.startswith(APPEND_DUPLICATE):
+        _update_rollup(rollups.record_event, row)
     st.session_state["last_sheets_status"] = msg
     show_sheets_status(ok, msg)
 
 
-def write_result(result: Dict[str, Any]) -> None:
+def write_result(result: Dict[str, Any], idempotency_key: str = "") -> bool:
     row = {
         "ts_utc": utc_now_iso(),
         "session_id": st.session_state["session_id"],
@@ -157,13 +116,21 @@ def write_result(result: Dict[str, Any]) -> None:
         "zodiac": result.get("zodiac", ""),
         "dominant": result.get("dominant", ""),
         "score": result.get("score", 0),
-        "result_json": result,
+        # Eşleştirme okuması result_json'u çözmeden bu kolonları kullanır.
+        **{k: int((result.get("totals") or {}).get(k, 0)) for k in ARSHETIP_KEYS},
+        "result_json": encode_result(result),
         "app_version": APP_VERSION,
         "source": "cloud_or_local",
     }
-    ok, msg = gsheets_append("results", row)
+    ok, msg = gsheets_append("results", row, idempotency_key)
+    if ok and not msg.startswith(APPEND_DUPLICATE):
+        _update_rollup(rollups.record_result, {**row, "_result": result})
+        _update_rollup(percentiles.record_result, {**row, "_result": result})
+        _update_rollup(match_heaps.record_result, {**row, "_result": result})
+        _update_rollup(tribes.record_result, {**row, "_result": result})
     st.session_state["last_sheets_status"] = msg
     show_sheets_status(ok, msg)
+    return ok
 
 
 def zodiac_from_date(d: date) -> str:
@@ -193,17 +160,9 @@ def zodiac_from_date(d: date) -> str:
     return "Balık"
 
 
-def compute_scores(answers: Dict[int, Dict[str, Any]]) -> Dict[str, int]:
-    totals: Dict[str, int] = {}
-    for _, opt in answers.items():
-        etki = opt.get("etki", {})
-        if isinstance(etki, dict):
-            for k, v in etki.items():
-                try:
-                    totals[k] = totals.get(k, 0) + int(v)
-                except Exception:
-                    continue
-    return totals
+def compute_scores(questions: Sequence[Question], answers: Sequence[int], bank: Optional[str] = None) -> Dict[str, int]:
+    # Etki matrisi bank hash'ine göre bir kez derlenir; skor = satır toplama.
+    return score_answers(effect_matrix(questions, bank), answers)
 
 
 def dominant_trait(totals: Dict[str, int]) -> Tuple[str, int]:
@@ -364,9 +323,261 @@ def _spark_reason(sim_pct: int, element_bonus: int, variety_bonus: int, z_self:
     return " ".join(vibe_parts + [tail])
 
 
+def _render_percentile(trait: str, score: int, zodiac: str) -> None:
+    # Yeterli veri yoksa (MIN_POPULATION altı) hiçbir şey gösterme.
+    if not trait:
+        return
+    try:
+        overall = percentiles.percentile(trait, score)
+        in_sign = percentiles.percentile(trait, score, zodiac)
+    except Exception:
+        return
+    if overall is None:
+        return
+    line = f"Bu özellikte senden düşük puan alanların oranı: **%{overall}**"
+    if in_sign is not None:
+        line += f" · {zodiac} burçları arasında: **%{in_sign}**"
+    st.caption(line)
+
+
+def _render_tribe(memo: Dict[str, Any]) -> None:
+    # Kabile ataması write_result'ta yapılır; yazılmamış sonuç modele girmez, burada da gösterilmez.
+    if not memo["written"]:
+        return
+    me_id = st.session_state["profile_id"]
+    try:
+        tribe = tribes.tribe_of(me_id)
+        if tribe is None:
+            return
+        info = next((t for t in tribes.describe() if t["tribe"] == tribe), None)
+        mates = tribes.mates(tribe, exclude=me_id, limit=5)
+    except Exception:
+        return
+    if not info:
+        return
+    icons = "".join(ARCHETYPE.get(k, {}).get("icon", "") for k in info["traits"])
+    titles = " + ".join(ARCHETYPE.get(k, {}).get("title", k) for k in info["traits"])
+    st.markdown(f"## 🏕️ Kabilen: {icons} {titles}")
+    st.caption(f"Bu kabilede {info['size']} kişi var.")
+    if mates:
+        st.write(" · ".join(f"{m.get('name') or 'Anonim'} ({m.get('zodiac', '')})" for m in mates))
+
+
+def _render_match_cards(top: Sequence[Dict[str, Any]], zodiac_self: str) -> None:
+    for m in top:
+        zodiac_b = m.get("zodiac", "")
+        sim_pct = int(m.get("sim_pct", 0) or 0)
+        element_bonus = int(m.get("element_bonus", 0) or 0)
+        variety_bonus = int(m.get("variety_bonus", 0) or 0)
+
+        note = _spark_reason(sim_pct, element_bonus, variety_bonus, zodiac_self, zodiac_b)
+
+        st.markdown(
+            f"""
+<div class="iz-card">
+  <div style="font-size:18px;font-weight:800;">
+    {m.get('name','(isimsiz)')} <span style="font-weight:600;opacity:.7;">({m.get('zodiac','')})</span>
+  </div>
+  <div style="margin-top:6px;">
+    <b>{m.get('score', 0)}/100</b> • {m.get('label','')}
+  </div>
+  <div style="margin-top:8px; opacity:.92; line-height:1.45;">
+    {note}
+  </div>
+</div>
+""",
+            unsafe_allow_html=True,
+        )
+
+
+def _shared_id() -> str:
+    sid = st.query_params.get("id", "")
+    if isinstance(sid, list):
+        sid = sid[0] if sid else ""
+    return str(sid or "").strip()
+
+
+def _render_shared_matches(shared_id: str, name: str, shared: Dict[str, Any]) -> None:
+    # Liste her yeni sonuçta güncellenen heap'ten gelir. Heap makineye özel: bu makinede yoksa
+    # (yeni instance, başka replica, backfill yapılmamış) son sonuçlar eskisi gibi skorlanır.
+    zodiac = str(shared.get("zodiac") or "")
+    try:
+        top = match_heaps.top(shared_id)
+    except Exception:
+        top = []
+    totals = shared.get("totals")
+    if not top and isinstance(totals, dict) and totals:
+        ok, top, _ = _top_matches(totals, zodiac, exclude=shared_id)
+        if not ok:
+            top = []
+    if not top:
+        return
+    st.markdown(f"### 🤝 {name} ile en uyumlu kişiler")
+    _render_match_cards(top, zodiac)
+
+
+def render_shared_result(shared_id: str) -> None:
+    """
+    ?id=... ile açılan paylaşım linki: kayıtlı sonucu tek satır okuyarak gösterir.
+    """
+    ok, shared, msg = gsheets_lookup_result(shared_id)
+    if not ok:
+        st.error(f"Paylaşılan sonuç okunamadı: {msg}")
+    elif not shared:
+        st.warning("Bu paylaşım linkine ait sonuç bulunamadı.")
+    else:
+        profile = ARCHETYPE.get(shared.get("dominant", ""), ARCHETYPE["merak"])
+        name = shared.get("name") or "Anonim"
+        st.markdown(f"## {name} için sonuç")
+        st.markdown(f"### {profile['icon']} {profile['title']}")
+        if shared.get("zodiac"):
+            st.caption(f"Burç: **{shared['zodiac']}**")
+        st.markdown("**Güçlü yan:**")
+        st.write(profile["strength"])
+        st.markdown("**Kör nokta:**")
+        st.write(profile["shadow"])
+        _render_shared_matches(shared_id, name, shared)
+
+    st.divider()
+    if st.button("Sen de testi çöz", type="primary"):
+        log_event("share_link_opened", {"shared_id": shared_id, "found": bool(ok and shared)})
+        st.session_state["_share_dismissed"] = True
+        del st.query_params["id"]
+        st.rerun()
+
+
+_stored_banks: Dict[str, bool] = {}
+
+
+def _answers_hash(result_inputs: Dict[str, Any]) -> str:
+    raw = json.dumps(result_inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _result_memo(questions: Sequence[Question], bank: str) -> Dict[str, Any]:
+    """
+    Sonuç oturum başına bir kez hesaplanır; girdiler (cevaplar, isim, doğum tarihi, banka)
+    değişmedikçe rerun'lar aynı kaydı kullanır. Anahtar yazmalarda idempotency key olarak da geçer.
+    """
+    dob_state = st.session_state.get("dob", {"year": 1990, "month": 1, "day": 1})
+    dob = date(int(dob_state["year"]), int(dob_state["month"]), int(dob_state["day"]))
+    inputs = {
+        "name": st.session_state.get("name", ""),
+        "dob": dob.isoformat(),
+        "lang": st.session_state.get("lang", "TR"),
+        "bank": bank,
+        "answers": list(st.session_state.get("answers", [])),
+    }
+    key = _answers_hash(inputs)
+    memo = st.session_state.get("_result_memo")
+    if memo and memo.get("key") == key:
+        return memo
+
+    totals = compute_scores(questions, inputs["answers"], bank)
+    dom_key, dom_score = dominant_trait(totals)
+    payload = {
+        "name": inputs["name"],
+        "dob": inputs["dob"],
+        "zodiac": zodiac_from_date(dob),
+        "dominant": dom_key,
+        "score": dom_score,
+        "totals": totals,
+        "lang": inputs["lang"],
+        "bank": bank,
+        "answers": inputs["answers"],
+    }
+    # written: Sheets'e yazıldı mı; matches: başarılı okunan uyum listesi (None = henüz yok)
+    memo = {"key": key, "payload": payload, "written": False, "matches": None}
+    st.session_state["_result_memo"] = memo
+    return memo
+
+
+def _top_matches(totals: Dict[str, int], zodiac_self: str, exclude: str = "") -> Tuple[bool, List[Dict[str, Any]], str]:
+    # exclude: listeden çıkarılacak profil (varsayılan: oturumun kendisi)
+    ok, recent, msg = gsheets_fetch_recent_results(limit=60, max_rows_scan=1500)
+    if not ok:
+        return False, [], msg
+    me_id = exclude or st.session_state["profile_id"]
+    candidates: List[Dict[str, Any]] = []
+
+    for r in recent:
+        pid = r.get("profile_id", "")
+        if not pid or pid == me_id:
+            continue
+
+        payload = r.get("_result", {}) or {}
+        name = payload.get("name") or r.get("name") or "Anonim"
+        zodiac_b = payload.get("zodiac") or r.get("zodiac") or ""
+        totals_b = payload.get("totals") or {}
+        if not isinstance(totals_b, dict):
+            continue
+
+        score, label, br = compute_compatibility(totals, totals_b, zodiac_self, zodiac_b)
+        candidates.append(
+            {
+                "profile_id": pid,
+                "name": name,
+                "zodiac": zodiac_b,
+                "score": score,
+                "label": label,
+                "sim_pct": br.get("sim_pct", 0),
+                "element_bonus": br.get("element_bonus", 0),
+                "variety_bonus": br.get("variety_bonus", 0),
+                "dominant": payload.get("dominant") or r.get("dominant") or "",
+            }
+        )
+
+    candidates.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return True, candidates[:5], msg
+
+
+def _ensure_bank_stored(lang: str, questions: Sequence[Question], bank: str) -> None:
+    # Event'lerin referans verdiği bankanın metin tablosu bir kez saklanır (yerel arşiv + banks tabı).
+    if _stored_banks.get(bank):
+        return
+    try:
+        archive_bank(questions, bank)
+        ok, msg = gsheets_store_bank(bank, lang, bank_payload(questions))
+    except Exception as e:
+        ok, msg = False, f"{type(e).__name__}: {e}"
+    # Tab yoksa da tekrar denemeyelim; yerel arşiv yeterli.
+    _stored_banks[bank] = True
+    if not ok and st.session_state.get("debug"):
+        st.caption(f"banks: {msg}")
+
+
+def _track_session() -> Optional[footprint.SessionInfo]:
+    # session_state ayak izini process defterine yaz; boştaki oturumları arada bir temizle.
+    try:
+        ctx = get_script_run_ctx()
+        reg = footprint.registry()
+        info = reg.track(
+            st.session_state["session_id"],
+            st.session_state.to_dict(),
+            ctx.session_state if ctx else None,
+        )
+        reg.sweep()
+        return info
+    except Exception:
+        return None
+
+
+def _render_footprint(info: Optional[footprint.SessionInfo]) -> None:
+    if info is None:
+        return
+    summary = footprint.registry().summary()
+    st.caption(
+        f"session_state: {footprint.human_bytes(info.bytes)} · "
+        f"process: {summary['sessions']} oturum, {footprint.human_bytes(summary['total_bytes'])} "
+        f"(ort {footprint.human_bytes(summary['avg_bytes'])}, boşta {summary['idle']})"
+    )
+    st.dataframe(footprint.top_keys(info.keys), hide_index=True, use_container_width=True)
+
+
 def run_app() -> None:
     st.set_page_config(page_title="IZ", layout="wide")
     ensure_session()
+    session_info = _track_session()
     inject_css()
 
     with st.sidebar:
@@ -377,12 +588,19 @@ def run_app() -> None:
         st.session_state["debug"] = st.toggle("DEBUG", value=st.session_state.get("debug", False))
         if st.session_state.get("debug") and st.session_state.get("last_sheets_status"):
             st.caption(st.session_state["last_sheets_status"])
+        if st.session_state.get("debug"):
+            _render_footprint(session_info)
 
+    shared_id = _shared_id()
     if not st.session_state["_app_opened_logged"]:
-        log_event("app_opened", {"path": "main"})
+        log_event(
+            "app_opened",
+            {"path": "main", "has_share_id": bool(shared_id), "lang": st.session_state["lang"]},
+        )
         st.session_state["_app_opened_logged"] = True
 
-    questions = load_questions_for_lang(st.session_state["lang"])
+    questions, bank = load_bank_for_lang(st.session_state["lang"])
+    _ensure_bank_stored(st.session_state["lang"], questions, bank)
 
     st.markdown(
         """
@@ -395,6 +613,15 @@ def run_app() -> None:
     )
     st.write("")
 
+    if (
+        shared_id
+        and shared_id != st.session_state["profile_id"]
+        and st.session_state["step"] == "intro"
+        and not st.session_state.get("_share_dismissed")
+    ):
+        render_shared_result(shared_id)
+        return
+
     if st.session_state["step"] == "intro":
         c1, c2 = st.columns([1, 1])
         with c1:
@@ -410,10 +637,15 @@ def run_app() -> None:
         if st.button("Başla", type="primary"):
             st.session_state["step"] = "quiz"
             st.session_state["q_index"] = 0
-            st.session_state["answers"] = {}
+            st.session_state["answers"] = empty_answers(len(questions))
             log_event(
                 "intro_completed",
-                {"name": st.session_state["name"], "dob": dob.isoformat(), "zodiac": zodiac_self},
+                {
+                    "name": st.session_state["name"],
+                    "dob": dob.isoformat(),
+                    "zodiac": zodiac_self,
+                    "lang": st.session_state["lang"],
+                },
             )
             st.rerun()
         return
@@ -431,8 +663,9 @@ def run_app() -> None:
         st.markdown(f"### {q.soru}")
 
         labels = [o.yazi for o in q.options]
-        prev = st.session_state["answers"].get(qi, {}).get("yazi")
-        index = labels.index(prev) if prev in labels else None
+        prev_oi = answer_index(st.session_state["answers"], qi)
+        index = prev_oi if prev_oi is not None and prev_oi < len(labels) else None
+        prev = labels[index] if index is not None else None
 
         picked = st.radio(
             label="",
@@ -444,9 +677,10 @@ def run_app() -> None:
         st.markdown("</div>", unsafe_allow_html=True)
 
         if picked is not None and picked != prev:
-            opt = next(o for o in q.options if o.yazi == picked)
-            st.session_state["answers"][qi] = {"yazi": opt.yazi, "etki": opt.etki, "mini_sahne": opt.mini_sahne}
-            log_event("question_answered", {"qi": qi, "text": opt.yazi, "mini_sahne": opt.mini_sahne})
+            oi = labels.index(picked)
+            set_answer(st.session_state["answers"], qi, oi)
+            # Metin yok: (bank, qi, oi) yeterli, metinler banka tablosundan çözülür (app.events).
+            log_event("question_answered", {"bank": bank, "qi": qi, "oi": oi})
 
             if qi < total - 1:
                 st.session_state["q_index"] = qi + 1
@@ -461,32 +695,29 @@ def run_app() -> None:
         return
 
     if st.session_state["step"] == "result":
-        dob_state = st.session_state.get("dob", {"year": 1990, "month": 1, "day": 1})
-        dob = date(int(dob_state["year"]), int(dob_state["month"]), int(dob_state["day"]))
-        zodiac_self = zodiac_from_date(dob)
+        memo = _result_memo(questions, bank)
+        result_payload = memo["payload"]
+        answers = result_payload["answers"]
+        totals = result_payload["totals"]
+        dom_key, dom_score = result_payload["dominant"], result_payload["score"]
+        zodiac_self = result_payload["zodiac"]
         st.session_state["zodiac"] = zodiac_self
-
-        answers = st.session_state.get("answers", {})
-        totals = compute_scores(answers)
-        dom_key, dom_score = dominant_trait(totals)
         profile = ARCHETYPE.get(dom_key, ARCHETYPE["merak"])
 
-        result_payload = {
-            "name": st.session_state.get("name", ""),
-            "dob": dob.isoformat(),
-            "zodiac": zodiac_self,
-            "dominant": dom_key,
-            "score": dom_score,
-            "totals": totals,
-            "answers": answers,
-        }
-
-        log_event("result_shown", {"dominant": dom_key, "score": dom_score, "zodiac": zodiac_self})
-        write_result(result_payload)
+        if not memo["written"]:
+            # Rerun'larda ("Başa dön" dahil) tekrar yazılmaz; yarım kalan deneme storage'da no-op olur.
+            idem = f"{st.session_state['session_id']}:{memo['key']}"
+            log_event(
+                "result_shown",
+                {"dominant": dom_key, "score": dom_score, "zodiac": zodiac_self},
+                idempotency_key=f"result_shown:{idem}",
+            )
+            memo["written"] = write_result(result_payload, idempotency_key=f"result:{idem}")
 
         st.markdown("## Sonuç")
         st.markdown(f"### {profile['icon']} {profile['title']}")
         st.caption(f"Burcun: **{zodiac_self}**")
+        _render_percentile(dom_key, dom_score, zodiac_self)
         st.markdown("**Güçlü yan:**")
         st.write(profile["strength"])
         st.markdown("**Kör nokta:**")
@@ -494,84 +725,51 @@ def run_app() -> None:
         st.markdown("**Bugünlük mikro hamle:**")
         st.info(profile["micro"])
 
+        # Paylaşım linki: aynı sayfa, ?id=<profile_id>
+        me_id = st.session_state["profile_id"]
+        if st.query_params.get("id") != me_id:
+            st.query_params["id"] = me_id
+        if not st.session_state.get("_share_logged"):
+            log_event("share_link_created", {"id": me_id})
+            st.session_state["_share_logged"] = True
+        st.caption(f"Paylaşım linki: `?id={me_id}`")
+
+        st.divider()
+        _render_tribe(memo)
+
         st.divider()
         st.markdown("## 🤝 Seninle en uyumlu kişiler")
 
-        ok, recent, msg = gsheets_fetch_recent_results(limit=60, max_rows_scan=1500)
+        if memo["matches"]:
+            ok, top, msg = True, memo["matches"], "memo"
+        else:
+            # Boş liste saklanmaz: yeni kişiler geldikçe sonraki rerun tekrar dener.
+            ok, top, msg = _top_matches(totals, zodiac_self)
+            if ok and top:
+                memo["matches"] = top
+                log_event(
+                    "compatibility_list_shown",
+                    {"shown": len(top)},
+                    idempotency_key=f"compat:{st.session_state['session_id']}:{memo['key']}",
+                )
         if not ok:
             st.error(f"Uyum listesi çekilemedi: {msg}")
         else:
-            me_id = st.session_state["profile_id"]
-            candidates: List[Dict[str, Any]] = []
-
-            for r in recent:
-                pid = r.get("profile_id", "")
-                if not pid or pid == me_id:
-                    continue
-
-                payload = r.get("_result", {}) or {}
-                name = payload.get("name") or r.get("name") or "Anonim"
-                zodiac_b = payload.get("zodiac") or r.get("zodiac") or ""
-                totals_b = payload.get("totals") or {}
-                if not isinstance(totals_b, dict):
-                    continue
-
-                score, label, br = compute_compatibility(totals, totals_b, zodiac_self, zodiac_b)
-                candidates.append(
-                    {
-                        "profile_id": pid,
-                        "name": name,
-                        "zodiac": zodiac_b,
-                        "score": score,
-                        "label": label,
-                        "sim_pct": br.get("sim_pct", 0),
-                        "element_bonus": br.get("element_bonus", 0),
-                        "variety_bonus": br.get("variety_bonus", 0),
-                        "dominant": payload.get("dominant") or r.get("dominant") or "",
-                    }
-                )
-
-            candidates.sort(key=lambda x: x.get("score", 0), reverse=True)
-            top = candidates[:5]
-
             if not top:
                 st.info("Henüz yeterli kişi yok. 2-3 kişi daha test çözünce liste dolacak.")
             else:
-                for m in top:
-                    zodiac_b = m.get("zodiac", "")
-                    sim_pct = int(m.get("sim_pct", 0) or 0)
-                    element_bonus = int(m.get("element_bonus", 0) or 0)
-                    variety_bonus = int(m.get("variety_bonus", 0) or 0)
-
-                    note = _spark_reason(sim_pct, element_bonus, variety_bonus, zodiac_self, zodiac_b)
-
-                    st.markdown(
-                        f"""
-<div class="iz-card">
-  <div style="font-size:18px;font-weight:800;">
-    {m.get('name','(isimsiz)')} <span style="font-weight:600;opacity:.7;">({m.get('zodiac','')})</span>
-  </div>
-  <div style="margin-top:6px;">
-    <b>{m.get('score', 0)}/100</b> • {m.get('label','')}
-  </div>
-  <div style="margin-top:8px; opacity:.92; line-height:1.45;">
-    {note}
-  </div>
-</div>
-""",
-                        unsafe_allow_html=True,
-                    )
-
-                log_event("compatibility_list_shown", {"shown": len(top)})
+                _render_match_cards(top, zodiac_self)
 
         if st.session_state.get("debug"):
-            st.json(result_payload)
+            st.json({**result_payload, "answers_text": rehydrate_answers(questions, answers)})
 
         if st.button("Başa dön"):
             log_event("reset_clicked", {})
             keep_lang = st.session_state.get("lang", "TR")
             keep_debug = st.session_state.get("debug", False)
             st.session_state.clear()
+            if "id" in st.query_params:
+                del st.query_params["id"]
             ensure_session()
             st.session_state["lang"] = keep_lang
             st.session_state["debug"] = keep_debug
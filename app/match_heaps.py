@@ -0,0 +1,308 @@
+"""
+Profil başına en uyumlu TOP_K kişi ("beni kimler buldu"), her yeni sonuçta artımlı güncellenir.
+
+- Nüfus: runtime/iz.sqlite3'te profil başına trait vektörü + burç + heap tabanı (floor: K.'nın skoru,
+  heap dolmadıysa -1). Process nüfusu numpy dizilerinde tutar; sadece yeni satırları okur (seq).
+- record_result(): yeni gelen herkesle vektörel olarak kıyaslanır. Skorun üst sınırı
+  (70 * cos + element bonusu + en fazla çeşitlilik bonusu) bir profilin tabanını geçmiyorsa o
+  profil hiç skorlanmaz; geçenler compute_compatibility ile kesin skorlanır ve sadece girdiği
+  heap'ler değişir. Yeni gelenin kendi heap'i de aynı sınırla en iyi adaylardan kurulur.
+- top(): paylaşım linki Sheets'e gitmeden güncel listeyi gösterir.
+
+Aynı makinedeki process'ler aynı tabloları görür (rollup'lar gibi makineye özel).
+
+    python -m app.match_heaps backfill
+    python -m app.match_heaps show <profile_id>
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from app.codec import ZODIAC_CODES, totals_from_vector, totals_vector, zodiac_code
+from app.compatibility import ELEMENT_BONUS, ZODIAC_ELEMENT, compute_compatibility
+from app.localdb import connect
+
+TOP_K = 5
+FLOOR_REFRESH = 60.0  # diğer process'lerin yükselttiği tabanlar en geç bu sürede görülür (s)
+_MAX_VARIETY = 12
+_ROUND_SLACK = 1  # round(sim * 70) payı
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_profiles (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile_id TEXT NOT NULL UNIQUE,
+    name TEXT, zodiac TEXT, dominant TEXT, ts_utc TEXT,
+    vec BLOB NOT NULL,
+    floor INTEGER NOT NULL DEFAULT -1
+);
+CREATE TABLE IF NOT EXISTS match_topk (
+    profile_id TEXT NOT NULL,
+    other_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    label TEXT,
+    sim_pct INTEGER, element_bonus INTEGER, variety_bonus INTEGER,
+    PRIMARY KEY (profile_id, other_id)
+);
+CREATE TABLE IF NOT EXISTS match_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO match_meta VALUES (1, 0);
+"""
+
+_ready = False
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        _ready = True
+    return conn
+
+
+def _element_table() -> np.ndarray:
+    # [burç kodu a, burç kodu b] -> element bonusu; son satır/sütun (-1) bilinmeyen burç
+    n = len(ZODIAC_CODES)
+    out = np.zeros((n + 1, n + 1), dtype=np.int16)
+    for i, za in enumerate(ZODIAC_CODES):
+        for j, zb in enumerate(ZODIAC_CODES):
+            ea, eb = ZODIAC_ELEMENT.get(za, ""), ZODIAC_ELEMENT.get(zb, "")
+            out[i, j] = ELEMENT_BONUS.get((ea, eb), 6 if ea and eb else 0)
+    return out
+
+
+_ELEMENT = _element_table()
+
+
+class _Population:
+    """
+    Process içi nüfus kopyası. Tabanlar bayat olabilir; bayat taban daha düşük olduğundan
+    (tabanlar sadece yükselir) arama fazladan aday bulur ama kimseyi kaçırmaz.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.generation = 0
+        self._clear()
+
+    def _clear(self) -> None:
+        self.seq = 0
+        self.ids: List[str] = []
+        self.zodiac_names: List[str] = []
+        self.raw = np.zeros((0, len(totals_vector({}))), dtype=np.int64)
+        self.unit = np.zeros((0, len(totals_vector({}))), dtype=np.float64)
+        self.zodiac = np.zeros(0, dtype=np.int64)
+        self.floor = np.zeros(0, dtype=np.int64)
+        self.index: Dict[str, int] = {}
+        self.floors_at = 0.0
+
+    def sync(self, conn) -> None:
+        generation = int(conn.execute("SELECT generation FROM match_meta WHERE id = 1").fetchone()[0])
+        if generation != self.generation:
+            # rebuild() tabloları baştan kurdu: yerel kopya da baştan okunur.
+            self._clear()
+            self.generation = generation
+        rows = conn.execute(
+            "SELECT seq, profile_id, zodiac, vec, floor FROM match_profiles WHERE seq > ? ORDER BY seq", (self.seq,)
+        ).fetchall()
+        if rows:
+            raw = np.array([np.frombuffer(r[3], dtype="<i2") for r in rows], dtype=np.int64)
+            vecs = raw.astype(np.float64)
+            norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+            self.raw = np.vstack([self.raw, raw])
+            self.unit = np.vstack([self.unit, np.divide(vecs, norms, out=np.zeros_like(vecs), where=norms > 0)])
+            self.zodiac = np.append(self.zodiac, [zodiac_code(r[2] or "") for r in rows])
+            self.floor = np.append(self.floor, [int(r[4]) for r in rows])
+            for r in rows:
+                self.index[r[1]] = len(self.ids)
+                self.ids.append(r[1])
+                self.zodiac_names.append(r[2] or "")
+            self.seq = int(rows[-1][0])
+        if time.time() - self.floors_at > FLOOR_REFRESH:
+            for pid, floor in conn.execute("SELECT profile_id, floor FROM match_profiles"):
+                i = self.index.get(pid)
+                if i is not None:
+                    self.floor[i] = int(floor)
+            self.floors_at = time.time()
+
+    def bounds(self, unit: np.ndarray, zcode: int) -> np.ndarray:
+        """
+        Yeni gelenin herkesle alabileceği en yüksek skor (kesin skor bunu geçmez).
+        """
+        sim = self.unit @ unit
+        element = _ELEMENT[zcode, self.zodiac]
+        return np.floor(sim * 70).astype(np.int64) + _ROUND_SLACK + element + _MAX_VARIETY
+
+
+_pop = _Population()
+
+
+def _push(conn, owner: str, other: str, scored: Dict[str, Any], k: int) -> int:
+    """
+    owner'ın heap'ine other'ı ekler, K'yı aşarsa en düşüğü atar. Dönen: yeni taban.
+    """
+    conn.execute(
+        "INSERT OR REPLACE INTO match_topk VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (owner, other, scored["score"], scored["label"], scored["sim_pct"], scored["element_bonus"], scored["variety_bonus"]),
+    )
+    n = conn.execute("SELECT COUNT(*) FROM match_topk WHERE profile_id = ?", (owner,)).fetchone()[0]
+    if n > k:
+        conn.execute(
+            "DELETE FROM match_topk WHERE rowid IN (SELECT rowid FROM match_topk WHERE profile_id = ? "
+            "ORDER BY score ASC, rowid DESC LIMIT ?)",
+            (owner, n - k),
+        )
+    floor = -1
+    if n >= k:
+        floor = int(conn.execute("SELECT MIN(score) FROM match_topk WHERE profile_id = ?", (owner,)).fetchone()[0])
+    conn.execute("UPDATE match_profiles SET floor = ? WHERE profile_id = ?", (floor, owner))
+    return floor
+
+
+def _score(totals: Dict[str, int], zodiac: str, other_totals: Dict[str, int], other_zodiac: str) -> Dict[str, Any]:
+    score, label, br = compute_compatibility(totals, other_totals, zodiac, other_zodiac)
+    return {"score": int(score), "label": label, **{k: int(v) for k, v in br.items()}}
+
+
+def record_result(row: Dict[str, Any], k: int = TOP_K) -> Dict[str, int]:
+    """
+    Yazılan sonucu nüfusa ekler ve etkilenen heap'leri günceller (rollups.record_result biçiminde satır).
+    Dönen: {"scored": kesin skorlanan, "updated": değişen heap sayısı}. Bilinen profile_id no-op.
+    """
+    payload = row.get("_result") or {}
+    pid = str(row.get("profile_id") or "")
+    raw = np.clip(np.asarray(totals_vector(payload.get("totals")), dtype=np.int64), -32768, 32767)
+    norm = float(np.linalg.norm(raw))
+    if not pid or norm == 0:
+        return {"scored": 0, "updated": 0}
+    totals = totals_from_vector(raw.tolist())
+    zodiac = str(payload.get("zodiac") or row.get("zodiac") or "")
+    unit = raw.astype(np.float64) / norm
+
+    conn = _db()
+    with _pop.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _pop.sync(conn)
+            if pid in _pop.index:
+                conn.execute("COMMIT")
+                return {"scored": 0, "updated": 0}
+
+            bounds = _pop.bounds(unit, zodiac_code(zodiac))
+            # Yarıçap: sadece üst sınırı mevcut tabanı geçebilenler
+            hits = np.flatnonzero(bounds > _pop.floor)
+            order = np.argsort(-bounds, kind="stable")
+            scores: Dict[int, Dict[str, Any]] = {}
+
+            def exact(i: int) -> Dict[str, Any]:
+                if i not in scores:
+                    other = totals_from_vector(_pop.raw[i].tolist())
+                    scores[i] = _score(totals, zodiac, other, _pop.zodiac_names[i])
+                return scores[i]
+
+            # Kendi heap'i: sınıra göre sırayla, K. en iyi kesin skor sıradaki sınıra ulaştıysa dur.
+            mine: List[int] = []
+            for i in order.tolist():
+                if len(mine) >= k and scores[mine[k - 1]]["score"] >= bounds[i]:
+                    break
+                exact(i)
+                mine = sorted(mine + [i], key=lambda j: -scores[j]["score"])[:k]
+
+            conn.execute(
+                "INSERT INTO match_profiles (profile_id, name, zodiac, dominant, ts_utc, vec) VALUES (?, ?, ?, ?, ?, ?)",
+                (pid, payload.get("name", ""), zodiac, payload.get("dominant", ""), row.get("ts_utc", ""),
+                 raw.astype("<i2").tobytes()),
+            )
+            for j in mine:
+                _push(conn, pid, _pop.ids[j], scores[j], k)
+
+            updated = 0
+            for i in hits.tolist():
+                s = exact(i)
+                if s["score"] <= _pop.floor[i]:
+                    continue
+                floor = conn.execute("SELECT floor FROM match_profiles WHERE profile_id = ?", (_pop.ids[i],)).fetchone()
+                if floor is not None and s["score"] <= int(floor[0]):
+                    _pop.floor[i] = int(floor[0])
+                    continue
+                _pop.floor[i] = _push(conn, _pop.ids[i], pid, s, k)
+                updated += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            _pop.floors_at = 0.0  # geri alınan tabanlar bir sonraki sync'te yeniden okunur
+            raise
+        _pop.sync(conn)
+    return {"scored": len(scores), "updated": updated}
+
+
+def top(profile_id: str, limit: int = TOP_K) -> List[Dict[str, Any]]:
+    """
+    profile_id'nin güncel en uyumlu listesi, main._top_matches ile aynı biçimde.
+    """
+    cur = _db().execute(
+        "SELECT t.other_id, p.name, p.zodiac, t.score, t.label, t.sim_pct, t.element_bonus, t.variety_bonus, p.dominant "
+        "FROM match_topk t JOIN match_profiles p ON p.profile_id = t.other_id "
+        "WHERE t.profile_id = ? ORDER BY t.score DESC, p.seq DESC LIMIT ?",
+        (profile_id, int(limit)),
+    )
+    keys = ("profile_id", "name", "zodiac", "score", "label", "sim_pct", "element_bonus", "variety_bonus", "dominant")
+    return [dict(zip(keys, r)) for r in cur]
+
+
+def rebuild(rows: Iterable[Dict[str, Any]], k: int = TOP_K) -> Dict[str, int]:
+    """
+    Tüm heap'leri silip rows'tan yeniden kurar (skorlar değiştiyse: app.backfill sonrası).
+    Diğer process'ler generation değişimini görüp nüfus kopyalarını yeniden okur.
+    """
+    conn = _db()
+    with _pop.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM match_topk")
+            conn.execute("DELETE FROM match_profiles")
+            conn.execute("UPDATE match_meta SET generation = generation + 1 WHERE id = 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return backfill(rows, k)
+
+
+def backfill(rows: Iterable[Dict[str, Any]], k: int = TOP_K) -> Dict[str, int]:
+    """
+    Var olan sonuçları (snapshot.iter_results biçimi) sırayla ekler; bilinenler atlanır.
+    """
+    out = {"rows": 0, "scored": 0, "updated": 0}
+    for r in rows:
+        stats = record_result(r, k)
+        out["rows"] += 1
+        out["scored"] += stats["scored"]
+        out["updated"] += stats["updated"]
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Profil başına en uyumlu K kişi (artımlı)")
+    ap.add_argument("command", choices=["backfill", "show"])
+    ap.add_argument("profile_id", nargs="?", default="")
+    ap.add_argument("--k", type=int, default=TOP_K)
+    args = ap.parse_args()
+    if args.command == "backfill":
+        from app import snapshot
+
+        print(json.dumps(backfill(snapshot.iter_results(), k=args.k), ensure_ascii=False))
+    else:
+        print(json.dumps(top(args.profile_id, args.k), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Eşleştirme aday kümesinin diskteki kompakt snapshot'ı (warm start için).
+
+Yeni açılan bir process (deploy, scale-from-zero) ilk kullanıcıda Sheets'i beklemek yerine
+bu dosyayı salt-okunur mmap ile açar ve adayları hemen sunar; güncel liste arka planda gelir
+(storage.gsheets_fetch_recent_results -> shared_cache fallback).
+
+Dosya düzeni (little-endian):
+    header   : magic, trait sayısı, satır sayısı, metin blob uzunluğu, oluşturulma zamanı
+    keys     : trait adları (uzunluk önekli utf-8; sıra değişmişse dosya yok sayılır)
+    totals   : int16 [n x K]
+    zodiac   : int8  [n]   (codec.ZODIAC_CODES index'i, -1 = bilinmiyor)
+    dominant : int8  [n]   (ARSHETIP_KEYS index'i, -1 = yok)
+    name_off : uint32 [n + 1], pid_off : uint32 [n + 1]
+    blob     : isimler + profile_id'ler (utf-8)
+
+Varsayılan yol runtime/match_index.bin; IZ_MATCH_SNAPSHOT ile kalıcı bir diske yönlendirilebilir.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.codec import totals_from_vector, totals_vector, zodiac_code, zodiac_from_code
+from app.dengeleyici import ARSHETIP_KEYS
+from app.utils import runtime_path
+
+MAGIC = b"IZMX1"
+_HEAD = struct.Struct("<5sHIId")
+SNAPSHOT_INTERVAL = 300.0  # en fazla bu sıklıkta yeniden yazılır (s)
+
+
+def default_path() -> Path:
+    override = os.environ.get("IZ_MATCH_SNAPSHOT")
+    if override:
+        p = Path(override)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return p
+    return runtime_path("match_index.bin")
+
+
+def _offsets(items: Sequence[bytes]) -> np.ndarray:
+    out = np.zeros(len(items) + 1, dtype="<u4")
+    if items:
+        np.cumsum([len(b) for b in items], out=out[1:])
+    return out
+
+
+def write(rows: Sequence[Dict[str, Any]], path: Optional[Path] = None) -> Path:
+    """
+    Aday satırlarını (gsheets_fetch_recent_results çıktısı) dosyaya yazar; atomik (tmp + replace).
+    """
+    path = path or default_path()
+    keys = ",".join(ARSHETIP_KEYS).encode("utf-8")
+    n, k = len(rows), len(ARSHETIP_KEYS)
+    totals = np.zeros((n, k), dtype="<i2")
+    zodiac = np.full(n, -1, dtype="i1")
+    dominant = np.full(n, -1, dtype="i1")
+    names: List[bytes] = []
+    pids: List[bytes] = []
+    for i, r in enumerate(rows):
+        payload = r.get("_result") or {}
+        totals[i] = np.clip(totals_vector(payload.get("totals")), -32768, 32767)
+        zodiac[i] = zodiac_code(str(payload.get("zodiac") or r.get("zodiac") or ""))
+        dom = str(payload.get("dominant") or r.get("dominant") or "")
+        dominant[i] = ARSHETIP_KEYS.index(dom) if dom in ARSHETIP_KEYS else -1
+        names.append(str(payload.get("name") or r.get("name") or "").encode("utf-8"))
+        pids.append(str(r.get("profile_id") or "").encode("utf-8"))
+    blob = b"".join(names) + b"".join(pids)
+    name_off = _offsets(names)
+    pid_off = _offsets(pids) + name_off[-1]
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_HEAD.pack(MAGIC, k, n, len(blob), time.time()))
+        f.write(struct.pack("<H", len(keys)) + keys)
+        for arr in (totals, zodiac, dominant, name_off, pid_off):
+            f.write(arr.tobytes())
+        f.write(blob)
+    os.replace(tmp, path)
+    return path
+
+
+class MatchSnapshot:
+    """
+    Salt-okunur mmap üzerinde diziler; metinler sadece istenen satırlar için çözülür.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, k, n, blob_len, created = _HEAD.unpack_from(self.mm, 0)
+        off = _HEAD.size
+        (klen,) = struct.unpack_from("<H", self.mm, off)
+        keys = bytes(self.mm[off + 2 : off + 2 + klen]).decode("utf-8").split(",")
+        if magic != MAGIC or keys != list(ARSHETIP_KEYS):
+            raise ValueError("match snapshot uyumsuz (format ya da trait listesi değişmiş)")
+        off += 2 + klen
+        self.n, self.created_at = n, created
+        self.totals = np.frombuffer(self.mm, dtype="<i2", count=n * k, offset=off).reshape(n, k)
+        off += 2 * n * k
+        self.zodiac = np.frombuffer(self.mm, dtype="i1", count=n, offset=off)
+        off += n
+        self.dominant = np.frombuffer(self.mm, dtype="i1", count=n, offset=off)
+        off += n
+        self.name_off = np.frombuffer(self.mm, dtype="<u4", count=n + 1, offset=off)
+        off += 4 * (n + 1)
+        self.pid_off = np.frombuffer(self.mm, dtype="<u4", count=n + 1, offset=off)
+        off += 4 * (n + 1)
+        self.blob_off = off
+        if off + blob_len > len(self.mm):
+            raise ValueError("match snapshot kesik")
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _text(self, offs: np.ndarray, i: int) -> str:
+        a, b = self.blob_off + int(offs[i]), self.blob_off + int(offs[i + 1])
+        return bytes(self.mm[a:b]).decode("utf-8", errors="replace")
+
+    def row(self, i: int) -> Dict[str, Any]:
+        name = self._text(self.name_off, i)
+        zodiac = zodiac_from_code(int(self.zodiac[i]))
+        d = int(self.dominant[i])
+        dominant = ARSHETIP_KEYS[d] if 0 <= d < len(ARSHETIP_KEYS) else ""
+        vec = self.totals[i].tolist()
+        # Sheets'ten gelen projeksiyonlu satırla aynı biçim (storage._fetch_recent_results_projected)
+        return {
+            "profile_id": self._text(self.pid_off, i),
+            "name": name,
+            "zodiac": zodiac,
+            "dominant": dominant,
+            **{k: str(v) for k, v in zip(ARSHETIP_KEYS, vec)},
+            "_result": {
+                "name": name,
+                "zodiac": zodiac,
+                "dominant": dominant,
+                "totals": totals_from_vector(vec),
+            },
+        }
+
+    def rows(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        En yeni `limit` satır (dosyadaki sırayla, yani eskiden yeniye).
+        """
+        start = 0 if limit is None else max(0, self.n - int(limit))
+        return [self.row(i) for i in range(start, self.n)]
+
+
+_lock = threading.Lock()
+_loaded: Dict[str, Tuple[Tuple[int, int], Optional[MatchSnapshot]]] = {}
+
+
+def load(path: Optional[Path] = None) -> Optional[MatchSnapshot]:
+    """
+    Dosya değişmediyse aynı mmap döner. Dosya yoksa ya da okunamıyorsa None.
+    """
+    path = path or default_path()
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    sig = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        hit = _loaded.get(str(path))
+        if hit and hit[0] == sig:
+            return hit[1]
+        try:
+            snap: Optional[MatchSnapshot] = MatchSnapshot(path)
+        except Exception:
+            snap = None
+        _loaded[str(path)] = (sig, snap)
+        return snap
+
+
+def maybe_write(rows: Sequence[Dict[str, Any]], path: Optional[Path] = None, interval: float = SNAPSHOT_INTERVAL) -> bool:
+    """
+    Dosya interval'dan eskiyse (ya da yoksa) yeniden yazar. Boş liste yazılmaz (iyi snapshot ezilmesin).
+    """
+    if not rows:
+        return False
+    path = path or default_path()
+    try:
+        if time.time() - path.stat().st_mtime < interval:
+            return False
+    except OSError:
+        pass
+    write(rows, path)
+    return True
@@ -0,0 +1,109 @@
+"""
+results / events için aylık tab bölümleri (results_2026_10 gibi).
+
+- Yazmalar o ayın tabına gider; tab yoksa header'ıyla birlikte oluşturulur (storage).
+- Eski, bölümlenmemiş tab ("results") en eski bölüm sayılır.
+- Satır konumları bölümler arası tek bir sayıyla ifade edilir: global_row = sıra * ROW_SPAN + satır.
+  Eski tabın sırası 0 olduğundan mevcut checkpoint'ler (snapshot, funnel) aynen geçerli kalır.
+
+Bu modül streamlit'e ve Sheets'e bağlı değil; sadece isim / sıra hesabı.
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+PARTITIONED_TABS = ("results", "events")
+ROW_SPAN = 10_000_000  # Sheets hücre sınırı nedeniyle bir tabda bundan fazla satır olamaz
+MONTH_SLACK = 86400.0  # ay sınırında saat kaymasıyla komşu bölüme yazılmış satırlar için pay (s)
+
+_SUFFIX_RE = re.compile(r"^_(\d{4})_(\d{2})$")
+
+
+def partition_name(base: str, when: Optional[datetime] = None) -> str:
+    when = when or datetime.now(timezone.utc)
+    return f"{base}_{when.year:04d}_{when.month:02d}"
+
+
+def partition_month(base: str, title: str) -> Optional[Tuple[int, int]]:
+    """
+    "results_2026_10" -> (2026, 10). Bölüm değilse None.
+    """
+    if not title.startswith(base):
+        return None
+    m = _SUFFIX_RE.match(title[len(base):])
+    if not m:
+        return None
+    year, month = int(m.group(1)), int(m.group(2))
+    return (year, month) if 1 <= month <= 12 else None
+
+
+def ordinal(base: str, title: str) -> Optional[int]:
+    """
+    Eski tab 0, bölümler ay sırasıyla artan; ilgisiz tab None.
+    """
+    if title == base:
+        return 0
+    ym = partition_month(base, title)
+    return ym[0] * 12 + ym[1] if ym else None
+
+
+def ordered(base: str, titles: Iterable[str]) -> List[str]:
+    """
+    base'e ait tablar, eskiden yeniye (eski tab varsa en başta).
+    """
+    own = [(ordinal(base, t), t) for t in titles]
+    return [t for o, t in sorted((o, t) for o, t in own if o is not None)]
+
+
+def global_row(base: str, title: str, row: int) -> int:
+    return int(ordinal(base, title) or 0) * ROW_SPAN + int(row)
+
+
+def tab_for(base: str, ordinal_: int) -> str:
+    """
+    ordinal'in tersi: 0 -> base, diğerleri -> base_YYYY_MM.
+    """
+    if ordinal_ <= 0:
+        return base
+    year, month = (ordinal_ - 1) // 12, (ordinal_ - 1) % 12 + 1
+    return f"{base}_{year:04d}_{month:02d}"
+
+
+def split_row(g: int) -> Tuple[int, int]:
+    """
+    global_row -> (sıra, tab içi satır).
+    """
+    return int(g) // ROW_SPAN, int(g) % ROW_SPAN
+
+
+def month_start(year: int, month: int) -> float:
+    return datetime(year, month, 1, tzinfo=timezone.utc).timestamp()
+
+
+def in_window(base: str, title: str, start: Optional[float], end: Optional[float]) -> bool:
+    """
+    Bölümün ayı [start, end) aralığıyla kesişiyor mu (None = açık uç)? Eski tab her zaman True.
+    """
+    ym = partition_month(base, title)
+    if ym is None:
+        return True
+    year, month = ym
+    lo = month_start(year, month) - MONTH_SLACK
+    hi = month_start(year + month // 12, month % 12 + 1) + MONTH_SLACK
+    return (end is None or lo < end) and (start is None or hi > start)
+
+
+def closed_at(base: str, title: str, titles: Iterable[str]) -> Optional[float]:
+    """
+    Tabın yazmaya kapandığı an: kendisinden sonraki bölümün ayının başı. En yeni tab için None.
+    """
+    tabs = ordered(base, titles)
+    if title not in tabs:
+        return None
+    i = tabs.index(title)
+    if i + 1 >= len(tabs):
+        return None
+    nxt = partition_month(base, tabs[i + 1])
+    return month_start(*nxt) if nxt else None
@@ -0,0 +1,221 @@
+"""
+Trait puanları için popülasyon yüzdelikleri ("katılımcıların %82'sinden yüksek").
+
+Trait toplamları küçük tam sayılar (birkaç düzine farklı değer), bu yüzden
+yaklaşık bir sketch yerine kesin histogram tutulur:
+    trait_hist: kapsam ("*" ya da burç) x trait x değer -> adet
+
+- Sonuç yazılırken +1 yapılır (record_result); histogramlar toplanarak birleşir.
+- Boyut sonuç sayısından bağımsız: kapsam x trait x farklı değer kadar satır.
+- Sorgular process içindeki kümülatif tablodan bisect ile yapılır;
+  tablo sadece histogram generation'ı değişince yeniden okunur. Generation her yazmayla aynı
+  transaction'da artar (shared_cache'teki gibi); tüm process ve thread'ler aynı sayıyı görür.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.dengeleyici import ARSHETIP_KEYS
+from app.localdb import connect
+
+ALL = "*"
+MIN_POPULATION = 30
+VERSION_CHECK_INTERVAL = 1.0  # saniye; diğer process'lerin yazdıkları en geç bu kadar gecikir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trait_hist (
+    scope TEXT NOT NULL,
+    trait TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (scope, trait, value)
+);
+CREATE TABLE IF NOT EXISTS trait_hist_gen (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO trait_hist_gen VALUES (1, 0);
+"""
+
+_UPSERT = (
+    "INSERT INTO trait_hist VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(scope, trait, value) DO UPDATE SET n = n + excluded.n"
+)
+
+_ready = False
+
+# (scope, trait) -> (sıralı değerler, kümülatif adetler, toplam)
+_Cdf = Tuple[List[int], List[int], int]
+_snapshot: Dict[Tuple[str, str], _Cdf] = {}
+_snapshot_generation: Optional[int] = None
+_local_writes = 0
+_seen_writes = 0
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        _ready = True
+    return conn
+
+
+def init_db() -> None:
+    """
+    Şemayı kurar. Açık transaction'dan önce çağrılmalı (executescript transaction'ı commit eder).
+    """
+    _db()
+
+
+def _bump(conn) -> None:
+    conn.execute("UPDATE trait_hist_gen SET generation = generation + 1 WHERE id = 1")
+
+
+def _generation(conn) -> int:
+    row = conn.execute("SELECT generation FROM trait_hist_gen WHERE id = 1").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _rows(totals: Dict[str, Any], zodiac: str) -> List[Tuple[str, str, int, int]]:
+    scopes = [ALL] + ([zodiac] if zodiac else [])
+    out = []
+    for k in ARSHETIP_KEYS:
+        try:
+            v = int(totals.get(k, 0) or 0)
+        except Exception:
+            continue
+        out.extend((s, k, v, 1) for s in scopes)
+    return out
+
+
+def record_result(rec: Dict[str, Any]) -> None:
+    """
+    Yazılan sonucun trait toplamlarını histogramlara ekler (rec: storage'a yazılan satır + _result).
+    """
+    global _local_writes
+    payload = rec.get("_result") or {}
+    totals = payload.get("totals")
+    if not isinstance(totals, dict):
+        return
+    conn = _db()
+    # apply_synced açık transaction içinde çağırır; o zaman onun transaction'ına katılır.
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(_UPSERT, _rows(totals, str(payload.get("zodiac") or rec.get("zodiac") or "")))
+        _bump(conn)
+        if own:
+            conn.execute("COMMIT")
+    except Exception:
+        if own:
+            conn.execute("ROLLBACK")
+        raise
+    with _lock:
+        _local_writes += 1
+
+
+def add_counts(counts: Dict[Tuple[str, str, int], int], payload: Dict[str, Any]) -> None:
+    """
+    reconcile için: bir sonucun katkısını bellekteki sayaca ekler.
+    """
+    totals = payload.get("totals")
+    if not isinstance(totals, dict):
+        return
+    for s, k, v, _ in _rows(totals, str(payload.get("zodiac") or "")):
+        counts[(s, k, v)] = counts.get((s, k, v), 0) + 1
+
+
+def replace_all(conn, counts: Dict[Tuple[str, str, int], int]) -> None:
+    """
+    Histogramları baştan yazar. Açık transaction içinde çağrılır (rollups.reconcile).
+    """
+    global _local_writes
+    _db()
+    conn.execute("DELETE FROM trait_hist")
+    conn.executemany("INSERT INTO trait_hist VALUES (?, ?, ?, ?)", [key + (c,) for key, c in counts.items()])
+    _bump(conn)
+    with _lock:
+        _local_writes += 1
+
+
+def _load_snapshot() -> Tuple[int, Dict[Tuple[str, str], _Cdf]]:
+    conn = _db()
+    # Generation ve satırlar aynı okuma transaction'ında (WAL: tutarlı görüntü)
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN")
+    try:
+        generation = _generation(conn)
+        rows = conn.execute("SELECT scope, trait, value, n FROM trait_hist ORDER BY scope, trait, value").fetchall()
+    finally:
+        if own:
+            conn.execute("COMMIT")
+    grouped: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+    for scope, trait, value, n in rows:
+        grouped.setdefault((str(scope), str(trait)), []).append((int(value), int(n)))
+    snap: Dict[Tuple[str, str], _Cdf] = {}
+    for key, pairs in grouped.items():
+        values, cum, run = [], [], 0
+        for v, n in pairs:
+            run += n
+            values.append(v)
+            cum.append(run)
+        snap[key] = (values, cum, run)
+    return generation, snap
+
+
+def _current() -> Dict[Tuple[str, str], _Cdf]:
+    global _snapshot, _snapshot_generation, _checked_at, _seen_writes
+    now = time.monotonic()
+    with _lock:
+        # Kendi yazdıklarımız hemen, diğer process'lerinki en geç VERSION_CHECK_INTERVAL sonra görülür.
+        if _snapshot_generation is not None and _seen_writes == _local_writes and now - _checked_at < VERSION_CHECK_INTERVAL:
+            return _snapshot
+        writes = _local_writes
+    generation = _generation(_db())
+    with _lock:
+        _checked_at, _seen_writes = now, writes
+        if generation == _snapshot_generation:
+            return _snapshot
+    generation, snap = _load_snapshot()
+    with _lock:
+        _snapshot, _snapshot_generation = snap, generation
+    return snap
+
+
+def percentile(trait: str, value: int, zodiac: str = "", min_population: int = MIN_POPULATION) -> Optional[int]:
+    """
+    Bu trait'te value'dan düşük puan alanların yüzdesi (0-100).
+    zodiac verilirse sadece o burç. Popülasyon küçükse None.
+    """
+    cdf = _current().get((zodiac or ALL, trait))
+    if not cdf or cdf[2] < min_population:
+        return None
+    values, cum, total = cdf
+    i = bisect.bisect_left(values, int(value))
+    below = cum[i - 1] if i > 0 else 0
+    return int(round(100.0 * below / total))
+
+
+def population(zodiac: str = "") -> int:
+    cdf = _current().get((zodiac or ALL, ARSHETIP_KEYS[0]))
+    return cdf[2] if cdf else 0
+
+
+def percentiles(totals: Dict[str, Any], zodiac: str = "", traits: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """
+    {trait: yüzdelik}; yeterli veri olmayan trait'ler atlanır.
+    """
+    out: Dict[str, int] = {}
+    for k in traits or ARSHETIP_KEYS:
+        p = percentile(k, int(totals.get(k, 0) or 0), zodiac)
+        if p is not None:
+            out[k] = p
+    return out
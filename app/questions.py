@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils import runtime_path
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+# Cevaplanmamış soru için option index değeri
+UNANSWERED = -1
+
+
+@dataclass
+class Option:
+    yazi: str
+    etki: Dict[str, int]
+    mini_sahne: str
+
+
+@dataclass
+class Question:
+    soru: str
+    options: List[Option]
+
+
+def _read_json(path: Path) -> Any:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _questions_path_for_lang(lang: str) -> Path:
+    lang = (lang or "TR").upper()
+    candidates = {
+        "TR": [DATA_DIR / "questions_tr.json", DATA_DIR / "questions.json"],
+        "EN": [DATA_DIR / "questions_en.json"],
+    }.get(lang, [DATA_DIR / "questions_tr.json", DATA_DIR / "questions.json"])
+
+    for p in candidates:
+        if p.exists():
+            return p
+    raise FileNotFoundError("data/ altında questions_tr.json ve/veya questions_en.json olmalı.")
+
+
+def parse_questions(raw: Any) -> List[Question]:
+    if not isinstance(raw, list):
+        raise ValueError("Soru JSON formatı list olmalı.")
+
+    out: List[Question] = []
+    for item in raw:
+        if not isinstance(item, dict):
+            continue
+
+        soru = item.get("soru") or item.get("question") or item.get("q")
+        secenekler = item.get("secenekler") or item.get("options") or item.get("a")
+
+        if not isinstance(soru, str) or not isinstance(secenekler, list):
+            continue
+
+        opts: List[Option] = []
+        for opt in secenekler:
+            if not isinstance(opt, dict):
+                continue
+            yazi = opt.get("yazi") or opt.get("text") or opt.get("label")
+            etki = opt.get("etki") or opt.get("impact") or {}
+            mini = opt.get("mini_sahne") or opt.get("mini_scene") or opt.get("scene") or ""
+            if not isinstance(yazi, str):
+                continue
+            if not isinstance(etki, dict):
+                etki = {}
+            safe_etki: Dict[str, int] = {}
+            for k, v in etki.items():
+                try:
+                    safe_etki[str(k)] = int(v)
+                except Exception:
+                    continue
+            opts.append(Option(yazi=yazi, etki=safe_etki, mini_sahne=str(mini)))
+
+        if opts:
+            out.append(Question(soru=soru, options=opts))
+
+    if not out:
+        raise ValueError("Sorular parse edilemedi.")
+    return out
+
+
+@lru_cache(maxsize=16)
+def _load_questions_cached(path_str: str, mtime_ns: int) -> Tuple[List[Question], str]:
+    # mtime anahtarın parçası: dosya değişirse yeniden okunur.
+    questions = parse_questions(_read_json(Path(path_str)))
+    return questions, bank_hash(questions)
+
+
+def load_questions_file(path: Path) -> List[Question]:
+    """
+    Belirli bir JSON dosyasından banka yükler (karşılaştırma / analiz için).
+    """
+    p = Path(path)
+    return _load_questions_cached(str(p.resolve()), p.stat().st_mtime_ns)[0]
+
+
+def load_questions_for_lang(lang: str) -> List[Question]:
+    """
+    Dile göre soru bankasını yükler. Sonuç process içinde cache'lenir;
+    dönen liste paylaşılır, değiştirilmemeli.
+    """
+    return load_bank_for_lang(lang)[0]
+
+
+def load_bank_for_lang(lang: str) -> Tuple[List[Question], str]:
+    """
+    (sorular, bank_hash) döndürür.
+    """
+    p = _questions_path_for_lang(lang)
+    return _load_questions_cached(str(p), p.stat().st_mtime_ns)
+
+
+def bank_hash(questions: Sequence[Question]) -> str:
+    """
+    Soru bankasının içerik hash'i (16 hex karakter).
+    Metin, etki veya sıra değişirse hash de değişir.
+    """
+    canon = [
+        [q.soru, [[o.yazi, sorted(o.etki.items()), o.mini_sahne] for o in q.options]]
+        for q in questions
+    ]
+    blob = json.dumps(canon, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def bank_payload(questions: Sequence[Question]) -> List[Dict[str, Any]]:
+    """
+    Bankanın metin tablosu (parse_questions ile geri okunabilen ham JSON).
+    Event'ler sadece (bank, qi, oi) taşır; metinler buradan çözülür.
+    """
+    return [
+        {
+            "soru": q.soru,
+            "secenekler": [{"yazi": o.yazi, "etki": dict(o.etki), "mini_sahne": o.mini_sahne} for o in q.options],
+        }
+        for q in questions
+    ]
+
+
+def _archive_path(h: str) -> Path:
+    return runtime_path(f"banks/{h}.json")
+
+
+def archive_bank(questions: Sequence[Question], h: Optional[str] = None) -> Path:
+    """
+    Bankayı runtime/banks/<hash>.json olarak bir kez saklar (data/ dosyası sonradan değişse de
+    eski event'ler çözülebilsin). Dosya varsa dokunmaz.
+    """
+    h = h or bank_hash(questions)
+    path = _archive_path(h)
+    if not path.exists():
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(bank_payload(questions), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+    return path
+
+
+def load_bank_by_hash(h: str) -> Optional[List[Question]]:
+    """
+    Hash'i eşleşen bankayı önce data/ altında, sonra runtime/banks arşivinde arar.
+    Eşleşme yoksa None (içerik o tarihten beri değişmiş ve arşivlenmemiş demektir).
+    """
+    if not h:
+        return None
+    for p in sorted(DATA_DIR.glob("questions*.json")):
+        try:
+            questions, qh = _load_questions_cached(str(p), p.stat().st_mtime_ns)
+        except Exception:
+            continue
+        if qh == h:
+            return questions
+    archived = _archive_path(h)
+    if archived.exists():
+        try:
+            return _load_questions_cached(str(archived), archived.stat().st_mtime_ns)[0]
+        except Exception:
+            return None
+    return None
+
+
+def empty_answers(total: int) -> List[int]:
+    return [UNANSWERED] * total
+
+
+def set_answer(answers: List[int], qi: int, oi: int) -> List[int]:
+    if qi >= len(answers):
+        answers.extend([UNANSWERED] * (qi + 1 - len(answers)))
+    answers[qi] = int(oi)
+    return answers
+
+
+def answer_index(answers: Sequence[int], qi: int) -> Optional[int]:
+    if 0 <= qi < len(answers) and answers[qi] != UNANSWERED:
+        return int(answers[qi])
+    return None
+
+
+def chosen_options(questions: Sequence[Question], answers: Sequence[int]) -> List[Tuple[int, Option]]:
+    """
+    Geçerli (qi, Option) çiftleri. Bankada olmayan index'ler atlanır.
+    """
+    out: List[Tuple[int, Option]] = []
+    for qi, oi in enumerate(answers):
+        if oi == UNANSWERED or qi >= len(questions):
+            continue
+        opts = questions[qi].options
+        if 0 <= oi < len(opts):
+            out.append((qi, opts[oi]))
+    return out
+
+
+def rehydrate_answers(questions: Sequence[Question], answers: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Index dizisini eski zengin formata çevirir (debug / görüntüleme için).
+    """
+    return {
+        qi: {"yazi": opt.yazi, "etki": dict(opt.etki), "mini_sahne": opt.mini_sahne}
+        for qi, opt in chosen_options(questions, answers)
+    }
+
+
+def answers_from_legacy(questions: Sequence[Question], legacy: Any) -> List[int]:
+    """
+    Eski format ({qi: {"yazi", "etki", ...}}) cevapları index dizisine çevirir.
+    Önce yazı ile eşleştirir; yazı değişmişse etki ile dener.
+    """
+    answers = empty_answers(len(questions))
+    if isinstance(legacy, list):
+        # Zaten index dizisi
+        for qi, oi in enumerate(legacy[: len(questions)]):
+            try:
+                answers[qi] = int(oi)
+            except Exception:
+                continue
+        return answers
+    if not isinstance(legacy, dict):
+        return answers
+
+    for k, item in legacy.items():
+        try:
+            qi = int(k)
+        except Exception:
+            continue
+        if not (0 <= qi < len(questions)) or not isinstance(item, dict):
+            continue
+        opts = questions[qi].options
+        yazi = item.get("yazi")
+        oi = next((i for i, o in enumerate(opts) if o.yazi == yazi), None)
+        if oi is None:
+            etki = item.get("etki")
+            oi = next((i for i, o in enumerate(opts) if o.etki == etki), None)
+        if oi is not None:
+            answers[qi] = oi
+    return answers
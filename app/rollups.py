@@ -0,0 +1,332 @@
+"""
+Admin paneli için yazma anında güncellenen günlük özet tablolar.
+
+result_rollup: gün x dil x baskın x ikincil x burç -> adet
+event_rollup : gün x event_name -> adet
+
+Sonuç ve event'ler yazılırken +1 yapılır (record_result / record_event).
+Başka replica'ların yazdıkları Sheets snapshot'ı ile gelir (app.snapshot -> apply_synced);
+bu host'un zaten saydığı satırlar rollup_pending sayesinde ikinci kez sayılmaz.
+reconcile() ham kayıtlardan tabloları (ve app.percentiles histogramlarını) baştan kurar; periyodik olarak
+ya da Admin'den elle çalıştırılır:
+    python -m app.rollups reconcile
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app import percentiles
+from app.codec import MATCH_FIELDS, decode_result
+from app.localdb import connect
+
+RECONCILE_MAX_AGE = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_rollup (
+    day TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    primary_trait TEXT NOT NULL,
+    secondary_trait TEXT NOT NULL,
+    zodiac TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, lang, primary_trait, secondary_trait, zodiac)
+);
+CREATE TABLE IF NOT EXISTS event_rollup (
+    day TEXT NOT NULL,
+    event_name TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, event_name)
+);
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_pending (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+# Yazma anında sayılıp henüz snapshot'a (app.snapshot) gelmemiş kayıtlar bu süreden sonra unutulur.
+PENDING_MAX_AGE = 7 * 24 * 3600
+
+_ready = False
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        percentiles.init_db()  # reconcile / apply_synced transaction içinde histogramlara yazar
+        _ready = True
+    return conn
+
+
+def init_db() -> None:
+    # apply_synced açık transaction içinde çağrıldığından şema önceden kurulmalı.
+    _db()
+
+
+def day_of(ts: Any) -> str:
+    """
+    ISO zaman -> UTC gün ("YYYY-MM-DD"). Parse edilemezse bugünün günü.
+    """
+    if isinstance(ts, str) and ts:
+        try:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(timezone.utc)
+            return dt.date().isoformat()
+        except Exception:
+            pass
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def secondary_trait(totals: Any, primary: str = "") -> str:
+    """
+    İkinci en yüksek trait (baskın hariç). Eşitlikte dict sırası.
+    """
+    if not isinstance(totals, dict):
+        return ""
+    rest = [(k, v) for k, v in totals.items() if k != primary]
+    if not rest:
+        return ""
+    k, _ = max(rest, key=lambda x: x[1])
+    return str(k)
+
+
+def _payload(rec: Dict[str, Any]) -> Dict[str, Any]:
+    payload = rec.get("_result")
+    if payload is None and rec.get("result_json"):
+        payload = decode_result(rec["result_json"], MATCH_FIELDS + ("lang",))
+    return payload or {}
+
+
+def result_key(rec: Dict[str, Any], payload: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str, str, str]:
+    # Hem canlı (dominant, ts_utc) hem eski JSONL (baskin, ikincil, timestamp) kayıtları.
+    payload = _payload(rec) if payload is None else payload
+    primary = str(payload.get("dominant") or rec.get("dominant") or rec.get("baskin") or "—")
+    secondary = str(rec.get("ikincil") or secondary_trait(payload.get("totals"), primary) or "—")
+    lang = str(payload.get("lang") or rec.get("lang") or rec.get("language") or "tr").lower()
+    zodiac = str(payload.get("zodiac") or rec.get("zodiac") or "")
+    ts = rec.get("ts_utc") or rec.get("timestamp") or rec.get("ts")
+    return day_of(ts), lang, primary, secondary, zodiac
+
+
+def event_key(rec: Dict[str, Any]) -> Tuple[str, str]:
+    name = str(rec.get("event_name") or rec.get("event") or "")
+    ts = rec.get("ts_utc") or rec.get("ts") or rec.get("timestamp")
+    return day_of(ts), name
+
+
+def result_identity(rec: Dict[str, Any]) -> str:
+    # Aynı satırı yazma anında ve snapshot'ta eşleştirmek için. ts_utc kullanılmaz
+    # (Sheets USER_ENTERED ile tarihi yeniden biçimlendirebilir); tekrarları pending sayacı karşılar.
+    return str(rec.get("profile_id") or "")
+
+
+def event_identity(rec: Dict[str, Any]) -> str:
+    return "|".join(str(rec.get(k) or "") for k in ("session_id", "event_name"))
+
+
+def _add_result(conn, key: Tuple[str, ...]) -> None:
+    conn.execute(
+        "INSERT INTO result_rollup VALUES (?, ?, ?, ?, ?, 1) "
+        "ON CONFLICT(day, lang, primary_trait, secondary_trait, zodiac) DO UPDATE SET n = n + 1",
+        key,
+    )
+
+
+def _add_event(conn, key: Tuple[str, ...]) -> None:
+    conn.execute(
+        "INSERT INTO event_rollup VALUES (?, ?, 1) "
+        "ON CONFLICT(day, event_name) DO UPDATE SET n = n + 1",
+        key,
+    )
+
+
+def _mark_pending(conn, kind: str, key: str) -> None:
+    conn.execute(
+        "INSERT INTO rollup_pending VALUES (?, ?, 1, ?) "
+        "ON CONFLICT(kind, key) DO UPDATE SET n = n + 1",
+        (kind, key, time.time()),
+    )
+
+
+def _take_pending(conn, kind: str, key: str) -> bool:
+    # Kayıt yazma anında zaten sayıldıysa snapshot'tan gelişi tekrar sayılmaz.
+    row = conn.execute("SELECT n FROM rollup_pending WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+    if not row:
+        return False
+    if int(row[0]) <= 1:
+        conn.execute("DELETE FROM rollup_pending WHERE kind = ? AND key = ?", (kind, key))
+    else:
+        conn.execute("UPDATE rollup_pending SET n = n - 1 WHERE kind = ? AND key = ?", (kind, key))
+    return True
+
+
+def record_result(rec: Dict[str, Any]) -> None:
+    """
+    Yazılan results satırı için rollup'ı +1 yapar (rec: storage'a yazılan satır).
+    Snapshot bu satırı sonra getirdiğinde tekrar saymasın diye bekleyenlere de yazılır.
+    """
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _add_result(conn, result_key(rec))
+        _mark_pending(conn, "result", result_identity(rec))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def record_event(rec: Dict[str, Any]) -> None:
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _add_event(conn, event_key(rec))
+        _mark_pending(conn, "event", event_identity(rec))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def apply_synced(conn, kind: str, rec: Dict[str, Any]) -> None:
+    """
+    Snapshot'a yeni gelen satır: bu host yazarken saymadıysa (başka replica) +1.
+    Açık transaction içinde çağrılır (app.snapshot).
+    """
+    if kind == "result":
+        if not _take_pending(conn, "result", result_identity(rec)):
+            _add_result(conn, result_key(rec))
+            percentiles.record_result(rec)
+    else:
+        if not _take_pending(conn, "event", event_identity(rec)):
+            _add_event(conn, event_key(rec))
+
+
+def prune_pending(conn, max_age: float = PENDING_MAX_AGE) -> None:
+    conn.execute("DELETE FROM rollup_pending WHERE created < ?", (time.time() - max_age,))
+
+
+def reconcile(
+    results: Optional[Iterable[Dict[str, Any]]] = None,
+    events: Optional[Iterable[Dict[str, Any]]] = None,
+) -> Dict[str, int]:
+    """
+    Ham kayıtlardan tabloları (ve trait histogramlarını) yeniden kurar. None verilen tablo olduğu gibi kalır.
+    Toplama bellekte yapılır (satır sayısı = farklı anahtar sayısı), yazma tek transaction.
+    """
+    conn = _db()
+    stats: Dict[str, int] = {}
+    res_counts: Dict[Tuple[str, ...], int] = {}
+    ev_counts: Dict[Tuple[str, ...], int] = {}
+    hist_counts: Dict[Tuple[str, str, int], int] = {}
+    if results is not None:
+        for rec in results:
+            payload = _payload(rec)
+            k = result_key(rec, payload)
+            res_counts[k] = res_counts.get(k, 0) + 1
+            percentiles.add_counts(hist_counts, {**payload, "zodiac": k[4]})
+        stats["results"] = sum(res_counts.values())
+    if events is not None:
+        for rec in events:
+            k = event_key(rec)
+            ev_counts[k] = ev_counts.get(k, 0) + 1
+        stats["events"] = sum(ev_counts.values())
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if results is not None:
+            conn.execute("DELETE FROM result_rollup")
+            conn.execute("DELETE FROM rollup_pending WHERE kind = 'result'")
+            conn.executemany("INSERT INTO result_rollup VALUES (?, ?, ?, ?, ?, ?)", [k + (n,) for k, n in res_counts.items()])
+            percentiles.replace_all(conn, hist_counts)
+        if events is not None:
+            conn.execute("DELETE FROM event_rollup")
+            conn.execute("DELETE FROM rollup_pending WHERE kind = 'event'")
+            conn.executemany("INSERT INTO event_rollup VALUES (?, ?, ?)", [k + (n,) for k, n in ev_counts.items()])
+        conn.execute(
+            "INSERT INTO rollup_meta VALUES ('last_reconciled', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (str(time.time()),),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return stats
+
+
+def last_reconciled() -> Optional[float]:
+    row = _db().execute("SELECT value FROM rollup_meta WHERE key = 'last_reconciled'").fetchone()
+    return float(row[0]) if row else None
+
+
+def needs_reconcile(max_age: float = RECONCILE_MAX_AGE) -> bool:
+    last = last_reconciled()
+    return last is None or time.time() - last > max_age
+
+
+def range_sql(start_day: Optional[str], end_day: Optional[str]) -> Tuple[str, List[str]]:
+    # "day" kolonlu tablolar için WHERE parçası (snapshot sorguları da kullanır).
+    where, args = [], []
+    if start_day:
+        where.append("day >= ?")
+        args.append(start_day)
+    if end_day:
+        where.append("day <= ?")
+        args.append(end_day)
+    return (" WHERE " + " AND ".join(where)) if where else "", args
+
+
+_RESULT_COLUMNS = {"day", "lang", "primary_trait", "secondary_trait", "zodiac"}
+
+
+def result_counts(column: str, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Tuple[str, int]]:
+    """
+    Bir boyuta göre toplam adetler, çoktan aza (column: lang / primary_trait / ...).
+    """
+    if column not in _RESULT_COLUMNS:
+        raise ValueError(f"Bilinmeyen kolon: {column}")
+    where, args = range_sql(start_day, end_day)
+    order = "day" if column == "day" else "2 DESC"
+    sql = f"SELECT {column}, SUM(n) FROM result_rollup{where} GROUP BY {column} ORDER BY {order}"
+    return [(str(k), int(n)) for k, n in _db().execute(sql, args)]
+
+
+def event_counts(start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Tuple[str, int]]:
+    where, args = range_sql(start_day, end_day)
+    sql = f"SELECT event_name, SUM(n) FROM event_rollup{where} GROUP BY event_name ORDER BY 2 DESC"
+    return [(str(k), int(n)) for k, n in _db().execute(sql, args)]
+
+
+def _reconcile_from_storage() -> Dict[str, int]:
+    from app.compaction import iter_all
+
+    # Sheets'ten silinmiş bölümler arşivden okunur.
+    return reconcile(results=iter_all("results"), events=iter_all("events"))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Admin rollup tabloları")
+    ap.add_argument("command", choices=["reconcile", "show"])
+    args = ap.parse_args()
+    if args.command == "reconcile":
+        print(json.dumps(_reconcile_from_storage(), ensure_ascii=False))
+    else:
+        print(json.dumps({"primary": result_counts("primary_trait"), "events": event_counts()}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Soru bankasını (option x trait) yoğun etki matrisine derler.
+Skorlama = satır index'lerini toplama (gather + sum).
+
+Tek oturum: score_answers(m, [2, 0, 1, ...])  -> {"kontrol": 7, ...}
+Toplu     : score_batch(m, answers_2d)       -> (N, K) int32
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.dengeleyici import ARSHETIP_KEYS
+from app.questions import UNANSWERED, Question, bank_hash
+
+# Büyük batch'lerde ara bellek sınırı için satır parçası
+BATCH_CHUNK = 262_144
+
+
+@dataclass(frozen=True)
+class EffectMatrix:
+    keys: Tuple[str, ...]
+    effects: np.ndarray  # (n_rows + 1, K) int32; son satır "cevap yok" (sıfır)
+    present: np.ndarray  # (n_rows + 1, K) bool; option o trait'i etki dict'inde içeriyor mu
+    offsets: np.ndarray  # (Q,) her sorunun ilk satırı
+    n_options: np.ndarray  # (Q,)
+    bank: str
+
+    @property
+    def n_questions(self) -> int:
+        return int(self.offsets.shape[0])
+
+    @property
+    def null_row(self) -> int:
+        return int(self.effects.shape[0] - 1)
+
+
+def compile_effect_matrix(questions: Sequence[Question], bank: Optional[str] = None) -> EffectMatrix:
+    # ARSHETIP_KEYS sabit sırada önce gelir; bankada başka anahtar varsa sona eklenir.
+    extra = sorted({k for q in questions for o in q.options for k in o.etki} - set(ARSHETIP_KEYS))
+    keys = tuple(ARSHETIP_KEYS) + tuple(extra)
+    col = {k: i for i, k in enumerate(keys)}
+
+    n_opts = np.array([len(q.options) for q in questions], dtype=np.int32)
+    offsets = np.zeros(len(questions), dtype=np.int32)
+    if len(questions) > 1:
+        offsets[1:] = np.cumsum(n_opts)[:-1]
+    n_rows = int(n_opts.sum())
+
+    effects = np.zeros((n_rows + 1, len(keys)), dtype=np.int32)
+    present = np.zeros((n_rows + 1, len(keys)), dtype=bool)
+    row = 0
+    for q in questions:
+        for o in q.options:
+            for k, v in o.etki.items():
+                effects[row, col[k]] = v
+                present[row, col[k]] = True
+            row += 1
+
+    effects.setflags(write=False)
+    present.setflags(write=False)
+    return EffectMatrix(
+        keys=keys,
+        effects=effects,
+        present=present,
+        offsets=offsets,
+        n_options=n_opts,
+        bank=bank or bank_hash(questions),
+    )
+
+
+_MATRIX_CACHE: Dict[str, EffectMatrix] = {}
+_MATRIX_LOCK = threading.Lock()
+
+
+def effect_matrix(questions: Sequence[Question], bank: Optional[str] = None) -> EffectMatrix:
+    """
+    Bank hash'ine göre cache'lenmiş matris.
+    """
+    bank = bank or bank_hash(questions)
+    m = _MATRIX_CACHE.get(bank)
+    if m is None:
+        with _MATRIX_LOCK:
+            m = _MATRIX_CACHE.get(bank)
+            if m is None:
+                m = compile_effect_matrix(questions, bank)
+                _MATRIX_CACHE[bank] = m
+    return m
+
+
+def answer_rows(m: EffectMatrix, answers: np.ndarray) -> np.ndarray:
+    """
+    (N, Q) option index'leri -> (N, Q) matris satırları.
+    Cevapsız (-1), aralık dışı veya eksik sorular null satıra gider.
+    """
+    a = np.asarray(answers, dtype=np.int64)
+    if a.ndim == 1:
+        a = a[None, :]
+    q = min(a.shape[1], m.n_questions)
+    out = np.full((a.shape[0], m.n_questions), m.null_row, dtype=np.int64)
+    sub = a[:, :q]
+    valid = (sub >= 0) & (sub < m.n_options[:q])
+    out[:, :q] = np.where(valid, sub + m.offsets[:q], m.null_row)
+    return out
+
+
+def _iter_chunks(n: int, size: int) -> Iterator[slice]:
+    for start in range(0, n, size):
+        yield slice(start, min(n, start + size))
+
+
+def score_batch(m: EffectMatrix, answers: np.ndarray, chunk: int = BATCH_CHUNK) -> np.ndarray:
+    """
+    (N, Q) cevap index'leri -> (N, K) trait toplamları (m.keys sırasıyla).
+    Soru başına bir gather; (N, Q, K) ara dizi oluşturulmaz.
+    """
+    a = np.asarray(answers)
+    if a.ndim == 1:
+        a = a[None, :]
+    totals = np.zeros((a.shape[0], len(m.keys)), dtype=np.int32)
+    for sl in _iter_chunks(a.shape[0], chunk):
+        rows = answer_rows(m, a[sl])
+        acc = totals[sl]
+        for qi in range(rows.shape[1]):
+            acc += m.effects[rows[:, qi]]
+    return totals
+
+
+def presence_batch(m: EffectMatrix, answers: np.ndarray, chunk: int = BATCH_CHUNK) -> np.ndarray:
+    """
+    (N, K) bool: seçilen option'lardan en az biri trait'i etkiliyor mu.
+    """
+    a = np.asarray(answers)
+    if a.ndim == 1:
+        a = a[None, :]
+    out = np.zeros((a.shape[0], len(m.keys)), dtype=bool)
+    for sl in _iter_chunks(a.shape[0], chunk):
+        rows = answer_rows(m, a[sl])
+        acc = out[sl]
+        for qi in range(rows.shape[1]):
+            acc |= m.present[rows[:, qi]]
+    return out
+
+
+def dominant_batch(totals: np.ndarray, present: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Satır başına baskın trait index'i. Eşitlikte m.keys sırasındaki ilk trait kazanır
+    (dominant_trait ile aynı kural). Hiç etki yoksa -1.
+    """
+    t = np.asarray(totals)
+    if present is None:
+        present = t != 0
+    masked = np.where(present, t, np.iinfo(np.int32).min)
+    idx = np.argmax(masked, axis=1).astype(np.int64)
+    idx[~present.any(axis=1)] = -1
+    return idx
+
+
+def score_answers(m: EffectMatrix, answers: Sequence[int]) -> Dict[str, int]:
+    """
+    Tek oturum skoru. Sadece seçilen option'ların etkilediği trait'ler döner
+    (anahtar sırası m.keys).
+    """
+    rows = answer_rows(m, np.asarray([a if a is not None else UNANSWERED for a in answers]))[0]
+    totals = m.effects[rows].sum(axis=0)
+    present = m.present[rows].any(axis=0)
+    return {k: int(totals[i]) for i, k in enumerate(m.keys) if present[i]}
@@ -0,0 +1,221 @@
+"""
+Aynı makinedeki tüm Streamlit process'lerinin paylaştığı cache katmanı.
+
+- Değerler runtime/iz.sqlite3 içinde (key, generation, fetched_at, stale, payload) olarak durur.
+- Yenilemeyi sadece lease'i alan process yapar; diğerleri mevcut kaydı okur.
+- Her process aynı generation'ı bir kez decode eder ve bellekte tutar,
+  sonraki okumalar sadece generation numarasına bakar.
+- Process içinde aynı anahtar için tek bir yenileme çalışır (single-flight);
+  süresi geçmiş ama hard-expiry sınırı içindeki değer hemen döner, yenileme arka planda yapılır.
+
+Böylece Sheets okuma sayısı replica ve eşzamanlı oturum sayısından bağımsız olur.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from app.localdb import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_cache (
+    key TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    payload BLOB NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS shared_lease (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class Entry(NamedTuple):
+    generation: int
+    fetched_at: float
+    stale: bool
+    value: Any
+
+
+_ready = False
+_memo: Dict[str, Entry] = {}
+_memo_lock = threading.Lock()
+
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="iz-cache-refresh")
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(shared_cache)")}
+        if "stale" not in cols:
+            conn.execute("ALTER TABLE shared_cache ADD COLUMN stale INTEGER NOT NULL DEFAULT 0")
+        _ready = True
+    return conn
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def read(key: str) -> Optional[Entry]:
+    """
+    Kayıt ya da None. Aynı generation tekrar decode edilmez.
+    """
+    row = _db().execute("SELECT generation, fetched_at, stale FROM shared_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    gen, fetched_at, stale = int(row[0]), float(row[1]), bool(row[2])
+    with _memo_lock:
+        hit = _memo.get(key)
+        if hit and hit.generation == gen:
+            if hit.stale != stale:
+                hit = hit._replace(stale=stale)
+                _memo[key] = hit
+            return hit
+    blob = _db().execute("SELECT payload FROM shared_cache WHERE key = ? AND generation = ?", (key, gen)).fetchone()
+    if blob is None:
+        return read(key)  # araya yeni generation girdi
+    entry = Entry(gen, fetched_at, stale, json.loads(bytes(blob[0]).decode("utf-8")))
+    with _memo_lock:
+        _memo[key] = entry
+    return entry
+
+
+def write(key: str, value: Any) -> int:
+    """
+    Yeni generation yazar ve numarasını döndürür.
+    """
+    payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    now = time.time()
+    conn = _db()
+    conn.execute(
+        "INSERT INTO shared_cache (key, generation, fetched_at, payload, stale) VALUES (?, 1, ?, ?, 0) "
+        "ON CONFLICT(key) DO UPDATE SET generation = generation + 1, fetched_at = excluded.fetched_at, "
+        "payload = excluded.payload, stale = 0",
+        (key, now, payload),
+    )
+    gen = int(conn.execute("SELECT generation FROM shared_cache WHERE key = ?", (key,)).fetchone()[0])
+    with _memo_lock:
+        _memo[key] = Entry(gen, now, False, value)
+    return gen
+
+
+def invalidate(prefix: str = "") -> None:
+    """
+    Kaydı silmeden bayat işaretler: okuyucular eski değeri (hard-expiry içinde)
+    görmeye devam eder, yenileme arka planda tetiklenir.
+    """
+    _db().execute("UPDATE shared_cache SET stale = 1 WHERE key LIKE ?", (prefix + "%",))
+
+
+def try_lease(key: str, ttl: float) -> bool:
+    """
+    Yenileme hakkını alır. Süresi dolmuş lease başka process'ten devralınabilir.
+    """
+    now = time.time()
+    conn = _db()
+    cur = conn.execute(
+        "INSERT INTO shared_lease VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+        "WHERE shared_lease.expires_at < ?",
+        (key, _owner(), now + ttl, now),
+    )
+    return cur.rowcount == 1
+
+
+def release_lease(key: str) -> None:
+    _db().execute("DELETE FROM shared_lease WHERE key = ? AND owner = ?", (key, _owner()))
+
+
+def _refresh(key: str, fetch: Callable[[], Any], lease_ttl: float, wait: float) -> Tuple[Any, float]:
+    before = read(key)
+    if try_lease(key, lease_ttl):
+        try:
+            value = fetch()
+            write(key, value)
+            return value, time.time()
+        finally:
+            release_lease(key)
+
+    # Başka process yeniliyor: yeni generation'ı bekle.
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        time.sleep(0.1)
+        entry = read(key)
+        if entry and (before is None or entry.generation != before.generation):
+            return entry.value, entry.fetched_at
+    entry = read(key)
+    if entry:
+        return entry.value, entry.fetched_at
+    # Refresher cevap vermedi: kendimiz okuyalım (paylaşılan kayda yazmadan).
+    return fetch(), time.time()
+
+
+def _single_flight(key: str, fetch: Callable[[], Any], lease_ttl: float, wait: float) -> Future:
+    """
+    Process içinde anahtar başına tek yenileme; aynı anda gelenler aynı Future'ı bekler.
+    """
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        if fut is None:
+            fut = _executor.submit(_refresh, key, fetch, lease_ttl, wait)
+            _inflight[key] = fut
+
+            def _done(f: Future, key: str = key) -> None:
+                with _inflight_lock:
+                    if _inflight.get(key) is f:
+                        del _inflight[key]
+
+            fut.add_done_callback(_done)
+        return fut
+
+
+def get_or_refresh(
+    key: str,
+    ttl: float,
+    fetch: Callable[[], Any],
+    lease_ttl: float = 30.0,
+    wait: float = 5.0,
+    max_stale: Optional[float] = None,
+    fallback: Optional[Callable[[], Optional[Tuple[Any, float]]]] = None,
+) -> Tuple[Any, float]:
+    """
+    - Taze kayıt (yaş < ttl, bayat işaretli değil): hemen döner.
+    - Süresi geçmiş ama yaşı max_stale'den küçük: hemen döner, yenileme arka planda.
+    - max_stale aşıldı: tek bir yenileme beklenir.
+    - Kayıt hiç yok (soğuk başlangıç): fallback() yaşı max_stale'den küçük bir (value, fetched_at)
+      verirse o döner ve yenileme arka planda sürer; yoksa yenileme beklenir.
+    Böylece max_stale'den eski veri hiçbir yoldan dönmez.
+    Dönen: (value, fetched_at)
+    """
+    entry = read(key)
+    if entry:
+        age = time.time() - entry.fetched_at
+        if age < ttl and not entry.stale:
+            return entry.value, entry.fetched_at
+        if max_stale is not None and age < max_stale:
+            _single_flight(key, fetch, lease_ttl, wait)
+            return entry.value, entry.fetched_at
+
+    fut = _single_flight(key, fetch, lease_ttl, wait)
+    if entry is None and fallback is not None and not fut.done():
+        try:
+            warm = fallback()
+        except Exception:
+            warm = None
+        if warm is not None and (max_stale is None or time.time() - warm[1] < max_stale):
+            return warm
+    return fut.result(timeout=lease_ttl + wait + 5)
@@ -0,0 +1,254 @@
+"""
+Sheets REST API (v4) için asyncio istemcisi: process başına tek event loop, sıcak bağlantı havuzu.
+
+- httpx kuruluysa AsyncClient kullanılır (h2 de kuruluysa HTTP/2, değilse HTTP/1.1 keep-alive).
+  Yoksa aynı API, requests oturumunun keep-alive havuzu üzerinden loop'un thread'lerinde çalışır.
+- Loop ayrı bir daemon thread'de döner; tüm Streamlit oturumları aynı loop'u ve bağlantıları paylaşır.
+- Service account token'ı süresi dolmadan arka planda yenilenir; istek yolunda token beklenmez.
+- Script thread'lerinden senkron kullanım: c.run(c.append("events", [...]))
+
+storage.py bu istemciyi process başına bir kez kurar (st.cache_resource); bu modül streamlit'e bağlı değil.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+API = "https://sheets.googleapis.com/v4/spreadsheets"
+SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+POOL_CONNECTIONS = 8
+REQUEST_TIMEOUT = 20.0
+RETRIES = 4
+REFRESH_MARGIN = 300.0  # token bitmeden bu kadar önce yenilenir (s)
+
+try:  # opsiyonel bağımlılık
+    import httpx
+except Exception:
+    httpx = None
+
+
+def a1_range(tab_name: str, rng: str = "") -> str:
+    """
+    'tab'!A1:B2 biçimi (tab adı tırnaklı). rng boşsa bütün tab.
+    """
+    quoted = "'" + tab_name.replace("'", "''") + "'"
+    return f"{quoted}!{rng}" if rng else quoted
+
+
+class SheetsApiError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"Sheets API {status}: {message}")
+        self.status = status
+
+
+def _body(r: Any) -> Any:
+    # Hata yanıtları (502 HTML sayfası gibi) JSON olmayabilir.
+    try:
+        return r.json() if r.content else {}
+    except ValueError:
+        return {}
+
+
+def _has_h2() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class _HttpxTransport:
+    def __init__(self) -> None:
+        http2 = _has_h2()
+        self.name = "httpx/http2" if http2 else "httpx/http1.1"
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=POOL_CONNECTIONS, max_keepalive_connections=POOL_CONNECTIONS),
+        )
+
+    async def request(self, method: str, url: str, params: Any, body: Any, headers: Dict[str, str]) -> Tuple[int, Any]:
+        r = await self.client.request(method, url, params=params, json=body, headers=headers)
+        return r.status_code, _body(r)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class _RequestsTransport:
+    # httpx yoksa: bloklayan istek loop'un küçük thread havuzunda, bağlantılar Session havuzunda sıcak.
+    def __init__(self) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.name = "requests/http1.1"
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_CONNECTIONS))
+        self.executor = ThreadPoolExecutor(POOL_CONNECTIONS, thread_name_prefix="iz-sheets-http")
+
+    async def request(self, method: str, url: str, params: Any, body: Any, headers: Dict[str, str]) -> Tuple[int, Any]:
+        def call() -> Tuple[int, Any]:
+            r = self.session.request(method, url, params=params, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
+            return r.status_code, _body(r)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def close(self) -> None:
+        self.session.close()
+        self.executor.shutdown(wait=False)
+
+
+class _Token:
+    """
+    Service account access token'ı. keep_fresh() arka planda süresi dolmadan yeniler.
+    """
+
+    def __init__(self, info: Dict[str, Any]) -> None:
+        from google.oauth2.service_account import Credentials
+
+        self.creds = Credentials.from_service_account_info(info, scopes=list(SCOPES))
+        self.lock = asyncio.Lock()
+        self.refreshes = 0
+
+    def expires_in(self) -> float:
+        expiry = self.creds.expiry  # naive UTC
+        if not self.creds.token or expiry is None:
+            return 0.0
+        return expiry.replace(tzinfo=timezone.utc).timestamp() - datetime.now(timezone.utc).timestamp()
+
+    def _refresh_blocking(self) -> None:
+        from google.auth.transport.requests import Request
+
+        self.creds.refresh(Request())
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self.lock:
+            if not force and self.expires_in() > 60:
+                return  # başka bir istek zaten yeniledi
+            await asyncio.get_running_loop().run_in_executor(None, self._refresh_blocking)
+            self.refreshes += 1
+
+    async def header(self) -> Dict[str, str]:
+        if self.expires_in() <= 60:
+            await self.refresh()
+        return {"Authorization": f"Bearer {self.creds.token}"}
+
+    async def keep_fresh(self) -> None:
+        while True:
+            try:
+                if self.expires_in() <= REFRESH_MARGIN:
+                    await self.refresh(force=True)
+                wait = max(30.0, self.expires_in() - REFRESH_MARGIN)
+            except Exception:
+                wait = 30.0  # ağ hatası: istek yolu yine kendisi yenileyebilir
+            await asyncio.sleep(wait)
+
+
+class AsyncSheetsClient:
+    """
+    Tek spreadsheet için async işlemler: append, append_many, get_range, batch_get.
+    """
+
+    def __init__(self, spreadsheet_id: str, service_account_info: Dict[str, Any], transport: Any = None) -> None:
+        self.spreadsheet_id = spreadsheet_id
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="iz-sheets-loop", daemon=True)
+        self.thread.start()
+        self.token = _Token(service_account_info)
+        self.transport = transport or self.run(self._open_transport(), timeout=REQUEST_TIMEOUT)
+        self.requests = 0
+        self.retries = 0
+        self._refresher = asyncio.run_coroutine_threadsafe(self.token.keep_fresh(), self.loop)
+
+    async def _open_transport(self) -> Any:
+        # httpx.AsyncClient loop içinde kurulur.
+        return _HttpxTransport() if httpx is not None else _RequestsTransport()
+
+    def run(self, coro: Any, timeout: Optional[float] = REQUEST_TIMEOUT * RETRIES) -> Any:
+        """
+        Coroutine'i paylaşılan loop'ta çalıştırıp sonucu bekler (Streamlit script thread'lerinden).
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _call(
+        self, method: str, path: str, params: Any = None, body: Any = None, retry_server_errors: bool = True
+    ) -> Dict[str, Any]:
+        """
+        429 her zaman tekrar denenir (istek işlenmeden reddedilir). 5xx sadece retry_server_errors ise:
+        append gibi idempotent olmayan bir yazma 5xx'ten önce uygulanmış olabilir, tekrar çift satır yazar.
+        """
+        url = f"{API}/{self.spreadsheet_id}{path}"
+        status, last = 0, ""
+        for attempt in range(RETRIES):
+            headers = await self.token.header()
+            self.requests += 1
+            status, data = await self.transport.request(method, url, params, body, headers)
+            if status < 400:
+                return data if isinstance(data, dict) else {}
+            last = str((data or {}).get("error", {}).get("message", "")) if isinstance(data, dict) else ""
+            if status == 401 and attempt == 0:
+                await self.token.refresh(force=True)
+            elif status == 429 or (status >= 500 and retry_server_errors):
+                await asyncio.sleep(1.2 * (attempt + 1))
+            else:
+                raise SheetsApiError(status, last)
+            self.retries += 1
+        raise SheetsApiError(status, last or "retry limit")
+
+    async def append_many(self, tab_name: str, rows: Sequence[Sequence[Any]]) -> Dict[str, Any]:
+        """
+        Satırları tek istekte tabın sonuna ekler. Dönen: API yanıtı (updates.updatedRange dahil).
+        """
+        return await self._call(
+            "POST",
+            f"/values/{quote(a1_range(tab_name), safe='')}:append",
+            params={"valueInputOption": "USER_ENTERED", "insertDataOption": "INSERT_ROWS"},
+            body={"values": [list(r) for r in rows]},
+            retry_server_errors=False,
+        )
+
+    async def append(self, tab_name: str, row: Sequence[Any]) -> Dict[str, Any]:
+        return await self.append_many(tab_name, [row])
+
+    async def get_range(self, tab_name: str, rng: str) -> List[List[str]]:
+        data = await self._call("GET", f"/values/{quote(a1_range(tab_name, rng), safe='')}")
+        return data.get("values", [])
+
+    async def batch_get(self, ranges: Sequence[Tuple[str, str]]) -> List[List[List[str]]]:
+        """
+        [(tab, aralık), ...] tek istekte; dönen liste aralık sırasında, boş aralık -> [].
+        """
+        if not ranges:
+            return []
+        data = await self._call("GET", "/values:batchGet", params=[("ranges", a1_range(t, r)) for t, r in ranges])
+        out = [vr.get("values", []) for vr in data.get("valueRanges", [])]
+        return out + [[] for _ in range(len(ranges) - len(out))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "transport": getattr(self.transport, "name", type(self.transport).__name__),
+            "requests": self.requests,
+            "retries": self.retries,
+            "token_refreshes": self.token.refreshes,
+            "token_expires_in": round(self.token.expires_in()),
+        }
+
+    def close(self) -> None:
+        self._refresher.cancel()
+        try:
+            self.run(self.transport.close(), timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+
+
+def gather(client: AsyncSheetsClient, *coros: Any, timeout: Optional[float] = None) -> List[Any]:
+    """
+    Birden fazla işlemi aynı loop'ta eşzamanlı çalıştırır; hata veren işlem exception olarak döner.
+    """
+
+    async def _all() -> List[Any]:
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    return client.run(_all(), timeout=timeout)
@@ -0,0 +1,416 @@
+"""
+Admin paneli için Sheets results / events tablarının yerel, artımlı snapshot'ı.
+
+- Snapshot runtime/iz.sqlite3 içinde; aynı makinedeki tüm process'ler paylaşır.
+- sync(): sadece son senkrondan sonra eklenen satırları storage üzerinden sayfa sayfa okur
+  (geçmiş uzunluğundan bağımsız), tek bir process lease ile yapar. Header, kayma kontrolü ve
+  ilk sayfa tek batchGet isteğidir; sync_all() tabları paralel senkronlar.
+- Yeni satırlar rollup'lara da uygulanır (rollups.apply_synced); bu host'un yazarken
+  saydığı satırlar tekrar sayılmaz.
+- Sheets'te satır silinip kaydıysa (son satırın profile_id'si tutmuyorsa) baştan kurulur.
+- Aylık bölümler (app.partitions): her fiziksel tabın kendi konumu vardır; kapanıp kapanıştan
+  sonra senkronlanmış bölümler tekrar okunmaz. Satır anahtarı global satırdır (row).
+  Sheets'ten silinmiş (arşivlenmiş) bölümler baştan kurulumda arşivden yüklenir.
+
+    python -m app.snapshot sync
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app import partitions, rollups, shared_cache
+from app.codec import MATCH_FIELDS, decode_result
+from app.dengeleyici import ARSHETIP_KEYS
+from app.localdb import connect
+from app.utils import RateLimiter
+
+TABS = ("results", "events")
+PAGE_SIZE = 500
+MAX_PAGES_PER_SYNC = 20  # tek senkronda en fazla bu kadar sayfa; kalan bir sonrakine
+SYNC_INTERVAL = 60.0
+LEASE_TTL = 120.0
+SETTLE_SECONDS = 86400.0  # kapanan bölüm bu kadar sonra bir kez daha okunur, sonra bırakılır
+
+_TRAITS = ", ".join(f"{k} INTEGER" for k in ARSHETIP_KEYS)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snap_results (
+    row INTEGER PRIMARY KEY,
+    ts_utc TEXT, day TEXT, session_id TEXT, profile_id TEXT, name TEXT, zodiac TEXT,
+    dominant TEXT, secondary TEXT, lang TEXT, {_TRAITS}
+);
+CREATE INDEX IF NOT EXISTS snap_results_day ON snap_results(day);
+CREATE TABLE IF NOT EXISTS snap_events (
+    row INTEGER PRIMARY KEY,
+    ts_utc TEXT, day TEXT, session_id TEXT, profile_id TEXT, event_name TEXT
+);
+CREATE INDEX IF NOT EXISTS snap_events_day ON snap_events(day);
+CREATE TABLE IF NOT EXISTS snap_meta (
+    tab TEXT PRIMARY KEY,
+    next_row INTEGER NOT NULL,
+    last_key TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+_ready = False
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        rollups.init_db()
+        _ready = True
+    return conn
+
+
+def _meta(tab: str) -> Tuple[int, str, float]:
+    row = _db().execute("SELECT next_row, last_key, synced_at FROM snap_meta WHERE tab = ?", (tab,)).fetchone()
+    return (int(row[0]), str(row[1]), float(row[2])) if row else (2, "", 0.0)
+
+
+def _own_meta_sql(tab: str) -> Tuple[str, List[str]]:
+    # Mantıksal tabın tüm fiziksel tabları: "results" ve "results_YYYY_MM"
+    return "(tab = ? OR tab GLOB ?)", [tab, f"{tab}_[0-9][0-9][0-9][0-9]_[0-9][0-9]"]
+
+
+def last_synced(tab: str) -> Optional[float]:
+    where, args = _own_meta_sql(tab)
+    row = _db().execute(f"SELECT MAX(synced_at) FROM snap_meta WHERE {where}", args).fetchone()
+    return float(row[0]) if row and row[0] else None
+
+
+def _row_key(tab: str, d: Dict[str, Any]) -> str:
+    # Satır kayması kontrolü için son satırın kimliği.
+    return str(d.get("profile_id") or "") + ("" if tab == "results" else "|" + str(d.get("event_name") or ""))
+
+
+def _to_int(x: Any) -> Optional[int]:
+    try:
+        return int(float(str(x).replace(",", "."))) if x not in (None, "") else None
+    except Exception:
+        return None
+
+
+def _result_record(d: Dict[str, Any]) -> Dict[str, Any]:
+    # Trait kolonları varsa onlardan, yoksa result_json'dan.
+    vec = [_to_int(d.get(k)) for k in ARSHETIP_KEYS]
+    payload: Dict[str, Any] = {}
+    if any(v is None for v in vec) and d.get("result_json"):
+        payload = decode_result(d["result_json"], MATCH_FIELDS + ("lang",))
+    totals = payload.get("totals") if payload.get("totals") else {k: v or 0 for k, v in zip(ARSHETIP_KEYS, vec) if v}
+    result = {
+        "name": d.get("name") or payload.get("name", ""),
+        "zodiac": d.get("zodiac") or payload.get("zodiac", ""),
+        "dominant": d.get("dominant") or payload.get("dominant", ""),
+        "totals": totals,
+        "lang": payload.get("lang") or d.get("lang", ""),
+    }
+    return {**{k: d.get(k, "") for k in ("ts_utc", "session_id", "profile_id", "name", "zodiac", "dominant")}, "_result": result}
+
+
+def _insert(conn, tab: str, row_number: int, rec: Dict[str, Any]) -> None:
+    if tab == "results":
+        day, lang, primary, secondary, zodiac = rollups.result_key(rec)
+        totals = rec["_result"].get("totals") or {}
+        conn.execute(
+            f"INSERT OR REPLACE INTO snap_results VALUES ({', '.join('?' * (10 + len(ARSHETIP_KEYS)))})",
+            (
+                row_number, rec.get("ts_utc", ""), day, rec.get("session_id", ""), rec.get("profile_id", ""),
+                rec["_result"].get("name", ""), zodiac, primary, secondary, lang,
+                *[int(totals.get(k, 0) or 0) for k in ARSHETIP_KEYS],
+            ),
+        )
+    else:
+        day, name = rollups.event_key(rec)
+        conn.execute(
+            "INSERT OR REPLACE INTO snap_events VALUES (?, ?, ?, ?, ?, ?)",
+            (row_number, rec.get("ts_utc", ""), day, rec.get("session_id", ""), rec.get("profile_id", ""), name),
+        )
+
+
+def reset(tab: str) -> None:
+    """
+    Snapshot'ı boşaltır; bir sonraki sync baştan okur (rollup'lar reconcile ile yeniden kurulur).
+    """
+    conn = _db()
+    where, args = _own_meta_sql(tab)
+    conn.execute(f"DELETE FROM snap_{tab}")
+    conn.execute(f"DELETE FROM snap_meta WHERE {where}", args)
+
+
+def _first_read(tab: str, next_row: int) -> Tuple[List[str], Optional[List[str]], List[List[str]]]:
+    """
+    Header, son senkron satırı (kayma kontrolü) ve ilk yeni sayfa tek batchGet isteğinde.
+    Dönen: (header, son senkron satırı ya da None, yeni satırlar)
+    """
+    from app.storage import gsheets_batch_get
+
+    first = next_row - 1 if next_row > 2 else next_row
+    ok, got, msg = gsheets_batch_get([(tab, "1:1"), (tab, f"{first}:{next_row + PAGE_SIZE - 1}")])
+    if not ok:
+        raise RuntimeError(msg)
+    header = got[0][0] if got[0] else []
+    if not header:
+        raise RuntimeError(f"{tab} header boş.")
+    rows = got[1]
+    if first == next_row:
+        return header, None, rows
+    return header, (rows[0] if rows else []), rows[1:]
+
+
+def _partition_tabs(tab: str) -> List[str]:
+    from app.storage import gsheets_tab_partitions
+
+    ok, tabs, msg = gsheets_tab_partitions(tab)
+    if not ok:
+        raise RuntimeError(msg)
+    return tabs
+
+
+def _settled(tab: str, physical: str, tabs: Sequence[str]) -> bool:
+    # Kapanmış ve kapanıştan SETTLE_SECONDS sonra senkronlanmış bölüm değişmez.
+    closed = partitions.closed_at(tab, physical, tabs)
+    return closed is not None and _meta(physical)[2] >= closed + SETTLE_SECONDS
+
+
+def _load_archived(conn, tab: str, tabs: Sequence[str]) -> int:
+    # Sheets'ten silinmiş bölümler: sadece baştan kurulumda, arşivden.
+    from app.compaction import iter_archived
+
+    n = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for d in iter_archived(tab, skip=tabs):
+            _insert(conn, tab, int(d["_row"]), _result_record(d) if tab == "results" else d)
+            n += 1
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n
+
+
+def _sync_partition(
+    tab: str, physical: str, pages: int, fresh: bool, limiter: Optional[RateLimiter]
+) -> Tuple[int, int, bool]:
+    """
+    Tek fiziksel tabın yeni satırları. Dönen: (yeni satır, kullanılan sayfa, kayma var mı)
+    """
+    from app.storage import gsheets_read_rows
+
+    next_row, last_key, _ = _meta(physical)
+    header, prev, page = _first_read(physical, next_row)
+    if prev is not None and last_key and _row_key(tab, dict(zip(header, prev))) != last_key:
+        return 0, 1, True
+
+    conn = _db()
+    new_rows = used = 0
+    while used < pages:
+        if page is not None:
+            values, page = page, None
+        else:
+            if limiter is not None:
+                limiter.acquire()
+            ok, values, msg = gsheets_read_rows(physical, next_row, PAGE_SIZE, len(header))
+            if not ok:
+                raise RuntimeError(msg)
+        used += 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for offset, r in enumerate(values):
+                d = {col: (r[i] if i < len(r) else "") for i, col in enumerate(header)}
+                rec = _result_record(d) if tab == "results" else d
+                _insert(conn, tab, partitions.global_row(tab, physical, next_row + offset), rec)
+                if not fresh:
+                    rollups.apply_synced(conn, "result" if tab == "results" else "event", rec)
+                last_key = _row_key(tab, d)
+            next_row += len(values)
+            conn.execute(
+                "INSERT INTO snap_meta VALUES (?, ?, ?, ?) ON CONFLICT(tab) DO UPDATE SET "
+                "next_row = excluded.next_row, last_key = excluded.last_key, synced_at = excluded.synced_at",
+                (physical, next_row, last_key, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        new_rows += len(values)
+        if len(values) < PAGE_SIZE:
+            break
+    return new_rows, used, False
+
+
+def sync(tab: str, max_pages: int = MAX_PAGES_PER_SYNC, reads_per_minute: Optional[float] = 50) -> Dict[str, Any]:
+    """
+    Yeni satırları okuyup snapshot'a ekler. Başka process senkron yapıyorsa hemen döner.
+    Bölümler eskiden yeniye; sayfa bütçesi (max_pages) hepsi için ortak.
+    Dönen: {"tab", "new_rows", "partitions", "skipped"?, "reset"?}
+    """
+    if tab not in TABS:
+        raise ValueError(f"Bilinmeyen tab: {tab}")
+
+    lease = f"snapshot:{tab}"
+    if not shared_cache.try_lease(lease, LEASE_TTL):
+        return {"tab": tab, "new_rows": 0, "skipped": "another process is syncing"}
+    try:
+        tabs = _partition_tabs(tab)
+        limiter = RateLimiter(reads_per_minute) if reads_per_minute else None
+        conn = _db()
+        out: Dict[str, Any] = {"tab": tab, "new_rows": 0, "partitions": len(tabs)}
+        # İlk senkron: rollup'lar zaten eski reconcile'dan dolu olabilir; saymak yerine snapshot'tan kurulur.
+        fresh = last_synced(tab) is None
+        for _ in range(2):
+            if fresh:
+                out["reset"] = True
+                out["archived_rows"] = _load_archived(conn, tab, tabs)
+            pages, shifted = max(1, max_pages), False
+            for physical in tabs:
+                if pages <= 0:
+                    break
+                if _settled(tab, physical, tabs):
+                    continue
+                n, used, shifted = _sync_partition(tab, physical, pages, fresh, limiter)
+                out["new_rows"] += n
+                pages -= used
+                if shifted:
+                    break
+            if not shifted:
+                break
+            # Satırlar kaydı: baştan kur, rollup'ları da yeniden say.
+            reset(tab)
+            fresh, out["new_rows"] = True, 0
+        if out.get("reset"):
+            rebuild_rollups(tab)
+        rollups.prune_pending(conn)
+        return out
+    finally:
+        shared_cache.release_lease(lease)
+
+
+def maybe_sync(tab: str, interval: float = SYNC_INTERVAL) -> Optional[Dict[str, Any]]:
+    """
+    Son senkron interval'dan eskiyse sync(); değilse None (okuma yok).
+    """
+    if time.time() - (last_synced(tab) or 0.0) < interval:
+        return None
+    return sync(tab)
+
+
+def _sync_call(tab: str, **kwargs: Any) -> Tuple[bool, Dict[str, Any], str]:
+    try:
+        return True, sync(tab, **kwargs), "ok"
+    except Exception as e:
+        return False, {"tab": tab}, f"{type(e).__name__}: {e}"
+
+
+def sync_all(
+    tabs: Sequence[str] = TABS, timeout: Optional[float] = None, **kwargs: Any
+) -> Dict[str, Tuple[bool, Any, str]]:
+    """
+    Tabları paralel senkronlar (storage.gsheets_read_parallel). Bir tabın hatası / zaman aşımı
+    diğerini etkilemez. Dönen: {tab: (ok, sync sonucu, mesaj)}
+    """
+    from app.storage import READ_TIMEOUT, gsheets_read_parallel
+
+    calls = {t: (lambda t=t: _sync_call(t, **kwargs)) for t in tabs}
+    return gsheets_read_parallel(calls, timeout=READ_TIMEOUT if timeout is None else timeout)
+
+
+def maybe_sync_all(interval: float = SYNC_INTERVAL, timeout: Optional[float] = None) -> Dict[str, Tuple[bool, Any, str]]:
+    """
+    Sadece son senkronu interval'dan eski tablar; hepsi tazeyse okuma yok ({}).
+    """
+    now = time.time()
+    due = [t for t in TABS if now - (last_synced(t) or 0.0) >= interval]
+    return sync_all(due, timeout=timeout) if due else {}
+
+
+def iter_results() -> Iterator[Dict[str, Any]]:
+    """
+    Snapshot satırları rollups.reconcile'ın beklediği biçimde.
+    """
+    cols = ", ".join(ARSHETIP_KEYS)
+    cur = _db().execute(
+        f"SELECT ts_utc, profile_id, name, zodiac, dominant, lang, {cols} FROM snap_results ORDER BY row"
+    )
+    for ts, pid, name, zodiac, dominant, lang, *vec in cur:
+        totals = {k: int(v) for k, v in zip(ARSHETIP_KEYS, vec) if v}
+        yield {
+            "ts_utc": ts,
+            "profile_id": pid,
+            "_result": {"name": name, "zodiac": zodiac, "dominant": dominant, "totals": totals, "lang": lang},
+        }
+
+
+def iter_events() -> Iterator[Dict[str, Any]]:
+    for ts, sid, pid, name in _db().execute("SELECT ts_utc, session_id, profile_id, event_name FROM snap_events ORDER BY row"):
+        yield {"ts_utc": ts, "session_id": sid, "profile_id": pid, "event_name": name}
+
+
+def rebuild_rollups(tab: Optional[str] = None) -> Dict[str, int]:
+    """
+    Rollup'ları Sheets'e gitmeden snapshot'tan yeniden kurar.
+    """
+    return rollups.reconcile(
+        results=iter_results() if tab in (None, "results") else None,
+        events=iter_events() if tab in (None, "events") else None,
+    )
+
+
+def count(tab: str) -> int:
+    return int(_db().execute(f"SELECT COUNT(*) FROM snap_{tab}").fetchone()[0])
+
+
+def latest_results(
+    limit: int = 20, offset: int = 0, start_day: Optional[str] = None, end_day: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    En yeni sonuçlar (yeniden eskiye), gün aralığı opsiyonel. row üzerinde index'li okuma.
+    """
+    where, args = rollups.range_sql(start_day, end_day)
+    cur = _db().execute(
+        f"SELECT row, ts_utc, lang, name, dominant, secondary, zodiac, profile_id FROM snap_results{where} "
+        "ORDER BY row DESC LIMIT ? OFFSET ?",
+        [*args, int(limit), int(offset)],
+    )
+    keys = ("row", "ts_utc", "lang", "name", "dominant", "secondary", "zodiac", "profile_id")
+    out: List[Dict[str, Any]] = []
+    for r in cur:
+        d = dict(zip(keys, r))
+        # Global satır -> (tab, Sheets satırı)
+        ordinal, d["row"] = partitions.split_row(int(d["row"]))
+        out.append({"tab": partitions.tab_for("results", ordinal), **d})
+    return out
+
+
+def count_results(start_day: Optional[str] = None, end_day: Optional[str] = None) -> int:
+    where, args = rollups.range_sql(start_day, end_day)
+    return int(_db().execute(f"SELECT COUNT(*) FROM snap_results{where}", args).fetchone()[0])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Sheets -> yerel snapshot (Admin paneli).")
+    ap.add_argument("command", choices=["sync", "rebuild", "reset", "status"])
+    ap.add_argument("--max-pages", type=int, default=MAX_PAGES_PER_SYNC)
+    ap.add_argument("--tabs", nargs="+", default=list(TABS), choices=TABS)
+    args = ap.parse_args()
+    if args.command == "sync":
+        print(json.dumps(sync_all(max_pages=args.max_pages), ensure_ascii=False))
+    elif args.command == "rebuild":
+        print(json.dumps(rebuild_rollups(), ensure_ascii=False))
+    elif args.command == "reset":
+        # Yerinde güncellenen satırlar (app.backfill) için: sonraki sync baştan okur.
+        for t in args.tabs:
+            reset(t)
+        print(json.dumps({"reset": args.tabs}, ensure_ascii=False))
+    else:
+        print(json.dumps({t: {"rows": count(t), "synced_at": last_synced(t)} for t in TABS}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import json
+import re
+import threading
 import time
 import traceback
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import gspread
 import streamlit as st
+from gspread.utils import rowcol_to_a1
+
+from app import compaction, idempotency, match_index, partitions, shared_cache
+from app.codec import ALL_FIELDS, MATCH_FIELDS, decode_result, totals_from_vector
+from app.dengeleyici import ARSHETIP_KEYS
+from app.sheets_async import AsyncSheetsClient, SheetsApiError, a1_range
+from app.utils import RateLimiter
 
 
 def utc_now_iso() -> str:
@@ -67,20 +79,56 @@ def _get_spreadsheet(sheet_id: str):
     return client.open_by_key(sheet_id)
 
 
+@st.cache_resource(show_spinner=False)
+def _get_shared_worksheet(sheet_id: str, tab_name: str):
+    # Script dışı (CLI / background job) kullanım için process seviyesinde cache.
+    return _get_spreadsheet(sheet_id).worksheet(tab_name)
+
+
 def _get_worksheet(sheet_id: str, tab_name: str):
-    # Worksheet objesini session_state içinde cache'liyoruz
-    # çünkü gereksiz "metadata read" (quota) patlatıyor.
-    cache_key = f"_ws_cache::{sheet_id}"
-    if cache_key not in st.session_state:
-        st.session_state[cache_key] = {}
+    # Worksheet objesi process seviyesinde paylaşılır (gereksiz "metadata read" quota'yı patlatıyor);
+    # oturum başına kopya session_state'te tutulmaz.
+    return _get_shared_worksheet(sheet_id, tab_name)
+
+
+def _async_enabled() -> bool:
+    # Varsayılan: gspread. secrets [sheets] async_client = true -> paylaşılan async istemci (app.sheets_async).
+    try:
+        if "sheets" in st.secrets and "async_client" in st.secrets["sheets"]:
+            return bool(st.secrets["sheets"]["async_client"])
+    except Exception:
+        pass
+    return False
+
+
+@st.cache_resource(show_spinner=False)
+def _get_async_client(sheet_id: str) -> AsyncSheetsClient:
+    # Process başına tek event loop ve bağlantı havuzu; tüm oturumlar paylaşır.
+    return AsyncSheetsClient(sheet_id, _service_account_info())
+
 
-    if tab_name in st.session_state[cache_key]:
-        return st.session_state[cache_key][tab_name]
+def _values_get(sheet_id: str, tab_name: str, rng: str, ws=None) -> List[List[str]]:
+    if _async_enabled():
+        c = _get_async_client(sheet_id)
+        return c.run(c.get_range(tab_name, rng))
+    return (ws or _get_shared_worksheet(sheet_id, tab_name)).get_values(rng)
 
-    spreadsheet = _get_spreadsheet(sheet_id)
-    ws = spreadsheet.worksheet(tab_name)
-    st.session_state[cache_key][tab_name] = ws
-    return ws
+
+def _values_batch_get(sheet_id: str, ranges: Sequence[Tuple[str, str]]) -> List[List[List[str]]]:
+    if _async_enabled():
+        c = _get_async_client(sheet_id)
+        return c.run(c.batch_get(ranges))
+    resp = _get_spreadsheet(sheet_id).values_batch_get([a1_range(tab, rng) for tab, rng in ranges])
+    out = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+    return out + [[] for _ in range(len(ranges) - len(out))]
+
+
+def _values_append(sheet_id: str, tab_name: str, values: List[Any], ws=None) -> Any:
+    # Dönen: append yanıtı ({"updates": {"updatedRange": ...}}); iki yolda da aynı biçim.
+    if _async_enabled():
+        c = _get_async_client(sheet_id)
+        return c.run(c.append(tab_name, values))
+    return (ws or _get_shared_worksheet(sheet_id, tab_name)).append_row(values, value_input_option="USER_ENTERED")
 
 
 def _safe_json(x: Any) -> str:
@@ -90,27 +138,46 @@ def _safe_json(x: Any) -> str:
         return json.dumps(str(x), ensure_ascii=False)
 
 
-def gsheets_append(tab_name: str, row: Dict[str, Any]) -> Tuple[bool, str]:
+APPEND_DUPLICATE = "Sheets write skipped (duplicate)"
+
+
+def gsheets_append(tab_name: str, row: Dict[str, Any], idempotency_key: str = "") -> Tuple[bool, str]:
     """
     Google Sheets'e tek satır append eder.
-    - Header 1. satırdan okunur ve session_state içinde cache'lenir.
+    - Header 1. satırdan okunur ve process seviyesinde cache'lenir (_tab_header).
     - 429 quota için basit retry/backoff uygulanır.
+    - idempotency_key verilirse aynı anahtarla ikinci yazma no-op olur: (True, APPEND_DUPLICATE...).
+      Tabda idempotency_key kolonu varsa anahtar oraya da yazılır.
     """
+    if not idempotency_key:
+        return _append_row(tab_name, row)
     try:
-        sheet_id = _secrets_sheet_id()
-        ws = _get_worksheet(sheet_id, tab_name)
+        state = idempotency.claim(idempotency_key, tab_name)
+    except Exception:
+        state = "new"  # yerel db kullanılamıyorsa yazmayı engelleme
+    if state != "new":
+        return True, f"{APPEND_DUPLICATE}: {tab_name} ({state})"
+    ok, msg = _append_row(tab_name, {**row, "idempotency_key": idempotency_key})
+    try:
+        if ok:
+            idempotency.complete(idempotency_key)
+        else:
+            idempotency.release(idempotency_key)
+    except Exception:
+        pass
+    return ok, msg
 
-        header_cache_key = f"_header::{sheet_id}::{tab_name}"
-        header: List[str]
 
-        if header_cache_key in st.session_state:
-            header = st.session_state[header_cache_key]
-        else:
-            header = ws.row_values(1)
-            st.session_state[header_cache_key] = header
+def _append_row(tab_name: str, row: Dict[str, Any]) -> Tuple[bool, str]:
+    try:
+        sheet_id = _secrets_sheet_id()
+        target = _write_tab(sheet_id, tab_name)  # results -> results_2026_10 (bkz. app.partitions)
+        ws = _get_worksheet(sheet_id, target)
+
+        header = _tab_header(sheet_id, target, ws)
 
         if not header:
-            return False, f"{tab_name} header boş. İlk satır kolon isimleri olmalı."
+            return False, f"{target} header boş. İlk satır kolon isimleri olmalı."
 
         values: List[Any] = []
         for col in header:
@@ -121,13 +188,17 @@ def gsheets_append(tab_name: str, row: Dict[str, Any]) -> Tuple[bool, str]:
 
         for attempt in range(4):
             try:
-                ws.append_row(values, value_input_option="USER_ENTERED")
+                resp = _values_append(sheet_id, target, values, ws)
+                if tab_name == "results" and row.get("profile_id"):
+                    _note_result_row(sheet_id, str(row["profile_id"]), target, _appended_row_number(resp))
                 # results okuma cache'ini kır (yeni veri geldi)
-                st.cache_data.clear()
+                if tab_name == "results":
+                    invalidate_recent_results()
                 return True, f"Sheets write ok: {tab_name}"
             except Exception as e:
                 msg = str(e)
-                if "429" in msg or "Quota" in msg:
+                # Async istemci kendi içinde zaten retry yapıyor.
+                if ("429" in msg or "Quota" in msg) and not isinstance(e, SheetsApiError):
                     time.sleep(1.2 * (attempt + 1))
                     continue
                 raise
@@ -139,48 +210,737 @@ def gsheets_append(tab_name: str, row: Dict[str, Any]) -> Tuple[bool, str]:
         return False, f"{type(e).__name__}: {e} | trace: {tr}"
 
 
-@st.cache_data(ttl=30, show_spinner=False)
-def gsheets_fetch_recent_results(limit: int = 50, max_rows_scan: int = 1500) -> Tuple[bool, List[Dict[str, Any]], str]:
+# ---------------------------------------------------------------------------
+# Aylık bölümler: results_2026_10, events_2026_10 ... (bkz. app.partitions)
+# ---------------------------------------------------------------------------
+
+PARTITION_ROWS = 1000  # yeni bölüm tabının başlangıç satır sayısı (append büyütür)
+_partition_lock = threading.Lock()
+
+
+def _partitioning() -> bool:
+    # Varsayılan: aylık. secrets [sheets] partition = "none" -> tek tab (eski davranış).
+    try:
+        if "sheets" in st.secrets and "partition" in st.secrets["sheets"]:
+            return str(st.secrets["sheets"]["partition"]).lower() not in ("none", "off", "false")
+    except Exception:
+        pass
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def _titles_cache() -> Dict[str, Tuple[float, List[str]]]:
+    return {}
+
+
+def _tab_titles(sheet_id: str, refresh: bool = False) -> List[str]:
+    """
+    Spreadsheet'teki tab adları; HEADER_TTL süre cache'lenir (tek metadata okuması).
+    """
+    cache = _titles_cache()
+    hit = cache.get(sheet_id)
+    if hit and not refresh and time.time() - hit[0] < HEADER_TTL:
+        return hit[1]
+    titles = [ws.title for ws in _get_spreadsheet(sheet_id).worksheets()]
+    cache[sheet_id] = (time.time(), titles)
+    return titles
+
+
+def _tab_partitions(sheet_id: str, base: str) -> List[str]:
+    if base not in partitions.PARTITIONED_TABS:
+        return [base]
+    return partitions.ordered(base, _tab_titles(sheet_id)) or [base]
+
+
+def gsheets_tab_partitions(base: str) -> Tuple[bool, List[str], str]:
+    """
+    base'e ait tablar eskiden yeniye (eski bölümlenmemiş tab varsa en başta).
+    """
+    try:
+        return True, _tab_partitions(_secrets_sheet_id(), base), "ok"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
+
+
+def _create_partition(sheet_id: str, base: str, name: str) -> None:
+    # Tab + header tek batchUpdate isteğinde: header'sız tab'a append yapılamaz.
+    existing = partitions.ordered(base, _tab_titles(sheet_id))
+    if not existing:
+        raise ValueError(f"{base} için header kaynağı yok (en az bir {base} tabı olmalı).")
+    header = _tab_header(sheet_id, existing[-1])
+    if not header:
+        raise ValueError(f"{existing[-1]} header boş.")
+    gid = zlib.crc32(name.encode("utf-8")) & 0x7FFFFFFF
+    body = {
+        "requests": [
+            {
+                "addSheet": {
+                    "properties": {
+                        "sheetId": gid,
+                        "title": name,
+                        "gridProperties": {
+                            "rowCount": PARTITION_ROWS,
+                            "columnCount": max(26, len(header)),
+                            "frozenRowCount": 1,
+                        },
+                    }
+                }
+            },
+            {
+                "updateCells": {
+                    "start": {"sheetId": gid, "rowIndex": 0, "columnIndex": 0},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": str(h)}} for h in header]}],
+                    "fields": "userEnteredValue",
+                }
+            },
+        ]
+    }
+    try:
+        _get_spreadsheet(sheet_id).batch_update(body)
+    except gspread.exceptions.APIError as e:
+        # Başka bir process / makine aynı anda oluşturdu.
+        if "already exists" not in str(e):
+            raise
+    _header_cache()[f"{sheet_id}::{name}"] = (time.time(), list(header))
+
+
+def _write_tab(sheet_id: str, base: str) -> str:
+    """
+    Yazmanın gideceği tab: bölümlenmiş tablar için bu ayın tabı (yoksa oluşturulur).
+    """
+    if base not in partitions.PARTITIONED_TABS or not _partitioning():
+        return base
+    name = partitions.partition_name(base)
+    if name in _tab_titles(sheet_id):
+        return name
+    with _partition_lock:
+        if name not in _tab_titles(sheet_id, refresh=True):
+            _create_partition(sheet_id, base, name)
+            _tab_titles(sheet_id, refresh=True)
+    return name
+
+
+def gsheets_drop_tab(tab_name: str) -> Tuple[bool, str]:
+    """
+    Arşivlenmiş bir bölümü spreadsheet'ten siler (app.compaction --drop). Ana tablar silinmez.
+    """
+    if tab_name in partitions.PARTITIONED_TABS or tab_name == BANKS_TAB:
+        return False, f"{tab_name} silinemez."
+    try:
+        sheet_id = _secrets_sheet_id()
+        sh = _get_spreadsheet(sheet_id)
+        sh.del_worksheet(sh.worksheet(tab_name))
+        _tab_titles(sheet_id, refresh=True)
+        _get_shared_worksheet.clear()
+        return True, f"dropped: {tab_name}"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, f"{type(e).__name__}: {e} | trace: {tr}"
+
+
+RECENT_RESULTS_TTL = 30.0
+# Bu yaşa kadar bayat veri hemen döner (yenileme arka planda); sonrası beklenir.
+RECENT_RESULTS_MAX_STALE = 600.0
+_RECENT_KEY_PREFIX = "recent_results:"
+
+
+def _cache_setting(name: str, default: float) -> float:
+    # Opsiyonel: secrets içinde [cache] recent_ttl / recent_max_stale
+    try:
+        if "cache" in st.secrets and name in st.secrets["cache"]:
+            return float(st.secrets["cache"][name])
+    except Exception:
+        pass
+    return default
+
+
+HEADER_TTL = 600.0
+
+# Eşleştirme için okunan kolonlar: kimlik + görünen alanlar + trait toplamları
+PROJECTED_COLUMNS = ("profile_id", "name", "zodiac", "dominant") + tuple(ARSHETIP_KEYS)
+
+
+@st.cache_resource(show_spinner=False)
+def _header_cache() -> Dict[str, Tuple[float, List[str]]]:
+    return {}
+
+
+def _tab_header(sheet_id: str, tab_name: str, ws=None) -> List[str]:
+    """
+    Header satırı process seviyesinde HEADER_TTL süre cache'lenir (her okumada row_values(1) yok).
+    """
+    cache = _header_cache()
+    key = f"{sheet_id}::{tab_name}"
+    hit = cache.get(key)
+    if hit and time.time() - hit[0] < HEADER_TTL:
+        return hit[1]
+    ws = ws or _get_shared_worksheet(sheet_id, tab_name)
+    header = ws.row_values(1)
+    cache[key] = (time.time(), header)
+    return header
+
+
+def _to_int(x: Any) -> Optional[int]:
+    if x is None or x == "":
+        return None
+    try:
+        return int(float(str(x).replace(",", ".")))
+    except Exception:
+        return None
+
+
+def _col_letter(col: int) -> str:
+    return rowcol_to_a1(1, col).rstrip("0123456789")
+
+
+def _fetch_recent_results_projected(
+    sheet_id: str, tab: str, header: List[str], limit: int, max_rows_scan: int
+) -> List[Dict[str, Any]]:
+    # Sadece gereken kolonlar, tek batch_get ile; result_json parse edilmez.
+    cols = [header.index(c) + 1 for c in PROJECTED_COLUMNS]
+    ranges = [(tab, f"{_col_letter(c)}2:{_col_letter(c)}{max_rows_scan}") for c in cols]
+    columns = _values_batch_get(sheet_id, ranges)
+    pid_col = columns[0]
+    n = len(pid_col)
+    if n == 0:
+        return []
+    start = max(0, n - limit)
+
+    def cell(ci: int, ri: int) -> str:
+        col = columns[ci]
+        return col[ri][0] if ri < len(col) and col[ri] else ""
+
+    out: List[Dict[str, Any]] = []
+    missing: List[int] = []
+    for ri in range(start, n):
+        d: Dict[str, Any] = {name: cell(ci, ri) for ci, name in enumerate(PROJECTED_COLUMNS)}
+        vec = [_to_int(d[k]) for k in ARSHETIP_KEYS]
+        if any(v is None for v in vec):
+            missing.append(len(out))
+            d["_row"] = ri + 2
+        d["_result"] = {
+            "name": d["name"],
+            "zodiac": d["zodiac"],
+            "dominant": d["dominant"],
+            "totals": totals_from_vector([v or 0 for v in vec]),
+        }
+        out.append(d)
+
+    if missing and "result_json" in header:
+        # Trait kolonları boş eski satırlar: sadece o aralığın result_json'u okunur.
+        # (python -m app.backfill bu kolonları kalıcı olarak doldurur.)
+        letter = _col_letter(header.index("result_json") + 1)
+        first, last = out[missing[0]]["_row"], out[missing[-1]]["_row"]
+        rj_values = _values_get(sheet_id, tab, f"{letter}{first}:{letter}{last}")
+        for i in missing:
+            d = out[i]
+            off = d.pop("_row") - first
+            rj = rj_values[off][0] if off < len(rj_values) and rj_values[off] else ""
+            if rj:
+                d["_result"] = {**d["_result"], **decode_result(rj, MATCH_FIELDS)}
+    return out
+
+
+def _fetch_recent_results_rows(limit: int, max_rows_scan: int, fields: Sequence[str]) -> List[Dict[str, Any]]:
+    # Sheets'ten gerçek okuma. Hata durumunda exception fırlatır (cache'e hata yazılmaz).
+    # En yeni bölümden geriye doğru; limit dolunca eski bölümler okunmaz.
+    sheet_id = _secrets_sheet_id()
+    out: List[Dict[str, Any]] = []
+    for tab in reversed(_tab_partitions(sheet_id, "results")):
+        need = limit - len(out)
+        if need <= 0:
+            break
+        out = _fetch_recent_tab(sheet_id, tab, need, max_rows_scan, fields) + out
+    return out
+
+
+def _fetch_recent_tab(
+    sheet_id: str, tab: str, limit: int, max_rows_scan: int, fields: Sequence[str]
+) -> List[Dict[str, Any]]:
+    header = _tab_header(sheet_id, tab)
+    if not header:
+        raise ValueError(f"{tab} header boş.")
+
+    if set(fields) <= set(MATCH_FIELDS) and all(c in header for c in PROJECTED_COLUMNS):
+        return _fetch_recent_results_projected(sheet_id, tab, header, limit, max_rows_scan)
+
+    # Eski şema (trait kolonları yok): tüm satır + result_json
+    values = _values_get(sheet_id, tab, f"A1:Z{max_rows_scan}")
+    if not values or len(values) < 2:
+        return []
+
+    rows = values[1:]
+    rows = rows[-limit:]
+
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        d: Dict[str, Any] = {}
+        for i, col in enumerate(header):
+            d[col] = r[i] if i < len(r) else ""
+
+        rj = d.get("result_json", "")
+        if rj:
+            d["_result"] = decode_result(rj, fields)
+        else:
+            d["_result"] = {k: d[k] for k in fields if k in d}
+
+        out.append(d)
+    return out
+
+
+def _refresh_recent_results(limit: int, max_rows_scan: int, fields: Sequence[str]) -> List[Dict[str, Any]]:
+    rows = _fetch_recent_results_rows(limit, max_rows_scan, fields)
+    if set(MATCH_FIELDS) <= set(fields):
+        try:
+            match_index.maybe_write(rows)  # sonraki soğuk başlangıç için
+        except Exception:
+            pass
+    return rows
+
+
+def _snapshot_recent_results(limit: int) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+    # Soğuk process: Sheets yanıtı beklenirken mmap snapshot'tan adaylar (bkz. app.match_index).
+    snap = match_index.load()
+    if snap is None or len(snap) == 0:
+        return None
+    return snap.rows(limit), snap.created_at
+
+
+def invalidate_recent_results() -> None:
+    """
+    Yeni sonuç yazıldı: paylaşılan cache'i bayat işaretle (tüm process'ler görür).
+    """
+    try:
+        shared_cache.invalidate(_RECENT_KEY_PREFIX)
+    except Exception:
+        pass
+
+
+def gsheets_fetch_recent_results(
+    limit: int = 50,
+    max_rows_scan: int = 1500,
+    fields: Sequence[str] = MATCH_FIELDS,
+) -> Tuple[bool, List[Dict[str, Any]], str]:
     """
     results tabından son kayıtları getirir.
     Quota'yı korumak için:
-      - 30 sn cache
+      - 30 sn cache, aynı makinedeki tüm process'ler arasında paylaşılır (app.shared_cache);
+        yenilemeyi tek bir process / tek bir thread yapar
+      - süresi geçen veri hard-expiry'ye kadar hemen döner, yenileme arka planda
       - max_rows_scan ile okuma aralığı sınırlı
+      - paylaşılan cache'te hiç kayıt yoksa (soğuk başlangıç) diskteki match snapshot'ı, hard-expiry'den
+        yeni ise, hemen döner; Sheets arka planda okunur
+    result_json sadece `fields` alanları için çözülür (bkz. app.codec).
+    """
+    fields = tuple(fields)
+    key = f"{_RECENT_KEY_PREFIX}{limit}:{max_rows_scan}:{','.join(fields)}"
+    warm = (lambda: _snapshot_recent_results(limit)) if set(fields) <= set(MATCH_FIELDS) else None
+    try:
+        rows, _ = shared_cache.get_or_refresh(
+            key,
+            _cache_setting("recent_ttl", RECENT_RESULTS_TTL),
+            lambda: _refresh_recent_results(limit, max_rows_scan, fields),
+            max_stale=_cache_setting("recent_max_stale", RECENT_RESULTS_MAX_STALE),
+            fallback=warm,
+        )
+        if not rows:
+            return True, [], "no data"
+        return True, rows, "ok"
+
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
+
+
+# ---------------------------------------------------------------------------
+# Paylaşım linki (?id=...) için profile_id -> satır index'i
+# ---------------------------------------------------------------------------
+
+_RESULT_CACHE_MAX = 512
+
+
+class _ResultIndex:
+    """
+    Process başına tutulan profile_id -> (results bölümü, satır numarası) haritası.
+    - Yeni yazılan satırlar append cevabından eklenir.
+    - Bilinmeyen id için bölümlerin (yeniden eskiye) sadece taranmamış profile_id kısmı okunur;
+      kapanmış bölümler bir kez taranır. Sheets'ten silinmiş bölümler için arşive bakılır.
+    - Çözülmüş sonuçlar küçük bir LRU'da tutulur.
     """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.rows: Dict[str, Tuple[str, int]] = {}
+        self.scanned_upto: Dict[str, int] = {}  # tab -> son taranan satır (header = 1)
+        self.headers: Dict[str, List[str]] = {}
+        self.results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def remember(self, profile_id: str, result: Dict[str, Any]) -> None:
+        self.results[profile_id] = result
+        self.results.move_to_end(profile_id)
+        while len(self.results) > _RESULT_CACHE_MAX:
+            self.results.popitem(last=False)
+
+
+@st.cache_resource(show_spinner=False)
+def _result_index(sheet_id: str) -> _ResultIndex:
+    return _ResultIndex()
+
+
+_UPDATED_ROW_RE = re.compile(r"![A-Z]+(\d+)")
+
+
+def _appended_row_number(resp: Any) -> Optional[int]:
+    # append cevabı: {"updates": {"updatedRange": "results!A12:K12", ...}}
+    try:
+        rng = resp["updates"]["updatedRange"]
+    except Exception:
+        return None
+    m = _UPDATED_ROW_RE.search(str(rng))
+    return int(m.group(1)) if m else None
+
+
+def _note_result_row(sheet_id: str, profile_id: str, tab: str, row_number: Optional[int]) -> None:
+    if not row_number:
+        return
+    idx = _result_index(sheet_id)
+    with idx.lock:
+        # Aynı profil tekrar yazarsa en yeni satır geçerli
+        idx.rows[profile_id] = (tab, row_number)
+        idx.results.pop(profile_id, None)
+
+
+def _index_header(idx: _ResultIndex, sheet_id: str, tab: str) -> List[str]:
+    # Kilit sadece bellekteki index için; Sheets okumaları kilit dışında (paylaşım linkleri birbirini beklemesin).
+    with idx.lock:
+        header = idx.headers.get(tab)
+    if header is None:
+        header = _tab_header(sheet_id, tab)
+        with idx.lock:
+            idx.headers[tab] = header
+    return header
+
+
+def _scan_new_profile_ids(idx: _ResultIndex, sheet_id: str, tab: str, header: List[str]) -> None:
+    # Sadece profile_id kolonunun, daha önce taranmamış satırlarını oku.
+    col = header.index("profile_id") + 1
+    with idx.lock:
+        start = idx.scanned_upto.get(tab, 1) + 1
+    a1 = rowcol_to_a1(start, col)
+    letter = a1.rstrip("0123456789")
+    values = _values_get(sheet_id, tab, f"{a1}:{letter}")
+    with idx.lock:
+        for offset, r in enumerate(values):
+            pid = r[0] if r else ""
+            if pid:
+                idx.rows[pid] = (tab, start + offset)
+        if values:
+            idx.scanned_upto[tab] = max(idx.scanned_upto.get(tab, 1), start + len(values) - 1)
+
+
+def _find_result_row(idx: _ResultIndex, sheet_id: str, profile_id: str) -> Optional[Tuple[str, int]]:
+    with idx.lock:
+        hit = idx.rows.get(profile_id)
+    if hit is not None:
+        return hit
+    for tab in reversed(_tab_partitions(sheet_id, "results")):
+        header = _index_header(idx, sheet_id, tab)
+        if "profile_id" not in header:
+            continue
+        _scan_new_profile_ids(idx, sheet_id, tab, header)
+        with idx.lock:
+            hit = idx.rows.get(profile_id)
+        if hit is not None:
+            return hit
+    return None
+
+
+def gsheets_lookup_result(profile_id: str) -> Tuple[bool, Optional[Dict[str, Any]], str]:
+    """
+    Paylaşım linkindeki id ile tek bir sonucu getirir.
+    Index'te varsa tek satır okunur; yoksa profile_id kolonunun sadece
+    yeni kısmı taranır. Bulunamazsa (True, None, "not found").
+    """
+    if not profile_id:
+        return True, None, "not found"
     try:
         sheet_id = _secrets_sheet_id()
-        ws = _get_worksheet(sheet_id, "results")
+        idx = _result_index(sheet_id)
+        with idx.lock:
+            if profile_id in idx.results:
+                idx.results.move_to_end(profile_id)
+                return True, idx.results[profile_id], "cache"
+
+        d: Dict[str, Any] = {}
+        for _ in range(2):
+            hit = _find_result_row(idx, sheet_id, profile_id)
+            if hit is None:
+                # Sheets'ten silinmiş (arşivlenmiş) bölümler
+                d = compaction.lookup_archived("results", profile_id) or {}
+                if not d:
+                    return True, None, "not found"
+                break
+
+            tab, row_number = hit
+            header = _index_header(idx, sheet_id, tab)
+            last = rowcol_to_a1(row_number, len(header))
+            values = _values_get(sheet_id, tab, f"A{row_number}:{last}")
+            r = values[0] if values else []
+            d = {col: (r[i] if i < len(r) else "") for i, col in enumerate(header)}
+            if d.get("profile_id") == profile_id:
+                break
+            # Satırlar kaymış (silme/sıralama) ya da bölüm silinmiş: index'i sıfırla, bir kez yeniden tara.
+            with idx.lock:
+                idx.rows.clear()
+                idx.scanned_upto.clear()
+                idx.headers.clear()
+        else:
+            return True, None, "not found"
+
+        result = decode_result(d.get("result_json", ""), ALL_FIELDS) if d.get("result_json") else {}
+        for k in ("name", "zodiac", "dominant"):
+            result.setdefault(k, d.get(k, ""))
+        result["profile_id"] = profile_id
+        result["ts_utc"] = d.get("ts_utc", "")
+        with idx.lock:
+            idx.remember(profile_id, result)
+        return True, result, "ok"
+
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, None, f"{type(e).__name__}: {e} | trace: {tr}"
+
+
+# ---------------------------------------------------------------------------
+# Toplu işler (backfill, export) için sayfalı okuma / toplu güncelleme
+# ---------------------------------------------------------------------------
+
+
+BANKS_TAB = "banks"  # kolonlar: bank_hash, lang, ts_utc, bank_json
+
+
+@st.cache_resource(show_spinner=False)
+def _known_banks() -> Dict[str, bool]:
+    return {}
+
+
+def gsheets_store_bank(bank: str, lang: str, payload: Any) -> Tuple[bool, str]:
+    """
+    Soru bankası metin tablosunu banks tabına hash başına bir kez yazar.
+    Process içinde tekrar kontrol edilmez; tab yoksa (False, mesaj) döner, akış bozulmaz.
+    """
+    known = _known_banks()
+    if known.get(bank):
+        return True, "bank already stored"
+    try:
+        ws = _get_shared_worksheet(_secrets_sheet_id(), BANKS_TAB)
+        if bank in ws.col_values(1)[1:]:
+            known[bank] = True
+            return True, "bank already stored"
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    ok, msg = gsheets_append(
+        BANKS_TAB,
+        {"bank_hash": bank, "lang": lang, "ts_utc": utc_now_iso(), "bank_json": _safe_json(payload)},
+    )
+    if ok:
+        known[bank] = True
+    return ok, msg
+
+
+def gsheets_load_bank(bank: str) -> Tuple[bool, Optional[Any], str]:
+    """
+    banks tabından hash'e ait ham banka JSON'unu okur. Bulunamazsa (True, None, msg).
+    """
+    try:
+        ws = _get_shared_worksheet(_secrets_sheet_id(), BANKS_TAB)
+        hashes = ws.col_values(1)
+        if bank not in hashes:
+            return True, None, "bank not found"
+        header = _tab_header(_secrets_sheet_id(), BANKS_TAB, ws)
+        if "bank_json" not in header:
+            return False, None, "banks tabında bank_json kolonu yok."
+        cell = ws.cell(hashes.index(bank) + 1, header.index("bank_json") + 1).value
+        return True, json.loads(cell or "null"), "ok"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, None, f"{type(e).__name__}: {e} | trace: {tr}"
+
 
+def gsheets_read_header(tab_name: str) -> Tuple[bool, List[str], str]:
+    try:
+        ws = _get_shared_worksheet(_secrets_sheet_id(), tab_name)
         header = ws.row_values(1)
         if not header:
-            return False, [], "results header boş."
+            return False, [], f"{tab_name} header boş."
+        return True, header, "ok"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
 
-        values = ws.get_values(f"A1:Z{max_rows_scan}")
-        if not values or len(values) < 2:
-            return True, [], "no data"
 
-        rows = values[1:]
-        rows = rows[-limit:]
+def gsheets_read_rows(tab_name: str, start_row: int, n_rows: int, n_cols: int) -> Tuple[bool, List[List[str]], str]:
+    """
+    start_row'dan itibaren en fazla n_rows satır okur (1 tabanlı, header = 1).
+    Boş liste: tabın sonuna gelindi.
+    """
+    try:
+        end = rowcol_to_a1(start_row + n_rows - 1, max(1, n_cols))
+        values = _values_get(_secrets_sheet_id(), tab_name, f"A{start_row}:{end}")
+        return True, values, "ok"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
 
-        out: List[Dict[str, Any]] = []
-        for r in rows:
-            d: Dict[str, Any] = {}
-            for i, col in enumerate(header):
-                d[col] = r[i] if i < len(r) else ""
 
-            rj = d.get("result_json", "")
-            if rj:
-                try:
-                    d["_result"] = json.loads(rj)
-                except Exception:
-                    d["_result"] = {"raw": rj}
-            else:
-                d["_result"] = d
+def gsheets_batch_get(ranges: Sequence[Tuple[str, str]]) -> Tuple[bool, List[List[List[str]]], str]:
+    """
+    [(tab, aralık), ...] okumalarını tek values:batchGet isteğiyle yapar (farklı tablar karışabilir).
+    Aralık: "A2:H500" ya da tam satırlar "2:500". Dönen liste aralık sırasında; boş aralık -> [].
+    """
+    if not ranges:
+        return True, [], "ok"
+    try:
+        return True, _values_batch_get(_secrets_sheet_id(), ranges), "ok"
+    except Exception as e:
+        tr = traceback.format_exc()
+        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
 
-            out.append(d)
 
-        return True, out, "ok"
+READ_TIMEOUT = 20.0
+READ_WORKERS = 8
 
+
+@st.cache_resource(show_spinner=False)
+def _read_pool() -> ThreadPoolExecutor:
+    # Bağımsız okumalar için process seviyesinde tek havuz (rerun başına thread açılmaz).
+    return ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="iz-sheets-read")
+
+
+def gsheets_read_parallel(
+    calls: Dict[str, Callable[[], Tuple[Any, ...]]],
+    timeout: float = READ_TIMEOUT,
+) -> Dict[str, Tuple[Any, ...]]:
+    """
+    Birbirinden bağımsız okumaları ({ad: storage çağrısı}) paralel yapar; süre ≈ en yavaş okuma.
+    Süresi dolan ya da exception atan çağrı (False, None, mesaj) döner, diğerlerinin sonucu korunur.
+    Çağrılar (ok, ..., msg) döndürmeli (gsheets_* fonksiyonları gibi).
+    """
+    if not calls:
+        return {}
+    pool = _read_pool()
+    futures = {name: pool.submit(fn) for name, fn in calls.items()}
+    done, _ = wait(list(futures.values()), timeout=timeout)
+    out: Dict[str, Tuple[Any, ...]] = {}
+    for name, fut in futures.items():
+        if fut not in done:
+            fut.cancel()  # başlamışsa arka planda biter, sonucu kullanılmaz
+            out[name] = (False, None, f"timeout: {timeout:g}s içinde yanıt yok")
+            continue
+        try:
+            out[name] = fut.result()
+        except Exception as e:
+            out[name] = (False, None, f"{type(e).__name__}: {e}")
+    return out
+
+
+def gsheets_iter_rows(
+    tab_name: str,
+    page_size: int = 1000,
+    start_row: int = 2,
+    reads_per_minute: Optional[float] = None,
+    partitioned: bool = True,
+    window: Optional[Tuple[Optional[float], Optional[float]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Tabı sayfa sayfa okuyup satırları dict olarak verir (bellek: bir sayfa).
+    Her dict'e Sheets satır numarası "_row" olarak eklenir. Hata olursa RuntimeError.
+    reads_per_minute verilirse sayfa okumaları bu hızla sınırlanır (uzun export'lar quota'yı yemesin).
+
+    results / events verilirse tüm bölümler eskiden yeniye okunur: "_row" ve start_row global
+    satırdır (app.partitions.global_row; eski tab için Sheets satırıyla aynı), "_tab" fiziksel tab.
+    partitioned=False: sadece adı verilen fiziksel tab.
+    window=(start, end): ayı bu aralığın dışında kalan bölümler hiç okunmaz (partitions.in_window).
+    """
+    limiter = RateLimiter(reads_per_minute) if reads_per_minute else None
+    if not partitioned or tab_name not in partitions.PARTITIONED_TABS:
+        yield from _iter_tab_rows(tab_name, page_size, start_row, limiter)
+        return
+    ok, tabs, msg = gsheets_tab_partitions(tab_name)
+    if not ok:
+        raise RuntimeError(msg)
+    start_ord, start_in = partitions.split_row(start_row)
+    for tab in tabs:
+        o = int(partitions.ordinal(tab_name, tab) or 0)
+        if o < start_ord or (window is not None and not partitions.in_window(tab_name, tab, *window)):
+            continue
+        first = max(2, start_in) if o == start_ord else 2
+        for d in _iter_tab_rows(tab, page_size, first, limiter):
+            d["_row"] = partitions.global_row(tab_name, tab, d["_row"])
+            d["_tab"] = tab
+            yield d
+
+
+def _iter_tab_rows(
+    tab_name: str, page_size: int, start_row: int, limiter: Optional[RateLimiter]
+) -> Iterator[Dict[str, Any]]:
+    ok, header, msg = gsheets_read_header(tab_name)
+    if not ok:
+        raise RuntimeError(msg)
+    row = start_row
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        ok, values, msg = gsheets_read_rows(tab_name, row, page_size, len(header))
+        if not ok:
+            raise RuntimeError(msg)
+        for offset, r in enumerate(values):
+            d: Dict[str, Any] = {col: (r[i] if i < len(r) else "") for i, col in enumerate(header)}
+            d["_row"] = row + offset
+            yield d
+        if len(values) < page_size:
+            return
+        row += len(values)
+
+
+def gsheets_update_rows(
+    tab_name: str,
+    header: Sequence[str],
+    updates: Sequence[Tuple[int, Dict[str, Any]]],
+) -> Tuple[bool, str]:
+    """
+    [(satır_no, {kolon: değer}), ...] güncellemelerini tek batch_update ile yazar.
+    Header'da olmayan kolonlar atlanır.
+    """
+    if not updates:
+        return True, "nothing to update"
+    try:
+        ws = _get_shared_worksheet(_secrets_sheet_id(), tab_name)
+        col_index = {c: i + 1 for i, c in enumerate(header)}
+        data: List[Dict[str, Any]] = []
+        for row_number, cols in updates:
+            for col, v in cols.items():
+                if col not in col_index:
+                    continue
+                if isinstance(v, (dict, list)):
+                    v = _safe_json(v)
+                data.append({"range": rowcol_to_a1(row_number, col_index[col]), "values": [[v]]})
+
+        for attempt in range(4):
+            try:
+                ws.batch_update(data, value_input_option="USER_ENTERED")
+                # backfill fiziksel bölüm adlarıyla (results_2026_10) da günceller
+                if tab_name == "results" or partitions.partition_month("results", tab_name):
+                    invalidate_recent_results()
+                return True, f"Sheets update ok: {tab_name} ({len(updates)} satır)"
+            except Exception as e:
+                msg = str(e)
+                if "429" in msg or "Quota" in msg:
+                    time.sleep(1.2 * (attempt + 1))
+                    continue
+                raise
+        return False, "Sheets ERROR: 429 quota exceeded (update retry limit)."
     except Exception as e:
         tr = traceback.format_exc()
-        return False, [], f"{type(e).__name__}: {e} | trace: {tr}"
+        return False, f"{type(e).__name__}: {e} | trace: {tr}"
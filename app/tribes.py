@@ -0,0 +1,343 @@
+"""
+Test çözenlerin "kabile"leri: normalize trait vektörleri üzerinde artımlı k-means.
+
+- Model: k merkez (float32, k x K) + merkez başına adet; runtime/iz.sqlite3 içinde tek satır.
+- observe(): yeni sonuç en yakın merkeze atanır (O(k)) ve o merkez 1/n adımıyla kayar
+  (mini-batch k-means'in tek örnekli hali). Güncelleme BEGIN IMMEDIATE içinde; aynı makinedeki
+  process'ler aynı modeli görür. İlk k farklı sonuç merkezleri tohumlar.
+- refit(): tüm üyeler (+ verilirse Admin snapshot'ı) üzerinde k-means++ başlangıçlı mini-batch
+  k-means; üyeler yeni merkezlere yeniden atanır. CLI ya da Admin'den arka planda çalışır.
+
+    python -m app.tribes refit --k 6
+    python -m app.tribes status
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.codec import totals_vector
+from app.dengeleyici import ARSHETIP_KEYS
+from app.localdb import connect
+
+K_TRIBES = 6
+MIN_RATE = 0.002  # çok kalabalık merkez de yeni veriye yavaşça uyum sağlasın
+BATCH_SIZE = 256
+ITERATIONS = 100
+INSERT_BATCH = 500  # refit(rows) eklemeleri bu boyutta kısa transaction'larla yapılır
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tribe_model (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    k INTEGER NOT NULL,
+    dims INTEGER NOT NULL,
+    centroids BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tribe_members (
+    profile_id TEXT PRIMARY KEY,
+    tribe INTEGER NOT NULL,
+    name TEXT, zodiac TEXT, ts_utc TEXT,
+    vec BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tribe_members_tribe ON tribe_members(tribe, ts_utc);
+"""
+
+_ready = False
+
+
+def _db():
+    global _ready
+    conn = connect()
+    if not _ready:
+        conn.executescript(_SCHEMA)
+        _ready = True
+    return conn
+
+
+def normalise(totals: Any) -> Optional[np.ndarray]:
+    """
+    totals -> birim uzunlukta vektör (ARSHETIP_KEYS sırası). Sıfır vektör için None.
+    """
+    v = np.asarray(totals_vector(totals), dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else None
+
+
+def _raw(totals: Any) -> bytes:
+    return np.clip(np.asarray(totals_vector(totals)), -32768, 32767).astype("<i2").tobytes()
+
+
+def _from_raw(blob: bytes) -> Optional[np.ndarray]:
+    v = np.frombuffer(blob, dtype="<i2").astype(np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else None
+
+
+def _load(conn) -> Tuple[np.ndarray, np.ndarray, int]:
+    row = conn.execute("SELECT k, dims, centroids, counts, version FROM tribe_model WHERE id = 1").fetchone()
+    dims = len(ARSHETIP_KEYS)
+    if row is None or int(row[1]) != dims:
+        return np.zeros((0, dims), dtype=np.float32), np.zeros(0, dtype=np.int64), 0
+    k = int(row[0])
+    centroids = np.frombuffer(row[2], dtype="<f4").reshape(k, dims).copy()
+    counts = np.frombuffer(row[3], dtype="<i8").copy()
+    return centroids, counts, int(row[4])
+
+
+def _save(conn, centroids: np.ndarray, counts: np.ndarray, version: int) -> None:
+    conn.execute(
+        "INSERT INTO tribe_model VALUES (1, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+        "k = excluded.k, dims = excluded.dims, centroids = excluded.centroids, counts = excluded.counts, "
+        "version = excluded.version, updated_at = excluded.updated_at",
+        (
+            int(centroids.shape[0]), int(centroids.shape[1]),
+            centroids.astype("<f4").tobytes(), counts.astype("<i8").tobytes(), int(version), time.time(),
+        ),
+    )
+
+
+def _nearest(centroids: np.ndarray, x: np.ndarray) -> int:
+    return int(np.argmin(((centroids - x) ** 2).sum(axis=1)))
+
+
+def observe(profile_id: str, name: str, zodiac: str, totals: Any, ts_utc: str = "", k: int = K_TRIBES) -> Optional[int]:
+    """
+    Sonucu en yakın kabileye atar ve o merkezi günceller. Dönen: kabile no (trait'ler boşsa None).
+    Aynı profile_id ikinci kez gelirse model değişmez, mevcut kabile döner.
+    """
+    x = normalise(totals)
+    if x is None or not profile_id:
+        return None
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        known = conn.execute("SELECT tribe FROM tribe_members WHERE profile_id = ?", (profile_id,)).fetchone()
+        if known is not None:
+            conn.execute("COMMIT")
+            return int(known[0])
+        centroids, counts, version = _load(conn)
+        if version == 0 and len(centroids) < k and not any(np.allclose(c, x) for c in centroids):
+            # Tohumlama (henüz refit yapılmadıysa): ilk k farklı sonuç birer merkez
+            centroids = np.vstack([centroids, x[None, :]])
+            counts = np.append(counts, 1)
+            tribe = len(centroids) - 1
+        else:
+            tribe = _nearest(centroids, x)
+            counts[tribe] += 1
+            rate = max(1.0 / counts[tribe], MIN_RATE)
+            centroids[tribe] += rate * (x - centroids[tribe])
+        _save(conn, centroids, counts, version)
+        conn.execute(
+            "INSERT OR REPLACE INTO tribe_members VALUES (?, ?, ?, ?, ?, ?)",
+            (profile_id, tribe, name, zodiac, ts_utc, _raw(totals)),
+        )
+        conn.execute("COMMIT")
+        return tribe
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def record_result(rec: Dict[str, Any]) -> Optional[int]:
+    """
+    Yazılan sonucu kabileye atar (rec: storage'a yazılan satır + _result; rollups.record_result gibi).
+    """
+    payload = rec.get("_result") or {}
+    return observe(
+        str(rec.get("profile_id") or ""), str(payload.get("name") or ""), str(payload.get("zodiac") or ""),
+        payload.get("totals"), str(rec.get("ts_utc") or ""),
+    )
+
+
+def tribe_of(profile_id: str) -> Optional[int]:
+    row = _db().execute("SELECT tribe FROM tribe_members WHERE profile_id = ?", (profile_id,)).fetchone()
+    return int(row[0]) if row else None
+
+
+def mates(tribe: int, exclude: str = "", limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Kabilenin en yeni üyeleri (exclude hariç).
+    """
+    cur = _db().execute(
+        "SELECT profile_id, name, zodiac, ts_utc FROM tribe_members WHERE tribe = ? AND profile_id != ? "
+        "ORDER BY ts_utc DESC LIMIT ?",
+        (int(tribe), exclude, int(limit)),
+    )
+    return [dict(zip(("profile_id", "name", "zodiac", "ts_utc"), r)) for r in cur]
+
+
+def describe() -> List[Dict[str, Any]]:
+    """
+    Kabileler: {"tribe", "size", "traits": merkezde en yüksek iki trait, "centroid"}.
+    """
+    conn = _db()
+    centroids, _, _ = _load(conn)
+    sizes = dict(conn.execute("SELECT tribe, COUNT(*) FROM tribe_members GROUP BY tribe").fetchall())
+    out: List[Dict[str, Any]] = []
+    for i, c in enumerate(centroids):
+        order = np.argsort(-c)
+        out.append(
+            {
+                "tribe": i,
+                "size": int(sizes.get(i, 0)),
+                "traits": [ARSHETIP_KEYS[j] for j in order[:2]],
+                "centroid": {k: round(float(v), 3) for k, v in zip(ARSHETIP_KEYS, c)},
+            }
+        )
+    return out
+
+
+def _kmeans_pp(X: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    centers = [X[rng.integers(len(X))]]
+    d2 = ((X - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = float(d2.sum())
+        i = int(rng.choice(len(X), p=d2 / total)) if total > 0 else int(rng.integers(len(X)))
+        centers.append(X[i])
+        d2 = np.minimum(d2, ((X - X[i]) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float32)
+
+
+def _labels(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2 ; ||x||^2 sabit
+    return np.argmin(-2.0 * X @ centroids.T + (centroids ** 2).sum(axis=1), axis=1)
+
+
+def _members(conn) -> Tuple[List[str], np.ndarray]:
+    ids: List[str] = []
+    vecs: List[np.ndarray] = []
+    for pid, blob in conn.execute("SELECT profile_id, vec FROM tribe_members"):
+        v = _from_raw(blob)
+        if v is not None:
+            ids.append(pid)
+            vecs.append(v)
+    X = np.vstack(vecs).astype(np.float32) if vecs else np.zeros((0, len(ARSHETIP_KEYS)), dtype=np.float32)
+    return ids, X
+
+
+def refit(
+    rows: Optional[Iterable[Dict[str, Any]]] = None,
+    k: int = K_TRIBES,
+    batch_size: int = BATCH_SIZE,
+    iterations: int = ITERATIONS,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Tüm üyeler üzerinde mini-batch k-means (Sculley 2010). rows verilirse (snapshot.iter_results
+    biçimi) önce üye olarak eklenir; var olan üyenin vektörü güncellenir. Model ve üye atamaları
+    tek transaction'da değişir; o transaction'da üyeler yeniden okunur, böylece k-means sürerken
+    observe() ile gelenler de yeni merkezlere göre etiketlenir (refit kabile numaralarını değiştirir).
+    """
+    conn = _db()
+    if rows is not None:
+        # Önce bellekte topla: yazma kilidi çağıranın iterator'ı tüketilirken tutulmasın.
+        new = []
+        for r in rows:
+            payload = r.get("_result") or {}
+            if not r.get("profile_id") or normalise(payload.get("totals")) is None:
+                continue
+            new.append((r["profile_id"], payload.get("name", ""), payload.get("zodiac", ""), r.get("ts_utc", ""),
+                        _raw(payload.get("totals"))))
+        for i in range(0, len(new), INSERT_BATCH):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Bilinen üyenin vektörü de güncellenir (yeniden skorlanmış sonuç: app.backfill).
+                conn.executemany(
+                    "INSERT INTO tribe_members VALUES (?, 0, ?, ?, ?, ?) ON CONFLICT(profile_id) DO UPDATE SET "
+                    "name = excluded.name, zodiac = excluded.zodiac, ts_utc = excluded.ts_utc, vec = excluded.vec",
+                    new[i : i + INSERT_BATCH],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    ids, X = _members(conn)
+    if len(ids) < k:
+        return {"skipped": f"en az {k} üye gerekli", "members": len(ids)}
+
+    rng = np.random.default_rng(seed)
+    centroids = _kmeans_pp(X, k, rng)
+    seen = np.zeros(k, dtype=np.int64)
+    for _ in range(iterations):
+        batch = X[rng.integers(len(X), size=min(batch_size, len(X)))]
+        for x, j in zip(batch, _labels(batch, centroids)):
+            seen[j] += 1
+            centroids[j] += (x - centroids[j]) / seen[j]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids, X = _members(conn)
+        labels = _labels(X, centroids)
+        counts = np.bincount(labels, minlength=k).astype(np.int64)
+        inertia = float(((X - centroids[labels]) ** 2).sum())
+        _, _, version = _load(conn)
+        _save(conn, centroids, counts, version + 1)
+        conn.executemany(
+            "UPDATE tribe_members SET tribe = ? WHERE profile_id = ?",
+            [(int(j), pid) for pid, j in zip(ids, labels)],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {"k": k, "members": len(ids), "version": version + 1, "inertia": round(inertia, 4)}
+
+
+@dataclass
+class RefitJob:
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: str = ""
+
+
+def start_background_refit(rows: Optional[Iterable[Dict[str, Any]]] = None, **kwargs: Any) -> RefitJob:
+    """
+    refit()'i ayrı thread'de başlatır (Admin sayfası beklemez). Durum: dönen job.
+    """
+    job = RefitJob()
+
+    def run() -> None:
+        try:
+            job.result = refit(rows, **kwargs)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+
+    threading.Thread(target=run, name="iz-tribes-refit", daemon=True).start()
+    return job
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Kabile (k-means) modeli")
+    ap.add_argument("command", choices=["refit", "status"])
+    ap.add_argument("--k", type=int, default=K_TRIBES)
+    ap.add_argument("--iterations", type=int, default=ITERATIONS)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--from-snapshot", action="store_true", help="Admin snapshot'ındaki sonuçları da üye olarak ekle")
+    args = ap.parse_args()
+    if args.command == "refit":
+        rows = None
+        if args.from_snapshot:
+            from app import snapshot
+
+            rows = snapshot.iter_results()
+        result = refit(rows, k=args.k, batch_size=args.batch_size, iterations=args.iterations)
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(json.dumps(describe(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from typing import Any, Dict
 
@@ -21,6 +24,18 @@ def data_path(filename: str) -> Path:
     return project_root() / "data" / filename
 
 
+def runtime_path(filename: str) -> Path:
+    """
+    Çalışma zamanı dosyaları (index, checkpoint, rapor, sqlite) için /runtime altı.
+    IZ_RUNTIME_DIR ortam değişkeni verilirse o klasör (benchmark/deneme çalıştırmaları).
+    Klasör yoksa oluşturulur; git'e girmez.
+    """
+    base = os.environ.get("IZ_RUNTIME_DIR")
+    path = (Path(base) if base else project_root() / "runtime") / filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def load_json(filename: str) -> Dict[str, Any]:
     """
     Loads a JSON file from /data and returns it as a dict.
@@ -28,3 +43,28 @@ def load_json(filename: str) -> Dict[str, Any]:
     path = data_path(filename)
     with path.open("r", encoding="utf-8") as f:
         return json.load(f)
+
+
+class RateLimiter:
+    """
+    Basit token bucket: dakikada en fazla `per_minute` işlem.
+    Sheets quota'sını toplu işlerde aşmamak için kullanılır.
+    """
+
+    def __init__(self, per_minute: float, burst: int = 1) -> None:
+        self.rate = max(per_minute, 0.001) / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
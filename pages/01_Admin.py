@@ -1,10 +1,12 @@
 import json
 from pathlib import Path
-from collections import Counter
-from datetime import datetime
+from datetime import datetime, time, timedelta, timezone
 
 import streamlit as st
 
+from app import export, footprint, funnel, rollups, snapshot, tribes
+from app.jsonl_index import JsonlTimeIndex
+
 # Optional: pandas varsa güzel tablo/graph; yoksa yine çalışır
 try:
     import pandas as pd
@@ -12,16 +14,6 @@ except Exception:
     pd = None
 
 
-def _parse_dt(s: str):
-    if not s:
-        return None
-    try:
-        # "2026-01-13T06:38:00" gibi
-        return datetime.fromisoformat(s.replace("Z", ""))
-    except Exception:
-        return None
-
-
 def find_log_path() -> Path | None:
     """
     Log dosyası bazen repo root'ta, bazen app/ içinde.
@@ -69,44 +61,51 @@ if need_pw:
 else:
     st.caption("No admin password set (optional). Add ADMIN_PASSWORD to Streamlit secrets to lock this page.")
 
-log_path = find_log_path()
-if not log_path:
-    st.error("No results_log.jsonl found. Tried: repo root and app/ folder.")
-    st.stop()
-
-records = read_jsonl(log_path)
-st.caption(f"Log file: `{log_path}` | records: **{len(records)}**")
-
-if not records:
-    st.warning("No records yet. Run the test a few times to generate data.")
-    st.stop()
-
-# --- Basic metrics ---
-total = len(records)
+WINDOWS = {
+    "Last 24 h": timedelta(hours=24),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All time": None,
+    "Custom": None,
+}
+window_label = st.radio("Time window", list(WINDOWS), index=1, horizontal=True)
+now = datetime.now(timezone.utc)
+if window_label == "Custom":
+    d1, d2 = st.columns(2)
+    start_day = d1.date_input("From", value=(now - timedelta(days=7)).date())
+    end_day = d2.date_input("To", value=now.date())
+    w_start = datetime.combine(start_day, time.min, tzinfo=timezone.utc).timestamp()
+    w_end = datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=timezone.utc).timestamp()
+elif WINDOWS[window_label] is None:
+    w_start = w_end = None
+else:
+    w_start, w_end = (now - WINDOWS[window_label]).timestamp(), None
 
-langs = []
-baskin = []
-ikincil = []
-dates = []
+# Rollup'lar UTC gün bazında: pencereyi gün aralığına çevir.
+day_from = datetime.fromtimestamp(w_start, timezone.utc).date().isoformat() if w_start else None
+day_to = datetime.fromtimestamp(w_end - 1, timezone.utc).date().isoformat() if w_end else None
 
-for r in records:
-    langs.append(r.get("lang") or r.get("language") or "tr")  # bazı eski kayıtlar lang içermeyebilir
-    baskin.append(r.get("baskin") or "—")
-    ikincil.append(r.get("ikincil") or "—")
-    dt = _parse_dt(r.get("timestamp"))
-    if dt:
-        dates.append(dt.date())
+# --- Sheets snapshot: sadece yeni satırlar okunur (dakikada en fazla bir kez, process'ler arası tek okuyucu) ---
+# results ve events paralel okunur; biri yavaşsa / hata verirse diğeri yine güncellenir.
+for _tab, (_ok, _, _msg) in snapshot.maybe_sync_all(timeout=10).items():
+    if not _ok:
+        st.caption(f"Snapshot sync for `{_tab}` failed ({_msg.split(' | ')[0]}); showing the last synced data.")
 
-lang_counts = Counter(langs)
-baskin_counts = Counter(baskin)
-ikincil_counts = Counter(ikincil)
-daily_counts = Counter(dates) if dates else Counter()
+# --- Basic metrics (rollup tablolarından) ---
+lang_counts = dict(rollups.result_counts("lang", day_from, day_to))
+total = sum(lang_counts.values())
 
 c1, c2, c3, c4 = st.columns(4)
 c1.metric("Completed sessions", total)
 c2.metric("TR", lang_counts.get("tr", 0))
 c3.metric("EN", lang_counts.get("en", 0))
 c4.metric("Other/Unknown", total - lang_counts.get("tr", 0) - lang_counts.get("en", 0))
+_synced = snapshot.last_synced("results")
+st.caption(
+    "Aggregates come from daily rollups (UTC days), updated on every write and on each Sheets snapshot sync. "
+    + "Last sync: "
+    + (datetime.fromtimestamp(_synced, timezone.utc).isoformat(timespec="seconds") if _synced else "never")
+)
 
 st.divider()
 
@@ -115,7 +114,7 @@ left, right = st.columns(2)
 
 with left:
     st.subheader("Primary archetype distribution")
-    items = sorted(baskin_counts.items(), key=lambda x: x[1], reverse=True)
+    items = rollups.result_counts("primary_trait", day_from, day_to)
     if pd:
         df = pd.DataFrame(items, columns=["primary", "count"])
         st.bar_chart(df.set_index("primary"))
@@ -125,7 +124,7 @@ with left:
 
 with right:
     st.subheader("Secondary archetype distribution")
-    items2 = sorted(ikincil_counts.items(), key=lambda x: x[1], reverse=True)
+    items2 = rollups.result_counts("secondary_trait", day_from, day_to)
     if pd:
         df2 = pd.DataFrame(items2, columns=["secondary", "count"])
         st.bar_chart(df2.set_index("secondary"))
@@ -136,8 +135,8 @@ with right:
 st.divider()
 
 st.subheader("Daily completions")
-if daily_counts:
-    daily_items = sorted(daily_counts.items(), key=lambda x: x[0])
+daily_items = rollups.result_counts("day", day_from, day_to)
+if daily_items:
     if pd:
         dfd = pd.DataFrame(daily_items, columns=["date", "count"])
         dfd["date"] = pd.to_datetime(dfd["date"])
@@ -146,19 +145,207 @@ if daily_counts:
     else:
         st.write(daily_items)
 else:
-    st.caption("No timestamps parsed.")
+    st.caption("No completions in this window.")
+
+st.subheader("Events")
+ev_items = rollups.event_counts(day_from, day_to)
+if pd and ev_items:
+    st.dataframe(pd.DataFrame(ev_items, columns=["event", "count"]), use_container_width=True, hide_index=True)
+else:
+    st.write(ev_items)
+
+log_path = find_log_path()
+
+with st.expander("Rollup maintenance"):
+    last = rollups.last_reconciled()
+    st.caption(
+        "Last reconcile: "
+        + (datetime.fromtimestamp(last, timezone.utc).isoformat(timespec="seconds") if last else "never")
+    )
+    if rollups.needs_reconcile():
+        st.warning("Rollups have not been reconciled in the last 24 h.")
+    st.caption(
+        f"Snapshot: {snapshot.count('results')} results, {snapshot.count('events')} events "
+        "(only rows appended since the last sync are read)."
+    )
+    b1, b2, b3, b4 = st.columns(4)
+    if b1.button("Sync now"):
+        for _tab, (_ok, stats, _msg) in snapshot.sync_all().items():
+            (st.success if _ok else st.error)(f"{_tab}: {stats if _ok else _msg}")
+    if b2.button("Rebuild rollups from snapshot"):
+        st.success(f"Rollups rebuilt: {snapshot.rebuild_rollups()}")
+    if b3.button("Full resync from Sheets"):
+        with st.spinner("Reading Sheets..."):
+            for t in snapshot.TABS:
+                snapshot.reset(t)
+            failed = {t: m for t, (ok, _, m) in snapshot.sync_all(timeout=600, max_pages=10_000).items() if not ok}
+            if failed:
+                st.error(f"Resync failed: {failed}")
+            else:
+                st.success(f"Snapshot rebuilt: {snapshot.count('results')} results, {snapshot.count('events')} events")
+    if log_path and b4.button("Rebuild results from local log"):
+        stats = rollups.reconcile(results=read_jsonl(log_path))
+        st.success(f"Rollups rebuilt: {stats}")
+
+with st.expander("Export (CSV / Parquet)"):
+    st.caption(
+        "Streams rows from Sheets page by page and writes the file incrementally in the background. "
+        "Uses the time window above. CLI: `python -m app.export --help`."
+    )
+    e1, e2 = st.columns(2)
+    ex_tab = e1.selectbox("Tab", list(export.TABS))
+    ex_fmt = e2.selectbox("Format", list(export.FORMATS))
+    ex_cols = st.multiselect(
+        "Columns",
+        export.DEFAULT_COLUMNS[ex_tab] + ["result_json", "event_json"],
+        default=export.DEFAULT_COLUMNS[ex_tab],
+    )
+    if st.button("Start export"):
+        st.session_state["_export_job"] = export.start_background_export(
+            ex_tab, ex_fmt, columns=ex_cols, since=day_from, until=day_to
+        )
+    job = st.session_state.get("_export_job")
+    if job is not None:
+        if job.error:
+            st.error(f"Export failed: {job.error}")
+        elif not job.done:
+            st.info(f"Exporting... {job.rows} rows written so far.")
+            st.button("Refresh status")
+        else:
+            st.success(f"{job.rows} rows → `{job.path.name}` ({footprint.human_bytes(job.path.stat().st_size)})")
+            st.download_button(
+                "Download",
+                data=lambda p=job.path: p.read_bytes(),  # dosya sadece tıklanınca okunur
+                file_name=job.path.name,
+                mime="text/csv" if job.path.suffix == ".csv" else "application/octet-stream",
+            )
+
+with st.expander("Funnel (drop-off per question)"):
+    st.caption(
+        "One pass over the events tab, resumed from a checkpoint; sessions close after "
+        f"{funnel.SESSION_TIMEOUT // 60} min without events. CLI: `python -m app.funnel --help`."
+    )
+    f1, f2 = st.columns(2)
+    if f1.button("Update funnel"):
+        with st.spinner("Reading new events..."):
+            try:
+                funnel.update()
+            except Exception as e:
+                st.error(f"Funnel update failed: {e}")
+    include_open = f2.checkbox("Include sessions still in progress")
+    fr = funnel.report(funnel.load_state(), include_open=include_open)
+    st.caption(
+        f"Sessions: {fr['sessions']} · open: {fr['open_sessions']} · events processed: {fr['events']} "
+        f"· up to: {fr['watermark'] or '—'}"
+    )
+    if fr["sessions"]:
+        lang_options = ["All"] + list(fr["by_lang"])
+        f_lang = st.radio("Language", lang_options, horizontal=True)
+        steps = fr["steps"] if f_lang == "All" else fr["by_lang"][f_lang]
+        if pd:
+            dfs = pd.DataFrame(steps)
+            st.bar_chart(dfs.set_index("step")["reached"])
+            st.dataframe(dfs, use_container_width=True, hide_index=True)
+        else:
+            st.write(steps)
+        st.markdown("**Time to answer (per question)**")
+        dwell_rows = [{"question": q, **dict(zip(fr["dwell_buckets"], counts))} for q, counts in fr["dwell"].items()]
+        if pd and dwell_rows:
+            st.dataframe(pd.DataFrame(dwell_rows), use_container_width=True, hide_index=True)
+        else:
+            st.write(dwell_rows)
+
+with st.expander("Tribes (k-means clusters)"):
+    st.caption(
+        "New results join the nearest tribe as they arrive. A full refit runs in the background over all "
+        "members plus the synced snapshot. CLI: `python -m app.tribes --help`."
+    )
+    t1, t2 = st.columns(2)
+    k_tribes = t1.number_input("Tribes (k)", min_value=2, max_value=20, value=tribes.K_TRIBES, step=1)
+    if t2.button("Refit in background"):
+        st.session_state["_tribes_job"] = tribes.start_background_refit(snapshot.iter_results(), k=int(k_tribes))
+    tjob = st.session_state.get("_tribes_job")
+    if tjob is not None:
+        if tjob.error:
+            st.error(f"Refit failed: {tjob.error}")
+        elif tjob.finished_at is None:
+            st.info("Refitting...")
+            st.button("Refresh tribes")
+        else:
+            st.success(f"Refit done: {tjob.result}")
+    tribe_rows = [
+        {"tribe": t["tribe"], "size": t["size"], "top traits": ", ".join(t["traits"]), **t["centroid"]}
+        for t in tribes.describe()
+    ]
+    if pd and tribe_rows:
+        st.dataframe(pd.DataFrame(tribe_rows), use_container_width=True, hide_index=True)
+    else:
+        st.write(tribe_rows or "No tribes yet.")
+
+with st.expander("Sessions (this server process)"):
+    fp = footprint.registry().summary()
+    s1, s2, s3, s4 = st.columns(4)
+    s1.metric("Tracked sessions", fp["sessions"])
+    s2.metric("Idle (>30 min)", fp["idle"])
+    s3.metric("session_state total", footprint.human_bytes(fp["total_bytes"]))
+    s4.metric("Avg / max per session", f"{footprint.human_bytes(fp['avg_bytes'])} / {footprint.human_bytes(fp['max_bytes'])}")
+    st.caption(f"Evicted from idle sessions: {fp['evicted_keys']} keys, {footprint.human_bytes(fp['evicted_bytes'])}")
+    top = [{"key": k, "bytes": v} for k, v in fp["top_keys"]]
+    if pd and top:
+        st.dataframe(pd.DataFrame(top), use_container_width=True, hide_index=True)
+    else:
+        st.write(top)
 
 st.divider()
 
-st.subheader("Latest records (last 20)")
-latest = records[-20:]
+PAGE_SIZE = 20
+
+# --- Son sonuçlar: Sheets snapshot'ından (index'li, sayfa başına tek sorgu) ---
+n_snap = snapshot.count_results(day_from, day_to)
+if n_snap:
+    n_pages = max(1, (n_snap + PAGE_SIZE - 1) // PAGE_SIZE)
+    st.subheader(f"Latest results: {n_snap} in window ({PAGE_SIZE} per page)")
+    page = st.number_input("Page (1 = newest)", min_value=1, max_value=n_pages, value=1, step=1)
+    latest_view = snapshot.latest_results(PAGE_SIZE, (int(page) - 1) * PAGE_SIZE, day_from, day_to)
+    if pd:
+        st.dataframe(pd.DataFrame(latest_view), use_container_width=True, hide_index=True)
+    else:
+        st.write(latest_view)
+    st.stop()
+
+# --- Ham log (opsiyonel, eski yerel results_log.jsonl) ---
+if not log_path:
+    st.caption("No results_log.jsonl found (repo root or app/). Raw record browser disabled.")
+    st.stop()
+
+# Zaman index'i: sadece log'un yeni kısmı okunur, pencere sorguları binary search ile başlar.
+index = JsonlTimeIndex(log_path).refresh()
+st.caption(f"Log file: `{log_path}` | records: **{index.count()}**")
+
+if not index.count():
+    st.warning("No records yet. Run the test a few times to generate data.")
+    st.stop()
+
+if WINDOWS[window_label] is None and window_label != "Custom":
+    n_pages = max(1, (index.count() + PAGE_SIZE - 1) // PAGE_SIZE)
+    st.subheader(f"Latest records ({PAGE_SIZE} per page)")
+    page = st.number_input("Page (1 = newest)", min_value=1, max_value=n_pages, value=1, step=1)
+    latest = index.latest(page=int(page) - 1, page_size=PAGE_SIZE)
+else:
+    window_records = list(index.window(w_start, w_end))
+    window_records.reverse()
+    n_pages = max(1, (len(window_records) + PAGE_SIZE - 1) // PAGE_SIZE)
+    st.subheader(f"Records in window: {len(window_records)} ({PAGE_SIZE} per page)")
+    page = st.number_input("Page (1 = newest)", min_value=1, max_value=n_pages, value=1, step=1)
+    latest = window_records[(int(page) - 1) * PAGE_SIZE : int(page) * PAGE_SIZE]
+
 latest_view = []
-for r in reversed(latest):
+for r in latest:
     latest_view.append({
-        "timestamp": r.get("timestamp"),
+        "timestamp": r.get("timestamp") or r.get("ts_utc"),
         "lang": r.get("lang") or r.get("language") or "tr",
-        "isim": r.get("isim"),
-        "baskin": r.get("baskin"),
+        "isim": r.get("isim") or r.get("name"),
+        "baskin": r.get("baskin") or r.get("dominant"),
         "ikincil": r.get("ikincil"),
         "paylas": r.get("paylas"),
         "profile_id": r.get("profile_id"),